@@ -103,6 +103,8 @@ urlpatterns = [
     path('bridge', views.bridge, name='bridge'),
     path('bigboard', views.bigboard, name='bigboard'),
     path('bigboard/unhidden', views.bigboard_unhidden, name='bigboard-unhidden'),
+    path('bigboard/data', views.bigboard_data, name='bigboard-data'),
+    path('bigboard/unhidden/data', views.bigboard_unhidden_data, name='bigboard-unhidden-data'),
     path('biggraph', views.biggraph, name='biggraph'),
     path('bridge/guess.csv', views.guess_csv, name='guess-csv'),
     path('bridge/hint.csv', views.hint_csv, name='hint-csv'),
@@ -1,5 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.urls import reverse
+from django.utils import timezone
 from django import forms
 
 from puzzles.models import (
@@ -14,7 +15,10 @@ from puzzles.models import (
     Erratum,
     Survey,
     Hint,
+    OutboundEmail,
+    MailCampaign,
 )
+from puzzles.messaging import campaign_message
 
 class RoundAdmin(admin.ModelAdmin):
     def view_on_site(self, obj):
@@ -92,6 +96,33 @@ class HintAdmin(admin.ModelAdmin):
     list_filter = ('status', 'puzzle', 'puzzle__round', 'team', 'claimer')
     search_fields = ('hint_question', 'response')
 
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'created_time', 'sent_time')
+    list_filter = ('status', 'campaign')
+    search_fields = ('subject', 'recipients')
+
+class MailCampaignAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'created_time', 'sent_count', 'failed_count', 'finished_time')
+    readonly_fields = ('last_member_id', 'sent_count', 'failed_count', 'queued_time', 'finished_time')
+    actions = ('send_test', 'send')
+
+    @admin.action(description='Send a test to my email')
+    def send_test(self, request, queryset):
+        if not request.user.email:
+            self.message_user(request, 'Your user has no email address.', messages.ERROR)
+            return
+        for campaign in queryset:
+            campaign_message(campaign, [request.user.email]).send()
+        self.message_user(request, 'Sent to %s.' % request.user.email)
+
+    @admin.action(description='Send to all team members')
+    def send(self, request, queryset):
+        # This can take a while, so leave it to the `./manage.py send_campaign`
+        # worker, which also picks up where it left off after a restart. Sending
+        # a finished campaign again only reaches members who joined since.
+        count = queryset.update(queued_time=timezone.now(), finished_time=None)
+        self.message_user(request, 'Queued %d campaign(s) for the send_campaign worker; refresh to see progress.' % count)
+
 admin.site.register(Round, RoundAdmin)
 admin.site.register(Puzzle, PuzzleAdmin)
 admin.site.register(Team, TeamAdmin)
@@ -102,3 +133,5 @@ admin.site.register(ExtraGuessGrant, ExtraGuessGrantAdmin)
 admin.site.register(Erratum, ErratumAdmin)
 admin.site.register(Survey, SurveyAdmin)
 admin.site.register(Hint, HintAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
+admin.site.register(MailCampaign, MailCampaignAdmin)
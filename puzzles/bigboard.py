@@ -0,0 +1,787 @@
+'''
+The numbers behind the bigboard: for every team and puzzle, whether it's
+solved, how many wrong guesses and hints went into it, and so on, plus totals
+per team and per puzzle.
+
+There are two engines that compute exactly the same thing. The original one
+builds dicts keyed by (team, puzzle) and walks every cell in Python. The NumPy
+one loads everything into dense (team, puzzle) arrays and does the same work
+with array operations, which is a lot faster once there are thousands of
+teams; it's used whenever NumPy is installed. See the benchmark_bigboard
+command.
+
+The board's inputs are also kept as a Snapshot in the cache, which the
+models keep up to date by recording an event per change (see
+record_change), so that a refresh doesn't have to run all the queries again.
+Admins with the board open get each changed row pushed over a websocket,
+worked out by the websocket consumer rather than whoever saved the change.
+
+The page itself only has the headers; the rows are fetched a page at a time
+as JSON (see row_data) and drawn by static/js/bigboard.js as they scroll into
+view.
+'''
+
+import copy
+import datetime
+import functools
+import itertools
+from collections import defaultdict, namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.urls import reverse
+from django.utils import timezone
+
+from puzzles import models
+from puzzles.hunt_config import HUNT_END_TIME, META_META_SLUG
+from puzzles.messaging import BigboardConsumer, defer
+from puzzles.templatetags.puzzle_tags import format_time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Everything the bigboard reads from the database, as lists of tuples:
+# correct: (team_id, puzzle_id, used_free_answer, submitted_datetime, solve_position), by time
+# wrong, asked_hints, canned_hints: (team_id, puzzle_id, count)
+# unlocks: (team_id, puzzle_id)
+BigboardRows = namedtuple('BigboardRows', 'teams correct wrong asked_hints canned_hints unlocks')
+
+# Cell classes, in the order they're listed; the NumPy engine gives each a bit.
+CLASSES = (
+    'F', # free answer
+    'S', # solved
+    'W', # wrong
+    'U', # unlocked
+    'H', # hinted
+    'RH', # requested_hint (asked_hint)
+    'CH', # canned_hint
+    'P', # post-hunt solve
+    'B', # backsolved
+)
+BIT = {cls: 1 << i for (i, cls) in enumerate(CLASSES)}
+BACKSOLVE_WINDOW = datetime.timedelta(minutes=5)
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def load(hide_hidden):
+    correct_q = Q(is_correct=True)
+    incorrect_q = Q(is_correct=False)
+    if hide_hidden:
+        correct_q &= Q(team__is_hidden=False)
+        incorrect_q &= Q(team__is_hidden=False)
+        teams = models.Team.objects.filter(is_hidden=False)
+    else:
+        teams = models.Team.objects.all()
+
+    def counts(queryset):
+        return list(queryset.values_list('team_id', 'puzzle_id').annotate(count=Count('*')).order_by())
+
+    return BigboardRows(
+        teams=list(teams),
+        correct=list(models.AnswerSubmission.objects
+            .filter(correct_q)
+            .order_by('submitted_datetime')
+            .values_list('team_id', 'puzzle_id', 'used_free_answer', 'submitted_datetime', 'solve_position')),
+        wrong=counts(models.AnswerSubmission.objects.filter(incorrect_q)),
+        # <힌트 수정> asked_hints와 canned_hints 두개에 대해 각각 aggregate함.
+        asked_hints=counts(models.Hint.objects.filter(status=models.Hint.ANSWERED, is_followup=False)),
+        canned_hints=counts(models.CannedHint.objects.all()),
+        unlocks=list(models.PuzzleUnlock.objects.values_list('team_id', 'puzzle_id')),
+    )
+
+
+def compute(puzzles, rows, hide_hidden, limit=0):
+    '''
+    Returns (board, annotated puzzles) for bigboard.html: the teams in
+    leaderboard order (only the first limit, if given), each with an entry per
+    puzzle, and the per-puzzle totals.
+    '''
+    if np is None:
+        return compute_python(puzzles, rows, hide_hidden, limit)
+    return compute_numpy(puzzles, rows, hide_hidden, limit)
+
+
+def puzzle_structure(puzzles):
+    meta_meta_id = None
+    puzzle_metas = {}
+    for puzzle in puzzles:
+        if puzzle.slug == META_META_SLUG:
+            meta_meta_id = puzzle.id
+        if not puzzle.is_meta:
+            puzzle_metas[puzzle.id] = puzzle.round.meta_id
+    return (meta_meta_id, puzzle_metas)
+
+
+def compute_python(puzzles, rows, hide_hidden, limit=0):
+    (meta_meta_id, puzzle_metas) = puzzle_structure(puzzles)
+
+    wrong_guesses_map = defaultdict(int) # key (team, puzzle)
+    wrong_guesses_by_team_map = defaultdict(int) # key team
+    solve_position_map = dict() # key (team, puzzle); value n if team is nth to solve this puzzle
+    solve_count_map = defaultdict(int) # puzzle -> number of counts
+    total_guess_map = defaultdict(int) # puzzle -> number of guesses
+    used_hints_map = defaultdict(int) # (team, puzzle) -> number of hints
+    used_hints_by_team_map = defaultdict(int) # team -> number of hints
+    used_hints_by_puzzle_map = defaultdict(int) # puzzle -> number of hints
+    # <힌트 수정> 두가지 분류 추가. used는 아중에 하나씩 합치는거로.
+    asked_hints_map = defaultdict(int) # (team, puzzle) -> number of asked_hints
+    asked_hints_by_team_map = defaultdict(int) # team -> number of asked_hints
+    asked_hints_by_puzzle_map = defaultdict(int) # puzzle -> number of asked_hints
+    canned_hints_map = defaultdict(int) # (team, puzzle) -> number of canned_hints
+    canned_hints_by_team_map = defaultdict(int) # team -> number of canned_hints
+    canned_hints_by_puzzle_map = defaultdict(int) # puzzle -> number of canned_hints
+    meta_solves_map = defaultdict(int) # team -> number of meta solves
+    solve_time_map = defaultdict(dict) # team -> {puzzle id -> solve time}
+    during_hunt_solve_time_map = defaultdict(dict) # team -> {puzzle id -> solve time}
+    free_answer_map = defaultdict(set) # team -> {puzzle id}
+    free_answer_by_puzzle_map = defaultdict(int) # puzzle -> number of free answers
+
+    for team_id, puzzle_id, used_free_answer, submitted_datetime, solve_position in rows.correct:
+        total_guess_map[puzzle_id] += 1
+        if used_free_answer:
+            free_answer_map[team_id].add(puzzle_id)
+            free_answer_by_puzzle_map[puzzle_id] += 1
+        else:
+            solve_count_map[puzzle_id] += 1
+            # The stored position only counts non-hidden teams, which is what
+            # the public bigboard wants.
+            solve_position_map[(team_id, puzzle_id)] = (
+                solve_position if hide_hidden and solve_position
+                else solve_count_map[puzzle_id])
+            solve_time_map[team_id][puzzle_id] = submitted_datetime
+            if submitted_datetime < HUNT_END_TIME:
+                during_hunt_solve_time_map[team_id][puzzle_id] = submitted_datetime
+        if puzzle_id not in puzzle_metas:
+            meta_solves_map[team_id] += 1
+
+    for team_id, puzzle_id, count in rows.wrong:
+        total_guess_map[puzzle_id] += count
+        wrong_guesses_map[(team_id, puzzle_id)] += count
+        wrong_guesses_by_team_map[team_id] += count
+
+    for team_id, puzzle_id, count in rows.asked_hints:
+        asked_hints_map[(team_id, puzzle_id)] += count
+        asked_hints_by_team_map[team_id] += count
+        asked_hints_by_puzzle_map[puzzle_id] += count
+        used_hints_map[(team_id, puzzle_id)] += count * 2
+        used_hints_by_team_map[team_id] += count * 2
+        used_hints_by_puzzle_map[puzzle_id] += count * 2
+
+    for team_id, puzzle_id, count in rows.canned_hints:
+        canned_hints_map[(team_id, puzzle_id)] += count
+        canned_hints_by_team_map[team_id] += count
+        canned_hints_by_puzzle_map[puzzle_id] += count
+        used_hints_map[(team_id, puzzle_id)] += count
+        used_hints_by_team_map[team_id] += count
+        used_hints_by_puzzle_map[puzzle_id] += count
+
+    # Reproduce Team.leaderboard behavior for ignoring solves after hunt end,
+    # but not _teams_ created after hunt end. They'll just all be at the bottom.
+    leaderboard = sorted(rows.teams, key=lambda team: (
+        during_hunt_solve_time_map[team.id].get(meta_meta_id, HUNT_END_TIME),
+        -len(during_hunt_solve_time_map[team.id]),
+        team.last_solve_time or team.creation_time,
+    ))
+    if limit:
+        leaderboard = leaderboard[:limit]
+    unlocks = set(rows.unlocks)
+    unlock_count_map = defaultdict(int)
+
+    def classes_of(team_id, puzzle_id):
+        unlocked = (team_id, puzzle_id) in unlocks
+        if unlocked:
+            unlock_count_map[puzzle_id] += 1
+        solve_time = solve_time_map[team_id].get(puzzle_id)
+        if puzzle_id in free_answer_map[team_id]:
+            yield 'F'
+        elif solve_time:
+            yield 'S'
+        elif wrong_guesses_map.get((team_id, puzzle_id)):
+            yield 'W'
+        elif unlocked:
+            yield 'U'
+        if used_hints_map.get((team_id, puzzle_id)):
+            yield 'H'
+        if asked_hints_map.get((team_id, puzzle_id)):
+            yield 'RH'
+        if canned_hints_map.get((team_id, puzzle_id)):
+            yield 'CH'
+        if solve_time and solve_time > HUNT_END_TIME:
+            yield 'P'
+        if solve_time and puzzle_id in puzzle_metas:
+            meta_time = solve_time_map[team_id].get(puzzle_metas[puzzle_id])
+            if meta_time and solve_time > meta_time - BACKSOLVE_WINDOW:
+                yield 'B'
+
+    board = []
+    for team in leaderboard:
+        board.append({
+            'team': team,
+            'last_solve_time': max([team.creation_time, *solve_time_map[team.id].values()]),
+            'total_solves': len(solve_time_map[team.id]),
+            'free_solves': len(free_answer_map[team.id]),
+            'wrong_guesses': wrong_guesses_by_team_map[team.id],
+            'used_hints': used_hints_by_team_map[team.id],
+            'requested_hints': asked_hints_by_team_map[team.id],
+            'asked_hints': canned_hints_by_team_map[team.id],
+            'finished': solve_position_map.get((team.id, meta_meta_id)),
+            'meta_solves': meta_solves_map[team.id],
+            'entries': [{
+                'wrong_guesses': wrong_guesses_map[(team.id, puzzle.id)],
+                'solve_position': solve_position_map.get((team.id, puzzle.id)),
+                'requested_hints': asked_hints_map[(team.id, puzzle.id)],
+                'canned_hints': canned_hints_map[(team.id, puzzle.id)],
+                'cls': ' '.join(classes_of(team.id, puzzle.id)),
+            } for puzzle in puzzles]
+        })
+
+    annotated_puzzles = [{
+        'puzzle': puzzle,
+        'solves': solve_count_map[puzzle.id],
+        'free_solves': free_answer_by_puzzle_map[puzzle.id],
+        'total_guesses': total_guess_map[puzzle.id],
+        'total_unlocks': unlock_count_map[puzzle.id],
+        'used_hints': used_hints_by_puzzle_map[puzzle.id],
+        'requested_hints': asked_hints_by_puzzle_map[puzzle.id],
+        'canned_hints': canned_hints_by_puzzle_map[puzzle.id],
+    } for puzzle in puzzles]
+
+    return (board, annotated_puzzles)
+
+
+@functools.lru_cache(maxsize=None)
+def class_names(mask):
+    return ' '.join(cls for cls in CLASSES if mask & BIT[cls])
+
+
+def indexer(ids):
+    '''
+    Returns a function mapping a sequence of ids to their positions in ids;
+    ids that aren't there all map to len(ids). The NumPy engine gives the
+    arrays an extra row and column at that position to collect them, so e.g.
+    hints from hidden teams still count towards the per-puzzle totals.
+    '''
+    ids = np.asarray(ids, dtype=np.int64)
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    def index(values):
+        values = np.asarray(values, dtype=np.int64)
+        if not len(sorted_ids):
+            return np.zeros(len(values), dtype=np.intp)
+        positions = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+        found = sorted_ids[positions] == values
+        return np.where(found, order[positions], len(ids))
+    return index
+
+
+def int_columns(rows, width):
+    '''Columns of a list of tuples of ints, as int64 arrays.'''
+    flat = np.fromiter(itertools.chain.from_iterable(rows), np.int64, len(rows) * width)
+    return flat.reshape(-1, width).T
+
+
+def running_count(keys):
+    '''For each element, how many elements before it (inclusive) share its key.'''
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(keys)]))
+    counts = np.empty(len(keys), dtype=np.int64)
+    counts[order] = np.arange(len(keys)) - group_start + 1
+    return counts
+
+
+def compute_numpy(puzzles, rows, hide_hidden, limit=0):
+    (meta_meta_id, puzzle_metas) = puzzle_structure(puzzles)
+    teams = rows.teams
+    (T, P) = (len(teams), len(puzzles))
+    team_index = indexer([team.id for team in teams])
+    puzzle_index = indexer([puzzle.id for puzzle in puzzles])
+    shape = (T + 1, P + 1)
+    end = (HUNT_END_TIME - EPOCH) // MICROSECOND
+
+    def cells(counts):
+        grid = np.zeros(shape, dtype=np.int64)
+        if counts:
+            (team_ids, puzzle_ids, values) = int_columns(counts, 3)
+            np.add.at(grid, (team_index(team_ids), puzzle_index(puzzle_ids)), values)
+        return grid
+
+    wrong = cells(rows.wrong)
+    asked = cells(rows.asked_hints)
+    canned = cells(rows.canned_hints)
+    used = 2 * asked + canned
+
+    unlocked = np.zeros(shape, dtype=bool)
+    if rows.unlocks:
+        (team_ids, puzzle_ids) = int_columns(rows.unlocks, 2)
+        unlocked[team_index(team_ids), puzzle_index(puzzle_ids)] = True
+
+    free = np.zeros(shape, dtype=bool)
+    solved = np.zeros(shape, dtype=bool)
+    solve_time = np.zeros(shape, dtype=np.int64)
+    solve_position = np.zeros(shape, dtype=np.int64)
+    solve_count = np.zeros(P + 1, dtype=np.int64)
+    free_count = np.zeros(P + 1, dtype=np.int64)
+    total_guesses = wrong.sum(axis=0)
+    meta_solves = np.zeros(T + 1, dtype=np.int64)
+    if rows.correct:
+        n = len(rows.correct)
+        t = team_index(np.fromiter((row[0] for row in rows.correct), np.int64, n))
+        p = puzzle_index(np.fromiter((row[1] for row in rows.correct), np.int64, n))
+        used_free_answer = np.fromiter((row[2] for row in rows.correct), bool, n)
+        times = np.fromiter(((row[3] - EPOCH) // MICROSECOND for row in rows.correct), np.int64, n)
+        total_guesses += np.bincount(p, minlength=P + 1)
+        free[t[used_free_answer], p[used_free_answer]] = True
+        free_count = np.bincount(p[used_free_answer], minlength=P + 1)
+        is_meta = np.array([puzzle.id not in puzzle_metas for puzzle in puzzles] + [True])
+        meta_solves += np.bincount(t[is_meta[p]], minlength=T + 1)
+
+        # Rows are in time order, so the running count of solves of each
+        # puzzle is the solve position. If a team somehow solved a puzzle
+        # twice, the later one wins, like it does in a dict.
+        solving = ~used_free_answer
+        (t, p) = (t[solving], p[solving])
+        positions = running_count(p)
+        if hide_hidden:
+            stored = np.fromiter((row[4] or 0 for row in rows.correct), np.int64, n)[solving]
+            positions = np.where(stored > 0, stored, positions)
+        solve_count = np.bincount(p, minlength=P + 1)
+        solved[t, p] = True
+        solve_time[t, p] = times[solving]
+        solve_position[t, p] = positions
+
+    during_hunt = solved & (solve_time < end)
+    # Leaderboard order: time the metameta was solved during the hunt, then
+    # solves during the hunt, then last solve time; see compute_python.
+    if meta_meta_id is not None:
+        meta_meta = puzzle_index([meta_meta_id])[0]
+        finish_times = np.where(during_hunt[:, meta_meta], solve_time[:, meta_meta], end)
+    else:
+        finish_times = np.full(T + 1, end)
+    order = sorted(range(T), key=list(zip(
+        finish_times.tolist(),
+        (-during_hunt.sum(axis=1)).tolist(),
+        [team.last_solve_time or team.creation_time for team in teams],
+    )).__getitem__)
+    if limit:
+        order = order[:limit]
+    shown = np.array(order, dtype=np.intp)
+
+    # Each cell's classes as a bitmask.
+    mask = np.where(free, BIT['F'], np.where(solved, BIT['S'],
+        np.where(wrong > 0, BIT['W'], np.where(unlocked, BIT['U'], 0))))
+    mask |= np.where(used > 0, BIT['H'], 0)
+    mask |= np.where(asked > 0, BIT['RH'], 0)
+    mask |= np.where(canned > 0, BIT['CH'], 0)
+    mask |= np.where(solved & (solve_time > end), BIT['P'], 0)
+    # The meta of each puzzle's round, or the extra column if it has none.
+    metas = puzzle_index([puzzle_metas.get(puzzle.id) or 0 for puzzle in puzzles] + [0])
+    has_meta = np.array([puzzle_metas.get(puzzle.id) is not None for puzzle in puzzles] + [False])
+    backsolved = (solved & solved[:, metas] & has_meta
+        & (solve_time > solve_time[:, metas] - BACKSOLVE_WINDOW // MICROSECOND))
+    mask |= np.where(backsolved, BIT['B'], 0)
+
+    last_solve = np.where(solved, solve_time, np.iinfo(np.int64).min).max(axis=1)
+    hint_totals = used.sum(axis=1)
+    asked_totals = asked.sum(axis=1)
+    canned_totals = canned.sum(axis=1)
+    wrong_totals = wrong.sum(axis=1)
+    total_solves = solved.sum(axis=1)
+    free_solves = free.sum(axis=1)
+    board = []
+    for i in order:
+        team = teams[i]
+        last = team.creation_time
+        if total_solves[i]:
+            last = max(last, EPOCH + int(last_solve[i]) * MICROSECOND)
+        finished = int(solve_position[i, meta_meta]) if meta_meta_id is not None else 0
+        board.append({
+            'team': team,
+            'last_solve_time': last,
+            'total_solves': int(total_solves[i]),
+            'free_solves': int(free_solves[i]),
+            'wrong_guesses': int(wrong_totals[i]),
+            'used_hints': int(hint_totals[i]),
+            'requested_hints': int(asked_totals[i]),
+            'asked_hints': int(canned_totals[i]),
+            'finished': finished or None,
+            'meta_solves': int(meta_solves[i]),
+            'entries': [{
+                'wrong_guesses': w,
+                'solve_position': s or None,
+                'requested_hints': a,
+                'canned_hints': c,
+                'cls': class_names(m),
+            } for (w, s, a, c, m) in zip(wrong[i, :P].tolist(), solve_position[i, :P].tolist(),
+                asked[i, :P].tolist(), canned[i, :P].tolist(), mask[i, :P].tolist())],
+        })
+
+    columns = zip(
+        puzzles,
+        solve_count[:P].tolist(),
+        free_count[:P].tolist(),
+        total_guesses[:P].tolist(),
+        # Like the original, this only counts the teams on the board.
+        unlocked[shown, :P].sum(axis=0).tolist(),
+        used[:, :P].sum(axis=0).tolist(),
+        asked[:, :P].sum(axis=0).tolist(),
+        canned[:, :P].sum(axis=0).tolist(),
+    )
+    annotated_puzzles = [{
+        'puzzle': puzzle,
+        'solves': solves,
+        'free_solves': free_solves,
+        'total_guesses': guesses,
+        'total_unlocks': unlocks,
+        'used_hints': used_hints,
+        'requested_hints': requested_hints,
+        'canned_hints': canned_hints,
+    } for (puzzle, solves, free_solves, guesses, unlocks, used_hints, requested_hints, canned_hints) in columns]
+
+    return (board, annotated_puzzles)
+
+
+# The snapshot holds the same rows load() returns, for all teams, keyed so that
+# an event can replace a team's numbers for one puzzle. Every change to the
+# inputs gets the next sequence number and is stored as an event: the new
+# absolute value for one (team, puzzle), looked up after taking the number, so
+# applying events in order (even ones the snapshot already saw) always ends up
+# at the database's state. A reader applies the events past the snapshot's
+# number and writes it back. Anything that skips post_save (bulk_create,
+# update, raw SQL) is only picked up by the rebuild every MAX_AGE.
+SNAPSHOT_KEY = 'bigboard:snapshot'
+SEQ_KEY = 'bigboard:seq'
+EVENT_KEY = 'bigboard:event:%d'
+# Taken but not looked up yet; readers stop there for now. It expires
+# quickly in case the publisher dies before replacing it.
+PENDING = 'pending'
+PENDING_TIMEOUT = 60
+EVENT_TIMEOUT = 60 * 60
+MAX_EVENTS = 1000
+# For the websocket: the number of the last change to each (team, puzzle),
+# and which changes a consumer has already worked out (see changed_row).
+LATEST_KEY = 'bigboard:latest:%d:%s'
+CLAIM_KEY = 'bigboard:claim:%d'
+MAX_AGE = datetime.timedelta(minutes=10)
+
+class Snapshot:
+    def __init__(self, seq):
+        self.seq = seq
+        self.built = timezone.now()
+        self.teams = {} # id -> Team
+        self.solves = {} # (team, puzzle) -> [(used_free_answer, submitted_datetime, solve_position)]
+        self.wrong = {} # (team, puzzle) -> count, and the same for hints
+        self.asked_hints = {}
+        self.canned_hints = {}
+        self.unlocks = set() # (team, puzzle)
+
+    @classmethod
+    def build(cls):
+        # Take the number first: changes after it may or may not be in the
+        # queries, but their events come after it, so they get applied again.
+        snapshot = cls(cache.get(SEQ_KEY, 0))
+        rows = load(hide_hidden=False)
+        snapshot.teams = {team.id: team for team in rows.teams}
+        for (team_id, puzzle_id, *solve) in rows.correct:
+            snapshot.solves.setdefault((team_id, puzzle_id), []).append(tuple(solve))
+        for (counts, row_counts) in (
+            (snapshot.wrong, rows.wrong),
+            (snapshot.asked_hints, rows.asked_hints),
+            (snapshot.canned_hints, rows.canned_hints),
+        ):
+            counts.update(((team_id, puzzle_id), count) for (team_id, puzzle_id, count) in row_counts)
+        snapshot.unlocks = set(rows.unlocks)
+        return snapshot
+
+    def apply(self, kind, team_id, puzzle_id, value):
+        if kind == 'team':
+            if value is not None:
+                self.teams[team_id] = value
+                return
+            self.teams.pop(team_id, None)
+            for cells in (self.solves, self.wrong, self.asked_hints, self.canned_hints):
+                for key in [key for key in cells if key[0] == team_id]:
+                    del cells[key]
+            self.unlocks = {key for key in self.unlocks if key[0] != team_id}
+            return
+        key = (team_id, puzzle_id)
+        def put(cells, value):
+            if value:
+                cells[key] = value
+            else:
+                cells.pop(key, None)
+        if kind == 'answersubmission':
+            (wrong, solves) = value
+            put(self.wrong, wrong)
+            put(self.solves, solves)
+        elif kind == 'hint':
+            put(self.asked_hints, value)
+        elif kind == 'cannedhint':
+            put(self.canned_hints, value)
+        elif kind == 'puzzleunlock':
+            if value:
+                self.unlocks.add(key)
+            else:
+                self.unlocks.discard(key)
+
+    def rows(self, hide_hidden):
+        '''The BigboardRows load(hide_hidden) would return.'''
+        teams = sorted(self.teams.values(), key=lambda team: team.id)
+        if hide_hidden:
+            teams = [team for team in teams if not team.is_hidden]
+        shown = {team.id for team in teams}
+        def counts(cells):
+            return [(team_id, puzzle_id, count) for ((team_id, puzzle_id), count) in cells.items()]
+        return BigboardRows(
+            teams=teams,
+            correct=sorted((
+                (team_id, puzzle_id, *solve)
+                for ((team_id, puzzle_id), solves) in self.solves.items() if team_id in shown
+                for solve in solves
+            ), key=lambda row: row[3]),
+            wrong=[row for row in counts(self.wrong) if row[0] in shown],
+            # Hints from hidden teams still count towards the totals.
+            asked_hints=counts(self.asked_hints),
+            canned_hints=counts(self.canned_hints),
+            unlocks=list(self.unlocks),
+        )
+
+
+def current_snapshot():
+    '''The up to date Snapshot, usually for the price of one cache read.'''
+    values = cache.get_many([SEQ_KEY, SNAPSHOT_KEY])
+    latest = values.get(SEQ_KEY, 0)
+    snapshot = values.get(SNAPSHOT_KEY)
+    if (snapshot is None or snapshot.seq > latest or latest - snapshot.seq > MAX_EVENTS
+            or timezone.now() - snapshot.built > MAX_AGE):
+        snapshot = Snapshot.build()
+    elif snapshot.seq < latest:
+        keys = [EVENT_KEY % seq for seq in range(snapshot.seq + 1, latest + 1)]
+        events = cache.get_many(keys)
+        for key in keys:
+            event = events.get(key)
+            if event == PENDING:
+                break
+            if event is None:
+                # Expired or lost; we can't tell what changed.
+                snapshot = Snapshot.build()
+                break
+            snapshot.apply(*event)
+            snapshot.seq += 1
+    else:
+        return snapshot
+    cache.set(SNAPSHOT_KEY, snapshot, None)
+    return snapshot
+
+
+def forget_snapshot():
+    '''Make the next reader rebuild the snapshot, e.g. after bulk changes.'''
+    cache.delete(SNAPSHOT_KEY)
+
+
+def record_change(kind, team_id, puzzle_id=None):
+    '''
+    Call when something the bigboard shows changes: kind is the model_name of
+    an AnswerSubmission, Hint, CannedHint, PuzzleUnlock or Team.
+    '''
+    defer(publish_change, kind, team_id, puzzle_id)
+
+def publish_change(kind, team_id, puzzle_id):
+    cache.add(SEQ_KEY, 0, None)
+    seq = cache.incr(SEQ_KEY)
+    cache.set(EVENT_KEY % seq, PENDING, PENDING_TIMEOUT)
+    try:
+        event = (kind, team_id, puzzle_id, current_value(kind, team_id, puzzle_id))
+        cache.set(EVENT_KEY % seq, event, EVENT_TIMEOUT)
+    except Exception:
+        # Readers would wait at the marker until it expired; without it (or
+        # the snapshot) they rebuild right away.
+        cache.delete_many([EVENT_KEY % seq, SNAPSHOT_KEY])
+        raise
+    if BigboardConsumer.is_watched():
+        # Only say which row changed; working it out is up to the consumers.
+        cache.set(LATEST_KEY % (team_id, puzzle_id), seq, EVENT_TIMEOUT)
+        BigboardConsumer.announce_change(seq, team_id, puzzle_id)
+
+def changed_row(seq, team_id, puzzle_id):
+    '''
+    Called by every BigboardConsumer for each announced change. Returns the
+    delta to push, or None if a later change to the same (team, puzzle) is
+    still queued behind this one, so a burst is only worked out once, or if
+    another consumer already took it.
+    '''
+    if cache.get(LATEST_KEY % (team_id, puzzle_id)) != seq:
+        return None
+    if not cache.add(CLAIM_KEY % seq, True, EVENT_TIMEOUT):
+        return None
+    return delta(team_id, puzzle_id)
+
+def current_value(kind, team_id, puzzle_id):
+    if kind == 'team':
+        return models.Team.objects.filter(id=team_id).first()
+    if kind == 'answersubmission':
+        submissions = models.AnswerSubmission.objects.filter(team_id=team_id, puzzle_id=puzzle_id)
+        return (
+            submissions.filter(is_correct=False).count(),
+            list(submissions.filter(is_correct=True).order_by('submitted_datetime')
+                .values_list('used_free_answer', 'submitted_datetime', 'solve_position')),
+        )
+    if kind == 'hint':
+        return models.Hint.objects.filter(team_id=team_id, puzzle_id=puzzle_id,
+            status=models.Hint.ANSWERED, is_followup=False).count()
+    if kind == 'cannedhint':
+        return models.CannedHint.objects.filter(team_id=team_id, puzzle_id=puzzle_id).count()
+    if kind == 'puzzleunlock':
+        return models.PuzzleUnlock.objects.filter(team_id=team_id, puzzle_id=puzzle_id).exists()
+    raise ValueError(kind)
+
+
+def delta(team_id, puzzle_id):
+    '''
+    What changed on both boards ("public" and "all"): the team's row_data
+    (None if it isn't on that board), and the totals for the puzzle. The
+    team's rank isn't recomputed; that needs everyone.
+    '''
+    puzzles = models.puzzle_catalog.get()
+    team = models.Team.objects.filter(id=team_id).first()
+    rows = {'public': None, 'all': None}
+    if team is not None:
+        def solves_before(**filters):
+            return Subquery(models.AnswerSubmission.objects.filter(
+                puzzle_id=OuterRef('puzzle_id'),
+                is_correct=True,
+                used_free_answer=False,
+                submitted_datetime__lte=OuterRef('submitted_datetime'),
+                **filters,
+            ).order_by().values('puzzle_id').annotate(count=Count('*')).values('count'))
+        correct = list(models.AnswerSubmission.objects
+            .filter(team_id=team_id, is_correct=True)
+            .order_by('submitted_datetime')
+            .annotate(public_position=solves_before(team__is_hidden=False), position=solves_before())
+            .values_list('puzzle_id', 'used_free_answer', 'submitted_datetime', 'solve_position',
+                'public_position', 'position'))
+        def counts(queryset):
+            return list(queryset.filter(team_id=team_id)
+                .values_list('team_id', 'puzzle_id').annotate(count=Count('*')).order_by())
+        team_rows = BigboardRows(
+            teams=[team],
+            correct=None,
+            wrong=counts(models.AnswerSubmission.objects.filter(is_correct=False)),
+            asked_hints=counts(models.Hint.objects.filter(status=models.Hint.ANSWERED, is_followup=False)),
+            canned_hints=counts(models.CannedHint.objects.all()),
+            unlocks=list(models.PuzzleUnlock.objects.filter(team_id=team_id).values_list('team_id', 'puzzle_id')),
+        )
+        for (board, public) in (('public', True), ('all', False)):
+            if public and team.is_hidden:
+                continue
+            # With only one team's solves, positions have to come from the
+            # database; compute_python uses the given ones with hide_hidden.
+            (entries, _) = compute_python(puzzles, team_rows._replace(correct=[
+                (team_id, puzzle_id, free, when, (stored or public_position) if public else position)
+                for (puzzle_id, free, when, stored, public_position, position) in correct
+            ]), hide_hidden=True)
+            rows[board] = row_data(entries[0])
+    return {
+        'team': team_id,
+        'puzzle': puzzle_id,
+        'rows': rows,
+        'totals': puzzle_totals(puzzle_id) if puzzle_id else None,
+    }
+
+def puzzle_totals(puzzle_id):
+    '''The column totals for one puzzle on both boards, as on the board.'''
+    public = Q(team__is_hidden=False)
+    solve = Q(is_correct=True, used_free_answer=False)
+    free = Q(is_correct=True, used_free_answer=True)
+    counts = models.AnswerSubmission.objects.filter(puzzle_id=puzzle_id).aggregate(
+        public_solves=Count('id', filter=public & solve),
+        public_free_solves=Count('id', filter=public & free),
+        public_total_guesses=Count('id', filter=public),
+        solves=Count('id', filter=solve),
+        free_solves=Count('id', filter=free),
+        total_guesses=Count('id'),
+    )
+    asked = models.Hint.objects.filter(puzzle_id=puzzle_id,
+        status=models.Hint.ANSWERED, is_followup=False).count()
+    canned = models.CannedHint.objects.filter(puzzle_id=puzzle_id).count()
+    hints = {'used_hints': 2 * asked + canned, 'requested_hints': asked, 'canned_hints': canned}
+    return {board: {
+        'solves': counts[prefix + 'solves'],
+        'free_solves': counts[prefix + 'free_solves'],
+        'total_guesses': counts[prefix + 'total_guesses'],
+        **hints,
+    } for (board, prefix) in (('public', 'public_'), ('all', ''))}
+
+
+# The last board computed in this process for each (hide_hidden, limit), as
+# (snapshot seq, puzzle catalog version, time, (board, annotated puzzles)), so
+# that fetching it a page at a time doesn't compute it for every page.
+_boards = {}
+
+def current_board(puzzles, hide_hidden, limit=0):
+    '''compute() on the current snapshot, reused until something changes.'''
+    key = (hide_hidden, limit)
+    version = models.puzzle_catalog.version()
+    memo = _boards.get(key)
+    if (memo and memo[0] == cache.get(SEQ_KEY, 0) and memo[1] == version
+            and timezone.now() - memo[2] < MAX_AGE):
+        return memo[3]
+    snapshot = current_snapshot()
+    result = compute(puzzles, snapshot.rows(hide_hidden), hide_hidden, limit)
+    if len(_boards) > 16:
+        _boards.clear()
+    # If the snapshot stopped at a pending event, its seq is behind and the
+    # next call tries again.
+    _boards[key] = (snapshot.seq, version, timezone.now(), result)
+    return result
+
+
+def hints_total(team):
+    '''
+    team.num_hints_total as of now. Teams get hints as time passes, so this
+    can't be read off the Team objects kept in the snapshot and _boards,
+    which would cache it (and now) for as long as they're around.
+    '''
+    team = copy.copy(team)
+    team._cache = {}
+    return team.num_hints_total
+
+
+def row_data(board_entry, rank=None):
+    '''One board entry as JSON for bigboard.js; cells are
+    [cls, solve position, wrong guesses, requested hints, canned hints].'''
+    team = board_entry['team']
+    return {
+        'team': team.id,
+        'name': team.team_name,
+        'url': reverse('team', args=(team.team_name,)),
+        'rank': rank,
+        'finished': board_entry['finished'],
+        'total_solves': board_entry['total_solves'],
+        'wrong_guesses': board_entry['wrong_guesses'],
+        'free_solves': board_entry['free_solves'],
+        'meta_solves': board_entry['meta_solves'],
+        'used_hints': board_entry['used_hints'],
+        'hints_total': hints_total(team),
+        'requested_hints': board_entry['requested_hints'],
+        'asked_hints': board_entry['asked_hints'],
+        'last_solve_time': format_time(board_entry['last_solve_time']),
+        'cells': [[
+            entry['cls'],
+            entry['solve_position'] or 0,
+            entry['wrong_guesses'],
+            entry['requested_hints'],
+            entry['canned_hints'],
+        ] for entry in board_entry['entries']],
+    }
+
+def totals_data(annotated_puzzles):
+    return [{
+        'puzzle': annotated['puzzle'].id,
+        **{key: value for (key, value) in annotated.items() if key != 'puzzle'},
+    } for annotated in annotated_puzzles]
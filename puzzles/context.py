@@ -1,13 +1,17 @@
 # Roughly speaking, this module is most important for implementing "global
 # variables" that are available in every template with the Django feature of
 # "context processors". But it also does some stuff with caching computed
-# properties of teams (the caching is only within a single request (?)). See
+# properties of teams (mostly only within a single request, but see
+# `persistent` below). See
 # https://docs.djangoproject.com/en/3.1/ref/templates/api/#using-requestcontext
 import datetime
 import inspect
+import time
 import types
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.urls import reverse
 from django.utils import timezone
 
@@ -38,7 +42,10 @@ def wrap_cacheable(name, fn):
         if not hasattr(self, '_cache'):
             self._cache = {}
         if name not in self._cache:
-            self._cache[name] = fn(self)
+            if getattr(fn, 'persistent', False):
+                self._cache[name] = load_persistent(self, name, fn)
+            else:
+                self._cache[name] = fn(self)
         return self._cache[name]
     def fset(self, value):
         if not hasattr(self, '_cache'):
@@ -65,6 +72,89 @@ def context_cache(cls):
     return cls
 
 
+# A value that is shared across requests and processes through the configured
+# Django cache (Redis in production), for data that is expensive to compute but
+# rarely changes, like the puzzle catalog. Each value has a version number,
+# also stored in the cache; invalidating bumps the version, so every process
+# notices on its next lookup and recomputes (or picks up whatever another
+# process already stored under the new version). Values can optionally also be
+# memoized in this process, in which case a lookup only costs one cache read
+# of the version. Positional arguments to get/invalidate select one of several
+# independently versioned values, e.g. one per team.
+class VersionedCache:
+    def __init__(self, name, compute, timeout=None, local=True):
+        self.name = name
+        self.compute = compute
+        self.timeout = timeout
+        self.local = {} if local else None
+
+    def key(self, *args):
+        return ':'.join(map(str, (self.name,) + args))
+
+    def version(self, *args):
+        key = self.key('version', *args)
+        version = cache.get(key)
+        if version is None:
+            # If the version was evicted, don't start over from a number we
+            # might have already used with different data.
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        return version
+
+    def get(self, *args):
+        version = self.version(*args)
+        if self.local is not None:
+            local_version, value = self.local.get(args, (None, None))
+            if local_version == version:
+                return value
+        key = self.key(*args, version)
+        value = cache.get(key)
+        if value is None:
+            value = self.compute(*args)
+            cache.set(key, value, self.timeout)
+        if self.local is not None:
+            self.local[args] = (version, value)
+        return value
+
+    def invalidate(self, *args):
+        def bump():
+            try:
+                cache.incr(self.key('version', *args))
+            except ValueError:
+                pass # not cached, so nothing to invalidate
+        # Bump right away so this process sees its own writes, and again on
+        # commit in case someone recomputed from the database in between.
+        bump()
+        transaction.on_commit(bump)
+
+
+# Decorator for a cached method of Team whose value is worth keeping across
+# requests, not just within one: a team refreshing the puzzles page shouldn't
+# have to reload all its submissions and unlocks every time. All such values
+# for a team are stored together in one snapshot in the Django cache, versioned
+# by team_snapshots, so anything that writes the underlying rows must call
+# team_snapshots.invalidate(team_id) (the signal receivers in models.py do this
+# for the usual models). Values are pickled, so they must not depend on the
+# current time or request; mutating one only affects the current request.
+def persistent(fn):
+    fn.persistent = True
+    return fn
+
+team_snapshots = VersionedCache('team-snapshot', dict, timeout=60 * 60, local=False)
+
+def load_persistent(team, name, fn):
+    if '_snapshot' not in team._cache:
+        # Snapshots contain puzzles, so they also go stale with the catalog.
+        key = team_snapshots.key(team.id,
+            team_snapshots.version(team.id), models.puzzle_catalog.version())
+        team._cache['_snapshot'] = (key, cache.get(key) or {})
+    key, snapshot = team._cache['_snapshot']
+    if name not in snapshot:
+        snapshot[name] = fn(team)
+        cache.set(key, snapshot, team_snapshots.timeout)
+    return snapshot[name]
+
+
 # This object is a request-scoped cache containing data calculated for the
 # current request. As a motivating example: showing current DEEP in the top
 # bar and rendering the puzzles page both need the list of puzzles the current
@@ -93,6 +183,9 @@ class BaseContext:
     def close_time(self):
         return HUNT_CLOSE_TIME
 
+    def all_puzzles(self):
+        return models.puzzle_catalog.get()
+
     # XXX do NOT name this the same as a field on the actual Team model or
     # you'll silently be unable to update that field because you'll be writing
     # to this instead of the actual model field!
@@ -162,9 +255,6 @@ class Context:
     def unlocks(self):
         return models.Team.compute_unlocks(self)
 
-    def all_puzzles(self):
-        return tuple(models.Puzzle.objects.select_related('round').order_by('round__order', 'order'))
-
     def unclaimed_hints(self):
         return models.Hint.objects.filter(status=models.Hint.NO_RESPONSE, claimer='').count()
 
@@ -0,0 +1,101 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from puzzles import bigboard
+from puzzles.hunt_config import HUNT_END_TIME, META_META_SLUG
+from puzzles.models import Puzzle, Round, Team
+
+def synthetic_hunt(rng, teams, rounds=8, puzzles_per_round=12):
+    '''
+    An in-memory hunt for comparing the bigboard engines without a database:
+    (puzzles, BigboardRows). Each round ends with its meta, and the last
+    round's meta is the metameta. Teams get through a random fraction of it,
+    with wrong guesses, hints, free answers and some solves after the hunt.
+    '''
+    puzzles = []
+    for r in range(rounds):
+        sample_round = Round(id=r + 1, name='Round %d' % r, slug='round-%d' % r)
+        for i in range(puzzles_per_round):
+            is_meta = i == puzzles_per_round - 1
+            slug = META_META_SLUG if is_meta and r == rounds - 1 else 'puzzle-%d-%d' % (r, i)
+            puzzles.append(Puzzle(id=len(puzzles) + 1, name=slug, slug=slug,
+                round=sample_round, order=i, is_meta=is_meta))
+        sample_round.meta_id = puzzles[-1].id
+
+    start = HUNT_END_TIME - datetime.timedelta(days=3)
+    team_list = []
+    correct = []
+    wrong = []
+    asked_hints = []
+    canned_hints = []
+    unlocks = []
+    for t in range(1, teams + 1):
+        team = Team(id=t, team_name='Team %d' % t, is_hidden=t % 50 == 0,
+            creation_time=start - datetime.timedelta(days=1))
+        team_list.append(team)
+        progress = rng.random()
+        for puzzle in puzzles:
+            if rng.random() > progress + 0.2:
+                continue
+            unlocks.append((t, puzzle.id))
+            if rng.random() < 0.5:
+                wrong.append((t, puzzle.id, rng.randint(1, 10)))
+            if rng.random() < 0.1:
+                asked_hints.append((t, puzzle.id, rng.randint(1, 2)))
+            if rng.random() < 0.2:
+                canned_hints.append((t, puzzle.id, rng.randint(1, 3)))
+            if rng.random() < progress:
+                when = start + datetime.timedelta(seconds=rng.randint(0, 4 * 24 * 3600))
+                correct.append((t, puzzle.id, rng.random() < 0.02, when, None))
+    correct.sort(key=lambda row: row[3])
+    # Stored positions, as AnswerStat.record_submission would have set them.
+    positions = {}
+    for (i, (t, puzzle_id, free, when, _)) in enumerate(correct):
+        if not free and not team_list[t - 1].is_hidden:
+            positions[puzzle_id] = positions.get(puzzle_id, 0) + 1
+            correct[i] = (t, puzzle_id, free, when, positions[puzzle_id])
+            if when < HUNT_END_TIME:
+                team_list[t - 1].last_solve_time = when
+    return (puzzles, bigboard.BigboardRows(
+        teams=team_list,
+        correct=correct,
+        wrong=wrong,
+        asked_hints=asked_hints,
+        canned_hints=canned_hints,
+        unlocks=unlocks,
+    ))
+
+class Command(BaseCommand):
+    help = 'Compare the NumPy bigboard engine against the original one on a synthetic hunt'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, nargs='+', default=[1000, 5000],
+            help='Numbers of teams to try')
+        parser.add_argument('--rounds', type=int, default=8)
+        parser.add_argument('--puzzles-per-round', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=3,
+            help='Runs of each engine; the fastest counts')
+
+    def measure(self, engine, puzzles, rows, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = engine(puzzles, rows, hide_hidden=False)
+            best = min(best, time.perf_counter() - start)
+        return (best, result)
+
+    def handle(self, *args, **options):
+        if bigboard.np is None:
+            raise CommandError('NumPy is not installed, so the bigboard uses the original engine')
+        for teams in options['teams']:
+            (puzzles, rows) = synthetic_hunt(random.Random(teams), teams,
+                options['rounds'], options['puzzles_per_round'])
+            (python_time, expected) = self.measure(bigboard.compute_python, puzzles, rows, options['repeat'])
+            (numpy_time, actual) = self.measure(bigboard.compute_numpy, puzzles, rows, options['repeat'])
+            if actual != expected:
+                raise CommandError('The engines disagree with {} teams'.format(teams))
+            self.stdout.write('{:>6} teams x {} puzzles: {:.3f}s before, {:.3f}s NumPy ({:.1f}x)'.format(
+                teams, len(puzzles), python_time, numpy_time, python_time / numpy_time))
@@ -0,0 +1,58 @@
+import random
+import time
+import unicodedata
+
+from django.core.management.base import BaseCommand
+
+from puzzles import normalization
+
+# What Puzzle.normalize_answer used to do, for comparison.
+def reference_normalize_answer(s):
+    nfkd_form = unicodedata.normalize('NFKD', s)
+    return ''.join([c.upper() for c in nfkd_form if c.isalpha()])
+
+LATIN = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZéüñ '
+DIGITS_AND_PUNCTUATION = '0123456789 -!?.,\''
+
+def random_guess(rng, kind):
+    length = rng.randint(3, 20)
+    if kind == 'hangul':
+        # Precomposed syllables 가 through 힣.
+        return ''.join(chr(rng.randint(0xAC00, 0xD7A3)) for _ in range(length))
+    if kind == 'latin':
+        return ''.join(rng.choice(LATIN) for _ in range(length))
+    return ''.join(rng.choice((
+        lambda: chr(rng.randint(0xAC00, 0xD7A3)),
+        lambda: rng.choice(LATIN),
+        lambda: rng.choice(DIGITS_AND_PUNCTUATION),
+    ))() for _ in range(length))
+
+class Command(BaseCommand):
+    help = 'Compare answer normalization throughput against the old per-character version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guesses', type=int, default=2000,
+            help='Distinct random guesses per kind of input')
+        parser.add_argument('--repeat', type=int, default=50,
+            help='Times to normalize each guess')
+
+    def measure(self, fn, guesses, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for guess in guesses:
+                fn(guess)
+        return len(guesses) * repeat / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        for kind in ('hangul', 'latin', 'mixed'):
+            guesses = [random_guess(rng, kind) for _ in range(options['guesses'])]
+            for guess in guesses:
+                assert normalization.normalize_answer(guess) == reference_normalize_answer(guess), guess
+            normalization.normalize_answer.cache_clear()
+            reference = self.measure(reference_normalize_answer, guesses, options['repeat'])
+            # Without the memoized results, so only the translation table helps.
+            uncached = self.measure(normalization.normalize_answer.__wrapped__, guesses, options['repeat'])
+            cached = self.measure(normalization.normalize_answer, guesses, options['repeat'])
+            self.stdout.write('{:>6}: {:>10,.0f}/s before, {:>10,.0f}/s translate ({:.1f}x), {:>10,.0f}/s memoized ({:.1f}x)'.format(
+                kind, reference, uncached, uncached / reference, cached, cached / reference))
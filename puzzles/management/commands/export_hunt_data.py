@@ -0,0 +1,245 @@
+import array
+import datetime
+import itertools
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from puzzles.models import (
+    AnswerSubmission, CannedHint, Hint, Puzzle, PuzzleUnlock, Survey, Team,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+TABLES = {
+    'teams': Team,
+    'puzzles': Puzzle,
+    'unlocks': PuzzleUnlock,
+    'submissions': AnswerSubmission,
+    'hints': Hint,
+    'canned_hints': CannedHint,
+    'surveys': Survey,
+}
+# Foreign keys to these are dictionary-encoded: each row stores a small index
+# into the list of all their ids, which pandas loads as a categorical.
+DICTIONARY_MODELS = (Team, Puzzle)
+
+INTEGER_TYPES = {
+    'AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveSmallIntegerField', 'PositiveBigIntegerField',
+    'ForeignKey', 'OneToOneField',
+}
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+# Stands in for NULL in the int64 columns of the raw format.
+RAW_NULL = -2 ** 63
+
+
+class Column:
+    '''How one model field is stored: as int64, bool, string, or a
+    dictionary index. Timestamps and durations are int64 microseconds (since
+    the Unix epoch, in UTC, for timestamps).'''
+
+    def __init__(self, field, dictionaries):
+        self.name = field.attname
+        internal_type = field.get_internal_type()
+        self.dictionary = None
+        if field.is_relation and field.related_model in DICTIONARY_MODELS:
+            self.dictionary = dictionaries[field.related_model]
+        elif field.choices:
+            self.dictionary = [value for (value, _) in field.flatchoices]
+        if internal_type == 'DateTimeField':
+            self.kind = 'timestamp'
+            self.convert = lambda value: (value - EPOCH) // MICROSECOND
+        elif internal_type == 'DurationField':
+            self.kind = 'duration'
+            self.convert = lambda value: value // MICROSECOND
+        elif internal_type in INTEGER_TYPES:
+            self.kind = 'int64'
+            self.convert = int
+        elif internal_type == 'BooleanField':
+            self.kind = 'bool'
+            self.convert = bool
+        else:
+            self.kind = 'string'
+            self.convert = str
+        if self.dictionary is not None:
+            index = {value: i for (i, value) in enumerate(self.dictionary)}
+            def convert(value):
+                try:
+                    return index[value]
+                except KeyError:
+                    # Only choices can get here; the rows are filtered so
+                    # that every foreign key is in its dictionary.
+                    raise CommandError('{}.{} has {!r}, which is not one of its choices'.format(
+                        field.model._meta.db_table, self.name, value))
+            self.convert = convert
+
+    def values(self, rows, i):
+        convert = self.convert
+        return [None if row[i] is None else convert(row[i]) for row in rows]
+
+    def arrow_type(self):
+        value_type = {
+            'timestamp': pa.timestamp('us', tz='UTC'),
+            'duration': pa.duration('us'),
+            'int64': pa.int64(),
+            'bool': pa.bool_(),
+            'string': pa.string(),
+        }[self.kind]
+        if self.dictionary is None:
+            return value_type
+        return pa.dictionary(pa.int32(), value_type)
+
+    def arrow_array(self, values):
+        if self.dictionary is None:
+            return pa.array(values, type=self.arrow_type())
+        return pa.DictionaryArray.from_arrays(
+            pa.array(values, type=pa.int32()),
+            pa.array(self.dictionary, type=self.arrow_type().value_type))
+
+
+class ArrowWriter:
+    '''One .parquet or .arrow (Arrow IPC) file per table.'''
+
+    def __init__(self, path, columns, parquet):
+        self.columns = columns
+        self.schema = pa.schema([(column.name, column.arrow_type()) for column in columns])
+        self.parquet = parquet
+        if parquet:
+            self.writer = pq.ParquetWriter(path + '.parquet', self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path + '.arrow', self.schema)
+
+    def write(self, rows):
+        batch = pa.RecordBatch.from_arrays([
+            column.arrow_array(column.values(rows, i))
+            for (i, column) in enumerate(self.columns)
+        ], schema=self.schema)
+        if self.parquet:
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+
+    def close(self):
+        self.writer.close()
+
+
+class RawWriter:
+    '''
+    Without pyarrow: a directory per table with one file per column, plus a
+    schema.json describing them. Numbers are little-endian arrays that
+    numpy.fromfile can read directly (int64, with -2**63 for NULL; bools as
+    int8, with -1 for NULL); dictionary-encoded columns are int32 indices
+    (-1 for NULL) into the "dictionary" listed in schema.json; strings are
+    one JSON value per line.
+    '''
+
+    def __init__(self, path, columns):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+        self.names = [column.name + self.suffix(column) for column in columns]
+        self.files = [
+            open(os.path.join(path, name), 'w', encoding='utf-8') if name.endswith('.jsonl')
+            else open(os.path.join(path, name), 'wb')
+            for name in self.names
+        ]
+
+    @staticmethod
+    def suffix(column):
+        if column.dictionary is not None:
+            return '.i32'
+        if column.kind == 'bool':
+            return '.i8'
+        if column.kind == 'string':
+            return '.jsonl'
+        return '.i64'
+
+    def write(self, rows):
+        self.rows += len(rows)
+        for (i, (column, f)) in enumerate(zip(self.columns, self.files)):
+            values = column.values(rows, i)
+            suffix = self.suffix(column)
+            if suffix == '.jsonl':
+                f.writelines(json.dumps(value, ensure_ascii=False) + '\n' for value in values)
+                continue
+            (typecode, null) = {'.i32': ('i', -1), '.i8': ('b', -1), '.i64': ('q', RAW_NULL)}[suffix]
+            data = array.array(typecode, (null if value is None else value for value in values))
+            if sys.byteorder == 'big':
+                data.byteswap()
+            data.tofile(f)
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        schema = {'rows': self.rows, 'columns': [{
+            'name': column.name,
+            'type': column.kind,
+            'file': name,
+            **({'dictionary': column.dictionary} if column.dictionary is not None else {}),
+        } for (column, name) in zip(self.columns, self.names)]}
+        with open(os.path.join(self.path, 'schema.json'), 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False, indent=1)
+
+
+class Command(BaseCommand):
+    help = '''Export teams, puzzles, unlocks, submissions, hints, canned hints
+    and surveys to columnar files for analysis after the hunt'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory to write the files to')
+        parser.add_argument('--format', choices=('parquet', 'arrow', 'raw'),
+            help='parquet or arrow (Arrow IPC) need pyarrow; raw is a directory of '
+            'column files per table. Defaults to parquet if pyarrow is installed')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+            help='Rows to read from the database and write at a time')
+        parser.add_argument('--tables', nargs='+', choices=TABLES, default=list(TABLES),
+            help='Tables to export (default: all)')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('parquet' if pa else 'raw')
+        if fmt != 'raw' and pa is None:
+            raise CommandError('--format {} needs pyarrow; pip install pyarrow or use --format raw'.format(fmt))
+        os.makedirs(options['output'], exist_ok=True)
+        dictionaries = {
+            model: list(model.objects.order_by('id').values_list('id', flat=True))
+            for model in DICTIONARY_MODELS
+        }
+        for name in options['tables']:
+            start = time.monotonic()
+            rows = self.export(TABLES[name], os.path.join(options['output'], name),
+                fmt, dictionaries, options['chunk_size'])
+            self.stdout.write('Exported {} {} in {:.1f}s'.format(rows, name, time.monotonic() - start))
+
+    def export(self, model, path, fmt, dictionaries, chunk_size):
+        fields = model._meta.concrete_fields
+        columns = [Column(field, dictionaries) for field in fields]
+        queryset = model.objects.order_by('pk')
+        # Leave out rows for teams or puzzles created since we listed them
+        # (ids only go up), so every dictionary index is valid.
+        for field in fields:
+            ids = dictionaries.get(field.related_model) if field.is_relation else None
+            if ids is not None:
+                queryset = queryset.filter(**{field.attname + '__lte': ids[-1] if ids else 0})
+        if fmt == 'raw':
+            writer = RawWriter(path, columns)
+        else:
+            writer = ArrowWriter(path, columns, parquet=fmt == 'parquet')
+        rows = queryset.values_list(*(field.attname for field in fields)).iterator(chunk_size=chunk_size)
+        count = 0
+        try:
+            for chunk in iter(lambda: list(itertools.islice(rows, chunk_size)), []):
+                writer.write(chunk)
+                count += len(chunk)
+        finally:
+            writer.close()
+        return count
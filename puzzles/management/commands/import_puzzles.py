@@ -1,3 +1,4 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.utils.text import slugify
 import puzzles.models as models
@@ -65,3 +66,9 @@ class Command(BaseCommand):
                 round.meta = puzzle
                 round.save()
             self.stdout.write(self.style.SUCCESS('Imported %s' % puzzle))
+        # The model signals should have done this already, but make sure no
+        # server is left showing the old puzzles.
+        models.puzzle_catalog.invalidate()
+        # Unlocks were deleted above and only get recomputed on events, so
+        # give existing teams whatever the new puzzles' rules say they have.
+        call_command('recompute_unlocks', stdout=self.stdout)
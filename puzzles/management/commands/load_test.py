@@ -0,0 +1,180 @@
+import asyncio
+import collections
+import random
+import re
+import time
+
+import aiohttp
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from puzzles.models import LeaderboardEntry, Puzzle, Team
+
+USERNAME_PREFIX = 'loadtest'
+PASSWORD = 'password'
+PUZZLE_LINK = re.compile(r'href="/puzzle/([\w-]+)"')
+
+def percentile(values, p):
+    '''Nearest-rank percentile of a sorted list.'''
+    if not values:
+        return 0
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+def summarize(latencies, errors, seconds):
+    '''Yield (endpoint, requests, errors, requests/s, p50, p95, p99), times in ms.'''
+    for endpoint in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(endpoint, ()))
+        yield (endpoint, len(values), errors.get(endpoint, 0), len(values) / seconds,
+            *(1000 * percentile(values, p) for p in (50, 95, 99)))
+
+class Command(BaseCommand):
+    help = '''Simulate teams hammering a running server the way they do when the
+    hunt opens, and report latency percentiles and throughput per endpoint'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('seed', 'run', 'cleanup'),
+            help='seed: create the load test teams; run: simulate them against --url; '
+            'cleanup: delete them again')
+        parser.add_argument('--teams', type=int, default=100,
+            help='Number of teams to create or simulate')
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+            help='Server to load (run it with the same database)')
+        parser.add_argument('--duration', type=float, default=60,
+            help='Seconds to keep polling and submitting after logging in')
+        parser.add_argument('--think-time', type=float, default=2,
+            help='Average seconds a team waits between actions')
+        parser.add_argument('--solve-rate', type=float, default=0.3,
+            help='Chance that a submission is the right answer')
+        parser.add_argument('--hint-rate', type=float, default=0.05,
+            help='Chance that an action opens a canned hint')
+        parser.add_argument('--no-websockets', action='store_true',
+            help='Don\'t hold /ws/team open for each team')
+
+    def handle(self, *args, **options):
+        if options['action'] == 'seed':
+            self.seed(options['teams'])
+        elif options['action'] == 'cleanup':
+            users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+            # Team.user is protected, so the teams have to go first.
+            count, _ = Team.objects.filter(user__in=users).delete()
+            users.delete()
+            self.stdout.write('Deleted {} load test teams and everything they did'.format(count))
+        else:
+            self.run(options)
+
+    # Teams that haven't started yet, so the run starts with everyone pressing
+    # the start button at once. Hashing one password for all of them keeps
+    # seeding thousands of teams fast.
+    def seed(self, n):
+        password = make_password(PASSWORD)
+        existing = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        users = User.objects.bulk_create([
+            User(username='%s%d' % (USERNAME_PREFIX, i), password=password)
+            for i in range(existing, existing + n)
+        ])
+        teams = Team.objects.bulk_create([
+            Team(user=user, team_name='Load Test %s' % user.username[len(USERNAME_PREFIX):])
+            for user in users
+        ])
+        LeaderboardEntry.rebuild([team.id for team in teams])
+        self.stdout.write('Created {} teams; log in as {}N with password "{}"'.format(
+            n, USERNAME_PREFIX, PASSWORD))
+
+    def run(self, options):
+        usernames = list(User.objects
+            .filter(username__startswith=USERNAME_PREFIX, team__isnull=False)
+            .order_by('id').values_list('username', flat=True)[:options['teams']])
+        if not usernames:
+            raise CommandError('No load test teams; run "load_test seed" first')
+        answers = dict(Puzzle.objects.values_list('slug', 'answer'))
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.messages = 0
+        start = time.monotonic()
+        asyncio.run(self.simulate(usernames, answers, options))
+        seconds = time.monotonic() - start
+
+        self.stdout.write('{} teams for {:.0f}s against {}; {} websocket messages received'.format(
+            len(usernames), seconds, options['url'], self.messages))
+        self.stdout.write('{:<16} {:>8} {:>7} {:>8} {:>8} {:>8} {:>8}'.format(
+            'endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for row in summarize(self.latencies, self.errors, seconds):
+            self.stdout.write('{:<16} {:>8} {:>7} {:>8.1f} {:>8.0f} {:>8.0f} {:>8.0f}'.format(*row))
+
+    async def simulate(self, usernames, answers, options):
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as shared:
+            await asyncio.gather(*(
+                self.team(shared, username, answers, options) for username in usernames))
+
+    async def request(self, session, endpoint, method, url, **kwargs):
+        start = time.monotonic()
+        try:
+            async with session.request(method, url, allow_redirects=False, **kwargs) as response:
+                body = await response.text()
+                if response.status >= 400:
+                    self.errors[endpoint] += 1
+                    return None
+        except aiohttp.ClientError:
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append(time.monotonic() - start)
+        return body
+
+    async def post(self, session, endpoint, url, data):
+        cookie = session.cookie_jar.filter_cookies(url).get('csrftoken')
+        data['csrfmiddlewaretoken'] = cookie.value if cookie else ''
+        return await self.request(session, endpoint, 'POST', url, data=data,
+            headers={'Referer': url})
+
+    async def hold_websocket(self, session, url):
+        start = time.monotonic()
+        try:
+            async with session.ws_connect(url) as ws:
+                self.latencies['ws connect'].append(time.monotonic() - start)
+                async for _ in ws:
+                    self.messages += 1
+        except aiohttp.ClientError:
+            self.errors['ws connect'] += 1
+
+    async def team(self, shared, username, answers, options):
+        url = options['url'].rstrip('/')
+        rng = random.Random(username)
+        # Each team needs its own cookies, but they can share connections.
+        async with aiohttp.ClientSession(connector=shared.connector, connector_owner=False,
+                cookie_jar=aiohttp.CookieJar(unsafe=True)) as session:
+            # Everyone shows up within the first few seconds.
+            await asyncio.sleep(rng.uniform(0, 5))
+            await self.request(session, 'login page', 'GET', url + '/login')
+            await self.post(session, 'login', url + '/login',
+                {'username': username, 'password': PASSWORD})
+            await self.post(session, 'start hunt', url + '/start-hunt/', {})
+            websocket = None
+            if not options['no_websockets']:
+                websocket = asyncio.create_task(self.hold_websocket(
+                    session, url.replace('http', 'ws', 1) + '/ws/team'))
+
+            deadline = time.monotonic() + options['duration']
+            slugs = []
+            solved = set()
+            while time.monotonic() < deadline:
+                page = await self.request(session, 'puzzles', 'GET', url + '/puzzles')
+                if page:
+                    slugs = [slug for slug in PUZZLE_LINK.findall(page) if slug not in solved] or slugs
+                if slugs:
+                    slug = rng.choice(slugs)
+                    if rng.random() < options['hint_rate']:
+                        await self.post(session, 'canned hint', url + '/hints/' + slug,
+                            {'unlock_canned_hint': str(rng.randint(1, 3))})
+                    else:
+                        correct = rng.random() < options['solve_rate']
+                        answer = answers.get(slug) if correct else 'WRONG%d' % rng.randint(0, 10**6)
+                        await self.post(session, 'solve', url + '/solve/' + slug, {'answer': answer})
+                        if correct:
+                            solved.add(slug)
+                await asyncio.sleep(rng.expovariate(1 / options['think_time']))
+            if websocket:
+                websocket.cancel()
+                await asyncio.gather(websocket, return_exceptions=True)
@@ -0,0 +1,67 @@
+import datetime
+import heapq
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from puzzles.messaging import flush_deferred
+from puzzles.models import Team
+
+class Command(BaseCommand):
+    help = 'Save time unlocks as they come due and notify teams (runs forever unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+            help='Process whatever is already due and exit, e.g. from cron')
+        parser.add_argument('--refresh', type=float, default=60,
+            help='Seconds between rescans for teams that started or toggled time unlocks')
+
+    # A min-heap of (next time unlock, team id) over the teams that have one.
+    def load_heap(self):
+        heap = []
+        teams = Team.objects.filter(
+            team_start_time__isnull=False,
+            allow_time_unlocks=True,
+            is_prerelease_testsolver=False,
+        )
+        for team in teams:
+            if team.next_time_unlock:
+                heap.append((team.next_time_unlock, team.id))
+        heapq.heapify(heap)
+        return heap
+
+    def process(self, team_id):
+        team = Team.objects.filter(id=team_id).first()
+        if not team:
+            return None
+        unlocks = Team.update_unlocks(team, notify_time_unlocks=True)
+        if unlocks:
+            self.stdout.write('Unlocked {} for {}'.format(
+                ', '.join(str(unlock.puzzle) for unlock in unlocks), team))
+        # update_unlocks added the new unlocks to team.db_unlocks, so this is
+        # the boundary after the ones just processed. If nothing unlocked
+        # (the hunt is over, say) it's still in the past; drop the team.
+        if team.next_time_unlock and team.next_time_unlock > team.now:
+            return team.next_time_unlock
+
+    def handle(self, *args, **options):
+        heap = []
+        next_refresh = timezone.localtime()
+        while True:
+            now = timezone.localtime()
+            if now >= next_refresh:
+                heap = self.load_heap()
+                next_refresh = now + datetime.timedelta(seconds=options['refresh'])
+            due = []
+            while heap and heap[0][0] <= now:
+                due.append(heapq.heappop(heap)[1])
+            for team_id in due:
+                boundary = self.process(team_id)
+                if boundary:
+                    heapq.heappush(heap, (boundary, team_id))
+            if options['once']:
+                flush_deferred()
+                break
+            wake = min(heap[0][0], next_refresh) if heap else next_refresh
+            time.sleep(max(0, (wake - timezone.localtime()).total_seconds()))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from puzzles.models import LeaderboardEntry
+
+class Command(BaseCommand):
+    help = 'Recompute every team\'s leaderboard entry from their answer submissions'
+
+    def handle(self, *args, **options):
+        count = LeaderboardEntry.rebuild()
+        self.stdout.write(self.style.SUCCESS('Rebuilt leaderboard entries for {} teams'.format(count)))
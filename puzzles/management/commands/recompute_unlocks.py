@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from puzzles.bigboard import forget_snapshot
+from puzzles.messaging import flush_deferred
+from puzzles.models import Puzzle, Team
+
+class Command(BaseCommand):
+    help = ('Re-evaluate every team\'s unlock rules and save any missing puzzle unlocks '
+        '(and fix any puzzle\'s normalized answer that was changed without saving it)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_names', nargs='*', type=str,
+            help='Only these teams (default: all)')
+        parser.add_argument('--quiet', action='store_true',
+            help='Don\'t notify teams or the bigboard of each unlock, e.g. when backfilling after a deploy')
+
+    def handle(self, *args, **options):
+        refilled = Puzzle.refill_normalized_answers()
+        if refilled:
+            self.stdout.write('Refilled {} normalized answers'.format(refilled))
+        teams = Team.objects.all()
+        if options['team_names']:
+            teams = teams.filter(team_name__in=options['team_names'])
+        count = 0
+        for team in teams:
+            count += len(Team.update_unlocks(team, quiet=options['quiet']))
+        if options['quiet'] and count:
+            forget_snapshot()
+        flush_deferred()
+        self.stdout.write(self.style.SUCCESS('Created {} puzzle unlocks'.format(count)))
@@ -0,0 +1,97 @@
+import asyncio
+import datetime
+import logging
+import traceback
+
+from asgiref.sync import sync_to_async
+import discord
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from puzzles.messaging import discord_interface, dispatch_general_alert
+from puzzles.models import OutboundHintMessage
+
+logger = logging.getLogger('puzzles.messaging')
+
+MAX_ATTEMPTS = 8
+MAX_BACKOFF = datetime.timedelta(minutes=5)
+
+class Command(BaseCommand):
+    help = 'Stay logged in to Discord and post the hint messages queued by the web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--avatar-refresh', type=float, default=600,
+            help='Seconds between refreshes of the claimers\' avatars')
+        parser.add_argument('--poll', type=float, default=1,
+            help='Seconds to wait when no hint messages are queued')
+
+    def handle(self, *args, **options):
+        if not discord_interface.TOKEN:
+            raise CommandError('DISCORD_TOKEN is not set')
+        asyncio.run(self.run(options['avatar_refresh'], options['poll']))
+
+    async def run(self, avatar_refresh, poll):
+        # You need to enable the "Server Members Intent" under "Privileged
+        # Gateway Intents" on the Discord Developer Portal for the avatars.
+        intents = discord.Intents.default()
+        intents.members = True
+        client = discord.Client(intents=intents)
+        await client.login(discord_interface.TOKEN)
+        try:
+            await asyncio.gather(
+                self.relay_messages(client, poll),
+                self.refresh_avatars(client, avatar_refresh),
+            )
+        finally:
+            await client.close()
+
+    def due_messages(self):
+        close_old_connections()
+        return list(OutboundHintMessage.objects
+            .filter(next_attempt_time__lte=timezone.now())
+            .order_by('id')[:100])
+
+    def retry_later(self, message, error):
+        message.attempts += 1
+        if message.attempts >= MAX_ATTEMPTS:
+            message.delete()
+            dispatch_general_alert(_('Discord API failure, giving up on a hint message after {} attempts:\n{}\n{}').format(
+                message.attempts, message.content, error))
+            return
+        backoff = min(MAX_BACKOFF, datetime.timedelta(seconds=2 ** message.attempts))
+        message.next_attempt_time = timezone.now() + backoff
+        message.save(update_fields=('attempts', 'next_attempt_time'))
+
+    async def relay_messages(self, client, poll):
+        while True:
+            due = await sync_to_async(self.due_messages)()
+            for message in due:
+                try:
+                    await client.http.send_message(discord_interface.HINT_CHANNEL,
+                        message.content, embeds=message.embeds)
+                except Exception:
+                    await sync_to_async(self.retry_later)(message, traceback.format_exc())
+                else:
+                    await sync_to_async(message.delete)()
+            if not due:
+                await asyncio.sleep(poll)
+
+    async def refresh_avatars(self, client, every):
+        while True:
+            avatars = {}
+            try:
+                guild = await client.fetch_guild(discord_interface.GUILD)
+                async for member in guild.fetch_members(limit=None):
+                    avatar = member.display_avatar.url
+                    for name in (member.nick, member.name, member.global_name):
+                        if name:
+                            avatars[name] = avatar
+                await cache.aset(discord_interface.AVATARS_KEY, avatars, None)
+                self.stdout.write('Refreshed {} avatars'.format(len(avatars)))
+            except Exception:
+                logger.error('Failed to fetch guild or members for avatars.\n' + traceback.format_exc())
+            await asyncio.sleep(every)
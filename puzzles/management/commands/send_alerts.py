@@ -0,0 +1,104 @@
+import datetime
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from puzzles.messaging import alert_counters, coalesce_alerts, count_alerts, post_discord_alert
+from puzzles.models import OutboundAlert
+
+logger = logging.getLogger('puzzles.messaging')
+
+MAX_ATTEMPTS = 8
+MAX_BACKOFF = datetime.timedelta(minutes=5)
+
+class Command(BaseCommand):
+    help = 'Post queued Discord alerts, retrying failures with backoff (runs forever unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+            help='Send whatever is due and exit')
+        parser.add_argument('--poll', type=float, default=1,
+            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--timeout', type=float, default=10,
+            help='Seconds to wait for Discord before retrying')
+
+    def drop(self, alerts, reason):
+        logger.error('Dropping %d alerts (%s): %s', len(alerts), reason,
+            '\n'.join(alert.content for alert in alerts))
+        OutboundAlert.objects.filter(id__in=[alert.id for alert in alerts]).delete()
+        count_alerts('dropped', len(alerts))
+
+    def retry_later(self, alerts, reason):
+        for alert in alerts:
+            alert.attempts += 1
+            if alert.attempts >= MAX_ATTEMPTS:
+                self.drop([alert], 'after %d attempts, %s' % (alert.attempts, reason))
+                continue
+            backoff = min(MAX_BACKOFF, datetime.timedelta(seconds=2 ** alert.attempts))
+            alert.next_attempt_time = timezone.now() + backoff
+            alert.save(update_fields=('attempts', 'next_attempt_time'))
+
+    # Being rate limited isn't the alerts' fault, so this doesn't count as an
+    # attempt.
+    def postpone(self, alerts, until):
+        OutboundAlert.objects.filter(id__in=[alert.id for alert in alerts]).update(
+            next_attempt_time=until)
+
+    def rate_limit(self, webhook, response):
+        # Discord sends X-RateLimit-Remaining/Reset-After on every response,
+        # and Retry-After with a 429.
+        if response.status_code == 429:
+            wait = response.headers.get('Retry-After')
+        elif response.headers.get('X-RateLimit-Remaining') == '0':
+            wait = response.headers.get('X-RateLimit-Reset-After')
+        else:
+            return
+        try:
+            wait = float(wait)
+        except (TypeError, ValueError):
+            wait = 1
+        self.blocked_until[webhook] = timezone.now() + datetime.timedelta(seconds=wait)
+
+    def send(self, session, webhook, username, alerts, content, timeout):
+        if self.blocked_until.get(webhook, timezone.now()) > timezone.now():
+            self.postpone(alerts, self.blocked_until[webhook])
+            return
+        try:
+            response = post_discord_alert(session, webhook, username, content, timeout)
+        except requests.RequestException as e:
+            self.retry_later(alerts, e)
+            return
+        self.rate_limit(webhook, response)
+        if response.ok:
+            OutboundAlert.objects.filter(id__in=[alert.id for alert in alerts]).delete()
+            count_alerts('sent', len(alerts))
+        elif response.status_code == 429:
+            self.postpone(alerts, self.blocked_until[webhook])
+        elif response.status_code >= 500:
+            self.retry_later(alerts, response.status_code)
+        else:
+            # Retrying a bad request won't make it any better.
+            self.drop(alerts, 'rejected with %d' % response.status_code)
+
+    def handle(self, *args, **options):
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_maxsize=4))
+        self.blocked_until = {}
+        while True:
+            due = list(OutboundAlert.objects
+                .filter(next_attempt_time__lte=timezone.now())
+                .order_by('id')[:500])
+            for batch in coalesce_alerts(due):
+                self.send(session, *batch, options['timeout'])
+            if due:
+                logger.info('Alerts: %s', ', '.join(
+                    '%d %s' % (count, counter) for (counter, count) in alert_counters().items()))
+            if options['once']:
+                break
+            if not due:
+                time.sleep(options['poll'])
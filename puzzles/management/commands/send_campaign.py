@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from puzzles.messaging import campaign_message, send_campaign
+from puzzles.models import MailCampaign
+
+class Command(BaseCommand):
+    help = ('Email a mail campaign to every team member, resuming where it left off; '
+        'without a campaign id, send the ones queued in the admin (runs forever unless --once)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int, nargs='?')
+        parser.add_argument('--test', metavar='EMAIL',
+            help='Only send one copy to this address, e.g. your own')
+        parser.add_argument('--chunk-size', type=int, default=50,
+            help='Recipients to BCC on each message')
+        parser.add_argument('--concurrency', type=int, default=4,
+            help='SMTP connections to send on at once')
+        parser.add_argument('--per-second', type=float, default=None,
+            help='Maximum messages per second, if your provider limits it')
+        parser.add_argument('--once', action='store_true',
+            help='Without a campaign id, send the queued campaigns and exit')
+        parser.add_argument('--poll', type=float, default=10,
+            help='Without a campaign id, seconds to wait when nothing is queued')
+
+    def send(self, campaign, options):
+        (count, seconds) = send_campaign(campaign,
+            chunk_size=options['chunk_size'],
+            concurrency=options['concurrency'],
+            per_second=options['per_second'])
+        self.stdout.write(self.style.SUCCESS(
+            '{}: handled {} recipients in {:.1f}s ({:.1f}/s); {} sent and {} failed in total'.format(
+                campaign, count, seconds, count / seconds if seconds else 0,
+                campaign.sent_count, campaign.failed_count)))
+
+    def handle(self, *args, **options):
+        if options['campaign_id'] is None:
+            if options['test']:
+                raise CommandError('--test needs a campaign id')
+            while True:
+                queued = list(MailCampaign.objects.filter(
+                    queued_time__isnull=False,
+                    finished_time__isnull=True,
+                ).order_by('queued_time'))
+                for campaign in queued:
+                    self.send(campaign, options)
+                if options['once']:
+                    break
+                if not queued:
+                    time.sleep(options['poll'])
+            return
+        campaign = MailCampaign.objects.filter(id=options['campaign_id']).first()
+        if not campaign:
+            raise CommandError('No campaign with id {}'.format(options['campaign_id']))
+        if options['test']:
+            campaign_message(campaign, [options['test']]).send()
+            self.stdout.write(self.style.SUCCESS('Sent a test to {}'.format(options['test'])))
+            return
+        self.send(campaign, options)
@@ -0,0 +1,62 @@
+import smtplib
+import time
+import traceback
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from puzzles.models import OutboundEmail
+
+SMTP_TIMEOUT = 30
+
+class Command(BaseCommand):
+    help = 'Send queued emails over one SMTP connection per batch (runs forever unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+            help='Send whatever is due and exit')
+        parser.add_argument('--poll', type=float, default=2,
+            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--batch', type=int, default=50,
+            help='Emails to send per SMTP connection')
+
+    def send_batch(self, emails):
+        connection = get_connection(timeout=SMTP_TIMEOUT)
+        try:
+            for email in emails:
+                try:
+                    # Opening first keeps the connection open across
+                    # messages; this is a no-op if it already is, and
+                    # reconnects if it was closed after an error below.
+                    connection.open()
+                    if connection.send_messages([email.message(connection)]) != 1:
+                        raise RuntimeError(_('Unknown failure???'))
+                except smtplib.SMTPRecipientsRefused:
+                    email.record_failure(traceback.format_exc(), permanent=True)
+                except Exception:
+                    email.record_failure(traceback.format_exc(), permanent=False)
+                    # Don't trust the connection after an error.
+                    connection.close()
+                else:
+                    email.record_sent()
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        while True:
+            due = list(OutboundEmail.objects.filter(
+                status=OutboundEmail.QUEUED,
+                next_attempt_time__lte=timezone.now(),
+                campaign=None,
+            ).order_by('id')[:options['batch']])
+            if due:
+                start = time.monotonic()
+                self.send_batch(due)
+                self.stdout.write('Sent batch of {} in {:.1f}s'.format(
+                    len(due), time.monotonic() - start))
+            if options['once']:
+                break
+            if not due:
+                time.sleep(options['poll'])
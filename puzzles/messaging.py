@@ -1,23 +1,31 @@
 import asyncio
 import collections
+import concurrent.futures
 import json
 import logging
+import queue
 import requests
+import smtplib
+import threading
+import time
 import traceback
 
 from asgiref.sync import async_to_sync
 from channels.generic.websocket import WebsocketConsumer
 from channels.layers import get_channel_layer
-import discord
 
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
+from django.core.mail import get_connection
 from django.core.mail.message import EmailMultiAlternatives
+from django.db import close_old_connections, transaction
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
+from puzzles import models
 from puzzles.context import Context
 from puzzles.hunt_config import (
     HUNT_TITLE,
@@ -52,16 +60,68 @@ VICTORY_WEBHOOK_URL = getattr(settings, 'VICTORY_WEBHOOK_URL', None)
 
 # Assuming you want messages on a messaging platform that's not Discord but
 # supports at least a vaguely similar API, change the following code
-# accordingly:
+# accordingly. Alerts are sent from post_save handlers in the middle of
+# requests, so they're only queued here, in the same transaction, and the
+# send_alerts command actually posts them.
+DISCORD_MESSAGE_LIMIT = 2000
+
 def dispatch_discord_alert(webhook, content, username):
     content = '[{}] {}'.format(timezone.localtime().strftime('%H:%M:%S'), content)
-    if len(content) >= 2000:
-        content = content[:1996] + '...'
+    if len(content) >= DISCORD_MESSAGE_LIMIT:
+        content = content[:DISCORD_MESSAGE_LIMIT - 4] + '...'
     if settings.IS_TEST:
         logger.info(_('(Test) Discord alert:\n') + content)
         return
+    if not webhook:
+        logger.info(_('(No webhook) Discord alert:\n') + content)
+        return
     logger.info(_('(Real) Discord alert:\n') + content)
-    requests.post(webhook, json={'username': username, 'content': content, 'allowed_mentions': {'parse': []}})
+    models.OutboundAlert.objects.create(webhook=webhook, username=username, content=content)
+    count_alerts('queued')
+
+# Counters of alerts queued, sent and dropped, shared by all processes through
+# the cache so the send_alerts command can report them.
+ALERT_COUNTERS = ('queued', 'sent', 'dropped')
+
+def count_alerts(counter, n=1):
+    key = 'alerts:' + counter
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        pass # evicted in between; not worth retrying for a statistic
+
+def alert_counters():
+    values = cache.get_many(['alerts:' + counter for counter in ALERT_COUNTERS])
+    return {counter: values.get('alerts:' + counter, 0) for counter in ALERT_COUNTERS}
+
+# Discord rate limits each webhook, so when lots of alerts are waiting (say,
+# hundreds of submissions in the first minutes of the hunt), merge the ones
+# going to the same webhook as the same username into as few messages as fit.
+# Yields (webhook, username, alerts, content), keeping each stream in order.
+def coalesce_alerts(alerts):
+    batches = collections.OrderedDict()
+    def joined(batch):
+        return '\n'.join(alert.content for alert in batch)
+    for alert in alerts:
+        key = (alert.webhook, alert.username)
+        (batch, length) = batches.get(key, ([], -1))
+        if batch and length + 1 + len(alert.content) > DISCORD_MESSAGE_LIMIT:
+            yield key + (batch, joined(batch))
+            (batch, length) = ([], -1)
+        batch.append(alert)
+        batches[key] = (batch, length + 1 + len(alert.content))
+    for (key, (batch, length)) in batches.items():
+        yield key + (batch, joined(batch))
+
+# Called by the send_alerts command with a shared requests.Session. Returns
+# the response so the caller can decide whether and when to retry.
+def post_discord_alert(session, webhook, username, content, timeout=10):
+    return session.post(webhook, timeout=timeout, json={
+        'username': username,
+        'content': content,
+        'allowed_mentions': {'parse': []},
+    })
 
 def dispatch_general_alert(content):
     dispatch_discord_alert(ALERT_WEBHOOK_URL, content, ALERT_DISCORD_USERNAME)
@@ -77,6 +137,48 @@ def dispatch_victory_alert(content):
     dispatch_discord_alert(VICTORY_WEBHOOK_URL, content, VICTORY_DISCORD_USERNAME)
 
 
+# Work that shouldn't hold up the response, like a channel layer round trip,
+# goes on a queue that a background thread works through. Nothing is queued
+# until the current transaction commits, so it can't get ahead of the rows it
+# talks about. The queue only lives in this process, so anything that must
+# survive a restart (alerts, emails, database writes) doesn't belong here.
+# Tests just run it inline.
+deferred_queue = queue.Queue()
+deferred_thread = None
+deferred_lock = threading.Lock()
+
+def run_deferred():
+    while True:
+        (fn, args, kwargs) = deferred_queue.get()
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            logger.error(_('Deferred call failed:\n') + traceback.format_exc())
+        finally:
+            # Like after a request, don't hang on to broken or stale
+            # database connections.
+            close_old_connections()
+            deferred_queue.task_done()
+
+def defer(fn, *args, **kwargs):
+    if settings.IS_TEST:
+        fn(*args, **kwargs)
+        return
+    def enqueue():
+        global deferred_thread
+        with deferred_lock:
+            if deferred_thread is None or not deferred_thread.is_alive():
+                deferred_thread = threading.Thread(target=run_deferred, daemon=True)
+                deferred_thread.start()
+        deferred_queue.put((fn, args, kwargs))
+    transaction.on_commit(enqueue)
+
+# The thread is a daemon, so short-lived processes like management commands
+# should call this before exiting.
+def flush_deferred():
+    deferred_queue.join()
+
+
 puzzle_logger = logging.getLogger('puzzles.puzzle')
 def log_puzzle_info(puzzle, team, content):
     puzzle_logger.info('{}\t{}\t{}'.format(puzzle, team, content))
@@ -105,62 +207,162 @@ def send_mail_wrapper(subject, template, context, recipients):
         logger.info(_('Sending mail <{}> to <{}>:\n{}').format(
             subject, ', '.join(recipients), body))
         return
-    mail = EmailMultiAlternatives(
+    # Rendering needs the caller's objects, so it happens here, but actually
+    # talking to the mail server is left to the send_emails command.
+    models.OutboundEmail.objects.create(
         subject=subject,
         body=body,
+        html_body=render_to_string(template + '.html', context),
+        recipients=list(recipients))
+
+
+def campaign_message(campaign, to, bcc=(), connection=None):
+    message = EmailMultiAlternatives(
+        subject=settings.EMAIL_SUBJECT_PREFIX + campaign.subject,
+        body=campaign.body,
         from_email=MESSAGING_SENDER_EMAIL,
-        to=recipients,
-        alternatives=[(render_to_string(template + '.html', context), 'text/html')],
-        reply_to=[CONTACT_EMAIL])
+        to=to,
+        bcc=bcc,
+        reply_to=[CONTACT_EMAIL],
+        connection=connection)
+    if campaign.html_body:
+        message.attach_alternative(campaign.html_body, 'text/html')
+    return message
+
+# Yields (last TeamMember id, emails) for chunks of the campaign's remaining
+# recipients, streaming them from the database. Addresses already in `seen`
+# (lowercased) are skipped.
+def campaign_chunks(campaign, chunk_size, seen):
+    members = (models.TeamMember.objects
+        .filter(id__gt=campaign.last_member_id)
+        .exclude(email='')
+        .order_by('id')
+        .values_list('id', 'email'))
+    chunk = []
+    for (member_id, email) in members.iterator(chunk_size=2000):
+        if email.lower() not in seen:
+            seen.add(email.lower())
+            chunk.append(email)
+        if len(chunk) >= chunk_size:
+            yield (member_id, chunk)
+            chunk = []
+    if chunk:
+        yield (member_id, chunk)
+
+# Queue one OutboundEmail per chunk of the campaign's remaining recipients,
+# skipping addresses it has already been queued for (e.g. through another
+# member of a team). The cursor moves in the same transaction as each chunk
+# is queued, so a crash can't lose or repeat one.
+def queue_campaign(campaign, chunk_size):
+    seen = {
+        email.lower()
+        for recipients in campaign.outboundemail_set.values_list('recipients', flat=True)
+        for email in recipients
+    }
+    for (last_member_id, recipients) in campaign_chunks(campaign, chunk_size, seen):
+        with transaction.atomic():
+            models.OutboundEmail.objects.create(
+                campaign=campaign,
+                subject=settings.EMAIL_SUBJECT_PREFIX + campaign.subject,
+                body=campaign.body,
+                html_body=campaign.html_body,
+                recipients=recipients)
+            campaign.last_member_id = last_member_id
+            campaign.save(update_fields=('last_member_id',))
+
+# Send a MailCampaign to everyone it hasn't been sent to yet: its recipients
+# are queued in chunks (see queue_campaign), then each chunk is BCCed on one
+# message, sent from a pool of threads with an SMTP connection apiece, at most
+# per_second messages per second overall. Failed chunks are retried with the
+# same backoff as send_emails until they go through or give up, and every
+# outcome is saved on the chunk's OutboundEmail, so this can be rerun to
+# resume after a crash. Returns (recipients handled, seconds taken).
+def send_campaign(campaign, chunk_size=50, concurrency=4, per_second=None, batch=200):
+    start = time.monotonic()
+    queue_campaign(campaign, chunk_size)
+    local = threading.local()
+    connections = []
+    throttle_lock = threading.Lock()
+    next_slot = [start]
+
+    # Runs on the pool, so it only talks to the mail server; the results are
+    # saved from this thread.
+    def send_chunk(email):
+        if per_second:
+            with throttle_lock:
+                slot = max(next_slot[0], time.monotonic())
+                next_slot[0] = slot + 1 / per_second
+            time.sleep(max(0, slot - time.monotonic()))
+        if not hasattr(local, 'connection'):
+            local.connection = get_connection(timeout=30)
+            connections.append(local.connection)
+        try:
+            local.connection.open()
+            if local.connection.send_messages([email.message(local.connection)]) != 1:
+                raise RuntimeError(_('Unknown failure???'))
+        except smtplib.SMTPRecipientsRefused:
+            return (traceback.format_exc(), True)
+        except Exception:
+            # Don't trust the connection after an error.
+            local.connection.close()
+            return (traceback.format_exc(), False)
+        return None
+
+    handled = 0
+    outbox = campaign.outboundemail_set.filter(status=models.OutboundEmail.QUEUED)
     try:
-        if mail.send() != 1:
-            raise RuntimeError(_('Unknown failure???'))
-    except Exception:
-        dispatch_general_alert(_('Could not send mail <{}> to <{}>:\n{}').format(
-            subject, ', '.join(recipients), traceback.format_exc()))
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+            while True:
+                due = list(outbox.filter(next_attempt_time__lte=timezone.now()).order_by('id')[:batch])
+                if not due:
+                    retry_time = outbox.order_by('next_attempt_time').values_list('next_attempt_time', flat=True).first()
+                    if retry_time is None:
+                        break
+                    time.sleep(max(0, (retry_time - timezone.now()).total_seconds()))
+                    continue
+                for (email, failure) in zip(due, pool.map(send_chunk, due)):
+                    if failure is None:
+                        email.record_sent()
+                        campaign.sent_count += len(email.recipients)
+                    else:
+                        email.record_failure(*failure)
+                        if email.status != models.OutboundEmail.FAILED:
+                            continue
+                        campaign.failed_count += len(email.recipients)
+                    campaign.save(update_fields=('sent_count', 'failed_count'))
+                    handled += len(email.recipients)
+    finally:
+        for connection in connections:
+            connection.close()
+    campaign.finished_time = timezone.now()
+    campaign.save(update_fields=('finished_time',))
+    return (handled, time.monotonic() - start)
 
 
 # puzzles/messaging.py 파일의 DiscordInterface 클래스 부분을 교체하세요.
 
 class DiscordInterface:
-    # 비동기(async) 코드를 올바르게 처리하도록 클래스 전체 로직을 변경합니다.
     TOKEN = getattr(settings, 'DISCORD_TOKEN', None)
     GUILD = getattr(settings, 'DISCORD_GUILD_ID', None)
     HINT_CHANNEL = getattr(settings, 'DISCORD_HINT_CHANNEL_ID', None)
 
+    # Web workers don't talk to Discord themselves: logging in for every hint
+    # took a whole handshake, and crawling the guild for avatars stalled the
+    # first request that needed one. Instead they queue messages in the
+    # database, in the hint's transaction, for the one long-lived bot process
+    # (the run_discord_bot command), which stays logged in, posts them
+    # whenever it's up and keeps the claimers' avatars in the cache up to
+    # date.
+    AVATARS_KEY = 'discord-avatars'
+
     def __init__(self):
-        self.client = None
-        self.avatars = None
-        if self.TOKEN and not settings.IS_TEST:
-            intents = discord.Intents.default()
-            intents.members = True # 서버 멤버 목록을 가져오기 위한 필수 권한
-            self.client = discord.Client(intents=intents)
-
-    async def _login_and_get_avatars(self):
-        """A helper async function to log in and fetch member avatars."""
-        await self.client.login(self.TOKEN)
-        avatars = {}
-        try:
-            guild = await self.client.fetch_guild(self.GUILD)
-            async for member in guild.fetch_members(limit=None):
-                avatar = member.display_avatar.url
-                for name in (member.nick, member.name, member.global_name):
-                    if name:
-                        avatars[name] = avatar
-        except Exception:
-            logger.error("Failed to fetch guild or members for avatars.\n" + traceback.format_exc())
-        finally:
-            # 아바타를 가져온 후에는 봇을 로그아웃시켜 불필요한 연결을 유지하지 않습니다.
-            await self.client.close()
-        return avatars
+        self.enabled = bool(self.TOKEN) and not settings.IS_TEST
 
     def get_avatar(self, claimer):
-        if self.avatars is None:
-            if not self.client:
-                self.avatars = {}
-            else:
-                self.avatars = async_to_sync(self._login_and_get_avatars)()
-        return self.avatars.get(claimer)
+        return (cache.get(self.AVATARS_KEY) or {}).get(claimer)
+
+    def send_to_bot(self, content, embed):
+        models.OutboundHintMessage.objects.create(content=content, embeds=[embed])
 
     def update_hint(self, hint):
         HintsConsumer.send_to_all(json.dumps({'id': hint.id,
@@ -183,34 +385,18 @@ class DiscordInterface:
             embed['url'] = claim_url
             debug = 'unclaimed'
 
-        if self.client is None:
+        if not self.enabled:
             message = hint.long_discord_message()
             logger.info(_('Hint, {}: {}\n{}').format(debug, hint, message))
             logger.info(_('Embed: {}').format(embed))
             return
 
         # 힌트가 업데이트될 때마다 항상 새로운 메시지를 보내도록 변경합니다.
-        async def _update_hint_async():
-            if not self.client.is_ready():
-                await self.client.login(self.TOKEN)
-            
-            try:
-                # 기존 메시지를 수정하는 대신, 항상 새로운 메시지를 보냅니다.
-                message = hint.long_discord_message()
-                await self.client.http.send_message(
-                    self.HINT_CHANNEL, message, embeds=[embed])
-                # discord_id를 저장하는 부분을 완전히 제거합니다.
-            finally:
-                await self.client.close()
-        
-        try:
-            async_to_sync(_update_hint_async)()
-        except Exception:
-            dispatch_general_alert(_('Discord API failure\n{}').format(traceback.format_exc()))
+        self.send_to_bot(hint.long_discord_message(), embed)
 
     def clear_hint(self, hint):
         HintsConsumer.send_to_all(json.dumps({'id': hint.id}))
-        if self.client is None:
+        if not self.enabled:
             logger.info(_('Hint done: {}').format(hint))
             return
 
@@ -225,22 +411,9 @@ class DiscordInterface:
         embed['description'] = hint.response[:250]
         avatar = self.get_avatar(hint.claimer)
         if avatar: embed['author']['icon_url'] = avatar
-        
-        # 힌트가 완료될 때도 수정 대신 새로운 메시지를 보냅니다.
-        async def _clear_hint_async():
-            if not self.client.is_ready():
-                await self.client.login(self.TOKEN)
-            try:
-                # 기존 메시지를 수정하는 대신, 새로운 완료 메시지를 보냅니다.
-                await self.client.http.send_message(
-                    self.HINT_CHANNEL, content=hint.short_discord_message(), embeds=[embed])
-            finally:
-                await self.client.close()
 
-        try:
-            async_to_sync(_clear_hint_async)()
-        except Exception:
-            dispatch_general_alert(_('Discord API failure: modify\n{}').format(traceback.format_exc()))
+        # 힌트가 완료될 때도 수정 대신 새로운 메시지를 보냅니다.
+        self.send_to_bot(hint.short_discord_message(), embed)
 discord_interface = DiscordInterface()
 
 # class DiscordInterface:
@@ -447,17 +620,61 @@ class AdminWebsocketConsumer(BroadcastWebsocketConsumer):
 class HintsConsumer(AdminWebsocketConsumer):
     group_id = 'hints'
 
-def show_unlock_notification(context, unlock):
-    data = json.dumps({
-        'title': str(unlock.puzzle),
-        'text': _('You’ve unlocked a new puzzle!'),
-        'link': reverse('puzzle', args=(unlock.puzzle.slug,)),
-    })
+# Rows of the bigboard as they change; see bigboard.py. Saves only announce
+# which (team, puzzle) changed, and only if someone opened the board lately;
+# the row, which takes a few queries, is worked out here by one of the
+# consumers and broadcast to the rest.
+class BigboardConsumer(AdminWebsocketConsumer):
+    group_id = 'bigboard'
+    WATCHED_KEY = 'bigboard:watched'
+
+    def connect(self):
+        if self.is_ok():
+            cache.set(self.WATCHED_KEY, True, 24 * 60 * 60)
+        super().connect()
+
+    @classmethod
+    def is_watched(cls):
+        return cache.get(cls.WATCHED_KEY, False)
+
+    @classmethod
+    def announce_change(cls, seq, team_id, puzzle_id):
+        async_to_sync(get_channel_layer().group_send)(
+            cls.group_id,
+            {'type': 'bigboard.changed', 'seq': seq, 'team': team_id, 'puzzle': puzzle_id})
+
+    def bigboard_changed(self, event):
+        from puzzles import bigboard # imports this module
+        data = bigboard.changed_row(event['seq'], event['team'], event['puzzle'])
+        if data is not None:
+            self.send_to_all(json.dumps(data))
+
+def show_unlock_notifications(context, unlocks):
+    if not unlocks:
+        return
+    if len(unlocks) == 1:
+        data = {
+            'title': str(unlocks[0].puzzle),
+            'text': _('You’ve unlocked a new puzzle!'),
+            'link': reverse('puzzle', args=(unlocks[0].puzzle.slug,)),
+        }
+    else:
+        # e.g. a meta solve opening a whole round: one notification for all.
+        data = {
+            'title': _('%d new puzzles') % len(unlocks),
+            'text': _('You’ve unlocked %s!') % ', '.join(str(unlock.puzzle) for unlock in unlocks),
+            'link': reverse('puzzles'),
+        }
+    data = json.dumps(data)
     # There's an awkward edge case where the person/browser tab that actually
     # triggered the notif is navigating between pages, so they don't have a
     # websocket to send to... use messages.info to put it into the next page.
-    messages.info(context.request, data)
-    TeamNotificationsConsumer.send_to_team(unlock.team, data)
+    # (Unlocks from a solve's post_save or a management command happen outside
+    # any request, but the puzzles page still marks them as new.)
+    request = getattr(context, 'request', None)
+    if request:
+        messages.info(request, data)
+    defer(TeamNotificationsConsumer.send_to_team, unlocks[0].team, data)
 
 def show_solve_notification(submission):
     if not submission.puzzle.is_meta or submission.puzzle.slug == META_META_SLUG:
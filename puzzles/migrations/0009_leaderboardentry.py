@@ -0,0 +1,63 @@
+# Generated by Django 4.2.15 on 2026-10-18 15:50
+
+from django.db import migrations, models
+from django.db.models import Case, Count, FilteredRelation, Max, Min, Q, When
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+from puzzles.hunt_config import HUNT_END_TIME, META_META_SLUG
+
+
+def build_leaderboard(apps, schema_editor):
+    Team = apps.get_model('puzzles', 'Team')
+    LeaderboardEntry = apps.get_model('puzzles', 'LeaderboardEntry')
+    LeaderboardEntry.objects.bulk_create([
+        LeaderboardEntry(
+            team_id=team_id,
+            total_solves=total_solves,
+            metameta_solve_time=metameta_solve_time,
+            last_solve_or_creation_time=last_solve_or_creation_time,
+        ) for (team_id, total_solves, metameta_solve_time, last_solve_or_creation_time)
+        in Team.objects.annotate(
+            scoring_submissions=FilteredRelation(
+                'answersubmission',
+                condition=Q(
+                    answersubmission__used_free_answer=False,
+                    answersubmission__is_correct=True,
+                    answersubmission__submitted_datetime__lt=HUNT_END_TIME,
+                )
+            ),
+            total_solves=Count('scoring_submissions'),
+            metameta_solve_time=Min(Case(When(
+                scoring_submissions__puzzle__slug=META_META_SLUG,
+                then='scoring_submissions__submitted_datetime',
+            ))),
+            last_solve_or_creation_time=Coalesce(
+                Max('scoring_submissions__submitted_datetime'), 'creation_time'),
+        ).values_list('id', 'total_solves', 'metameta_solve_time', 'last_solve_or_creation_time')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0008_alter_answersubmission_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('team', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard_entry', serialize=False, to='puzzles.team', verbose_name='팀')),
+                ('total_solves', models.IntegerField(default=0, verbose_name='Total solves')),
+                ('metameta_solve_time', models.DateTimeField(blank=True, null=True, verbose_name='Metameta solve time')),
+                ('last_solve_or_creation_time', models.DateTimeField(verbose_name='Last solve or creation time')),
+            ],
+            options={
+                'verbose_name': 'leaderboard entry',
+                'verbose_name_plural': 'leaderboard entries',
+                'indexes': [models.Index(fields=['metameta_solve_time', '-total_solves', 'last_solve_or_creation_time'], name='puzzles_leaderboard_rank')],
+            },
+        ),
+        migrations.RunPython(build_leaderboard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.15 on 2026-10-18 15:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0009_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundAlert',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('webhook', models.URLField(max_length=500, verbose_name='webhook')),
+                ('username', models.CharField(max_length=255, verbose_name='사용자 이름')),
+                ('content', models.TextField(verbose_name='content')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='created time')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt time')),
+            ],
+            options={
+                'verbose_name': 'outbound alert',
+                'verbose_name_plural': 'outbound alerts',
+                'indexes': [models.Index(fields=['next_attempt_time', 'id'], name='puzzles_out_next_at_df0652_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.15 on 2026-10-18 16:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0010_outboundalert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=998, verbose_name='subject')),
+                ('body', models.TextField(verbose_name='body')),
+                ('html_body', models.TextField(blank=True, verbose_name='HTML body')),
+                ('recipients', models.JSONField(verbose_name='recipients')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='created time')),
+                ('status', models.CharField(choices=[('Q', 'Queued'), ('S', 'Sent'), ('F', 'Failed')], default='Q', max_length=1, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt time')),
+                ('sent_time', models.DateTimeField(blank=True, null=True, verbose_name='sent time')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+            ],
+            options={
+                'verbose_name': 'outbound email',
+                'verbose_name_plural': 'outbound emails',
+                'indexes': [models.Index(fields=['status', 'next_attempt_time'], name='puzzles_out_status_7fc8de_idx')],
+            },
+        ),
+    ]
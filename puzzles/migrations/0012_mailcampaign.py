@@ -0,0 +1,31 @@
+# Generated by Django 4.2.15 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0011_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailCampaign',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=998, verbose_name='subject')),
+                ('body', models.TextField(verbose_name='body')),
+                ('html_body', models.TextField(blank=True, verbose_name='HTML body')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='created time')),
+                ('last_member_id', models.PositiveIntegerField(default=0, verbose_name='last team member id')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='sent count')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='failed count')),
+                ('finished_time', models.DateTimeField(blank=True, null=True, verbose_name='finished time')),
+            ],
+            options={
+                'verbose_name': 'mail campaign',
+                'verbose_name_plural': 'mail campaigns',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.15 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_answers(apps, schema_editor):
+    AnswerSubmission = apps.get_model('puzzles', 'AnswerSubmission')
+    AnswerStat = apps.get_model('puzzles', 'AnswerStat')
+    AnswerStat.objects.bulk_create([
+        AnswerStat(puzzle_id=puzzle_id, submitted_answer=submitted_answer, team_count=team_count)
+        for (puzzle_id, submitted_answer, team_count) in AnswerSubmission.objects
+        .filter(used_free_answer=False, team__is_hidden=False)
+        .values('puzzle_id', 'submitted_answer')
+        .annotate(team_count=Count('team_id', distinct=True))
+        .values_list('puzzle_id', 'submitted_answer', 'team_count')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0012_mailcampaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submitted_answer', models.CharField(max_length=255, verbose_name='제출한 정답')),
+                ('team_count', models.PositiveIntegerField(default=0, verbose_name='team count')),
+                ('puzzle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='puzzles.puzzle', verbose_name='퍼즐')),
+            ],
+            options={
+                'verbose_name': 'answer stat',
+                'verbose_name_plural': 'answer stats',
+                'unique_together': {('puzzle', 'submitted_answer')},
+            },
+        ),
+        migrations.RunPython(count_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.15 on 2026-10-18 16:06
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+from puzzles.hunt_config import HUNT_END_TIME
+
+
+def fill_stats(apps, schema_editor):
+    AnswerSubmission = apps.get_model('puzzles', 'AnswerSubmission')
+    AnswerStat = apps.get_model('puzzles', 'AnswerStat')
+    counted = AnswerSubmission.objects.filter(used_free_answer=False, team__is_hidden=False)
+    for (puzzle_id, submitted_answer, hunt_team_count) in (counted
+            .values('puzzle_id', 'submitted_answer')
+            .annotate(hunt_team_count=Count('team_id', distinct=True,
+                filter=Q(submitted_datetime__lt=HUNT_END_TIME)))
+            .values_list('puzzle_id', 'submitted_answer', 'hunt_team_count')):
+        AnswerStat.objects.filter(puzzle_id=puzzle_id, submitted_answer=submitted_answer) \
+            .update(hunt_team_count=hunt_team_count)
+    for (puzzle_id, submitted_answer) in counted.filter(is_correct=True) \
+            .values_list('puzzle_id', 'submitted_answer').distinct():
+        AnswerStat.objects.filter(puzzle_id=puzzle_id, submitted_answer=submitted_answer) \
+            .update(is_correct=True)
+    positions = {}
+    for submission in counted.filter(is_correct=True).order_by('submitted_datetime', 'id'):
+        positions[submission.puzzle_id] = positions.get(submission.puzzle_id, 0) + 1
+        submission.solve_position = positions[submission.puzzle_id]
+        submission.save(update_fields=('solve_position',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0013_answerstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answerstat',
+            name='hunt_team_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='team count during hunt'),
+        ),
+        migrations.AddField(
+            model_name='answerstat',
+            name='is_correct',
+            field=models.BooleanField(default=False, verbose_name='정답 여부'),
+        ),
+        migrations.AddField(
+            model_name='answersubmission',
+            name='solve_position',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Solve position'),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
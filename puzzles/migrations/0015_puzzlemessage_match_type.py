@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0014_answerstat_solve_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='puzzlemessage',
+            name='match_type',
+            field=models.CharField(choices=[('E', 'Exact'), ('P', 'Prefix'), ('R', 'Regex')], default='E', help_text='\n        Guesses are compared after uppercasing and removing everything but\n        letters and digits. A prefix matches any guess that starts with it; a\n        regex has to match the whole (uppercased) guess.\n    ', max_length=1, verbose_name='Match type'),
+        ),
+    ]
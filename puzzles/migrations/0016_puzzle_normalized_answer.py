@@ -0,0 +1,28 @@
+# Generated by Django 4.2.15 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+from puzzles.normalization import normalize_answer
+
+
+def normalize_answers(apps, schema_editor):
+    Puzzle = apps.get_model('puzzles', 'Puzzle')
+    for puzzle in Puzzle.objects.all():
+        puzzle.normalized_answer = normalize_answer(puzzle.answer)
+        puzzle.save(update_fields=('normalized_answer',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0015_puzzlemessage_match_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='puzzle',
+            name='normalized_answer',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Normalized answer'),
+        ),
+        migrations.RunPython(normalize_answers, migrations.RunPython.noop),
+    ]
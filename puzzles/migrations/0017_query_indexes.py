@@ -0,0 +1,37 @@
+# Generated by Django 4.2.15 on 2026-10-18 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0016_puzzle_normalized_answer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answersubmission',
+            index=models.Index(fields=['puzzle', 'submitted_answer'], name='puzzles_submission_answer'),
+        ),
+        migrations.AddIndex(
+            model_name='answersubmission',
+            index=models.Index(condition=models.Q(('used_free_answer', False)), fields=['submitted_datetime'], name='puzzles_submission_time'),
+        ),
+        migrations.AddIndex(
+            model_name='answersubmission',
+            index=models.Index(condition=models.Q(('is_correct', True)), fields=['puzzle', 'submitted_datetime'], name='puzzles_submission_solve'),
+        ),
+        migrations.AddIndex(
+            model_name='hint',
+            index=models.Index(fields=['status', 'claimer'], name='puzzles_hint_claim'),
+        ),
+        migrations.AddIndex(
+            model_name='hint',
+            index=models.Index(fields=['team', 'puzzle', 'status'], name='puzzles_hint_team_puzzle'),
+        ),
+        migrations.AddIndex(
+            model_name='puzzleunlock',
+            index=models.Index(fields=['puzzle', 'view_datetime', 'team'], name='puzzles_unlock_viewed'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.15 on 2026-10-18 16:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0017_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailcampaign',
+            name='queued_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='queued time'),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='puzzles.mailcampaign', verbose_name='campaign'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.15 on 2026-10-18 17:08
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0018_campaign_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundHintMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField(verbose_name='content')),
+                ('embeds', models.JSONField(verbose_name='embeds')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='created time')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt time')),
+            ],
+            options={
+                'verbose_name': 'outbound hint message',
+                'verbose_name_plural': 'outbound hint messages',
+                'indexes': [models.Index(fields=['next_attempt_time', 'id'], name='puzzles_out_next_at_9fb4f4_idx')],
+            },
+        ),
+    ]
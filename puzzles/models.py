@@ -1,23 +1,24 @@
 import collections
 import datetime
 import re
-import unicodedata
 from urllib.parse import quote
 
 from django import forms
 from django.core.exceptions import ValidationError
+from django.core.mail.message import EmailMultiAlternatives
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models import F, FilteredRelation, Q, Case, When, Count, Min
-from django.db.models.functions import Coalesce
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models import F, FilteredRelation, Q, Case, When, Count, Max, Min, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from puzzles.context import context_cache
+from puzzles import normalization
+from puzzles.context import context_cache, persistent, team_snapshots, VersionedCache
 
 from puzzles.messaging import (
     dispatch_general_alert,
@@ -25,10 +26,12 @@ from puzzles.messaging import (
     dispatch_submission_alert,
     send_mail_wrapper,
     discord_interface,
-    show_unlock_notification,
+    show_unlock_notifications,
     show_solve_notification,
     show_hint_notification,
+    defer,
 )
+from puzzles.bigboard import record_change as record_bigboard_change
 
 from puzzles.hunt_config import (
     HUNT_END_TIME,
@@ -45,6 +48,8 @@ from puzzles.hunt_config import (
     TEAM_AGE_BEFORE_FREE_ANSWERS,
     INTRO_ROUND_SLUG,
     META_META_SLUG,
+    CONTACT_EMAIL,
+    MESSAGING_SENDER_EMAIL,
 )
 
 
@@ -95,6 +100,9 @@ class Puzzle(models.Model):
         max_length=255, verbose_name=_('Answer'),
         help_text=_('Answer (fine if unnormalized)'),
     )
+    # Filled in from answer on save and on load; see from_db.
+    normalized_answer = models.CharField(max_length=255, blank=True, editable=False,
+        verbose_name=_('Normalized answer'))
 
     round = models.ForeignKey(Round, on_delete=models.CASCADE, verbose_name=_('round'))
     order = models.IntegerField(default=0, verbose_name=_('Order'))
@@ -141,15 +149,49 @@ class Puzzle(models.Model):
         else:
             return ''.join(ret)
 
-    @property
-    def normalized_answer(self):
-        return Puzzle.normalize_answer(self.answer)
+    # normalized_answer is only filled in by save(); bulk_create, update()
+    # and fixtures leave it empty or stale, which would grade every guess
+    # wrong. So loading always works it out again from answer, and
+    # recompute_unlocks writes back any that are off.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'answer' in instance.__dict__:
+            instance.normalized_answer = Puzzle.normalize_answer(instance.answer)
+        return instance
 
     @staticmethod
     def normalize_answer(s):
-        if s is None: return s
-        nfkd_form = unicodedata.normalize('NFKD', s)
-        return ''.join([c.upper() for c in nfkd_form if c.isalpha()])
+        return normalization.normalize_answer(s)
+
+    @staticmethod
+    def refill_normalized_answers():
+        count = 0
+        for (id, answer, normalized_answer) in Puzzle.objects.values_list(
+                'id', 'answer', 'normalized_answer'):
+            if normalized_answer != Puzzle.normalize_answer(answer):
+                count += Puzzle.objects.filter(id=id).update(
+                    normalized_answer=Puzzle.normalize_answer(answer))
+        return count
+
+
+@receiver(pre_save, sender=Puzzle)
+def normalize_puzzle_answer(sender, instance, **kwargs):
+    instance.normalized_answer = Puzzle.normalize_answer(instance.answer)
+
+
+# All puzzles, with their rounds, in order. This basically never changes while
+# the hunt is running, so it's shared across requests instead of being queried
+# on every page load; see Context.all_puzzles.
+puzzle_catalog = VersionedCache('puzzle-catalog', lambda: tuple(
+    Puzzle.objects.select_related('round').order_by('round__order', 'order')))
+
+@receiver(post_save, sender=Round)
+@receiver(post_delete, sender=Round)
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+def invalidate_puzzle_catalog(sender, **kwargs):
+    puzzle_catalog.invalidate()
 
 
 @context_cache
@@ -221,26 +263,44 @@ class Team(models.Model):
     def __str__(self):
         return self.team_name
 
+    # Remember is_hidden as loaded, so that saving can tell whether it
+    # changed without asking the database (see recount_answers_on_hidden_change).
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_is_hidden = instance.__dict__.get('is_hidden')
+        return instance
+
     def get_emails(self, with_names=False):
         return [
             ((member.email, str(member)) if with_names else member.email)
             for member in self.teammember_set.all() if member.email
         ]
 
+    # Checking a guess only needs the team's submissions for that one puzzle,
+    # so this fetches just those (using the unique index on team, puzzle and
+    # answer) rather than going through all of self.submissions, and keeps
+    # them for the rest of the request.
     def puzzle_submissions(self, puzzle):
-        return [
-            submission for submission in self.submissions
-            if submission.puzzle == puzzle
-        ]
+        if not hasattr(self, '_cache'):
+            self._cache = {}
+        by_puzzle = self._cache.setdefault('_puzzle_submissions', {})
+        if puzzle.id not in by_puzzle:
+            submissions = tuple(
+                self.answersubmission_set
+                .filter(puzzle=puzzle)
+                .order_by('-submitted_datetime')
+            )
+            for submission in submissions:
+                submission.puzzle = puzzle
+            by_puzzle[puzzle.id] = submissions
+        return by_puzzle[puzzle.id]
 
     def puzzle_answer(self, puzzle):
         return puzzle.answer if puzzle.id in self.solves else None
 
     def num_wrong_guesses(self, puzzle):
-        return sum(
-            1 for submission in self.puzzle_submissions(puzzle)
-            if not submission.is_correct
-        )
+        return self.wrong_guess_counts.get(puzzle.id, 0)
 
     def num_extra_guesses(self, puzzle):
         return self.extra_guesses.get(puzzle.slug, 0)
@@ -303,38 +363,24 @@ class Team(models.Model):
                 # ...but always show current team, regardless of hidden status
                 q |= Q(id=current_team.id)
 
-        all_teams = Team.objects.filter(q, creation_time__lt=HUNT_END_TIME)
-
-        # https://docs.djangoproject.com/en/3.1/ref/models/querysets/#filteredrelation-objects
-        # FilteredRelation does a LEFT OUTER JOIN with additional conditions in
-        # the ON clause, so every team survives; the other stuff aggregates it
-        all_teams = all_teams.annotate(
-            scoring_submissions=FilteredRelation(
-                'answersubmission',
-                condition=Q(
-                    answersubmission__used_free_answer=False,
-                    answersubmission__is_correct=True,
-                    answersubmission__submitted_datetime__lt=HUNT_END_TIME,
-                )
-            ),
-            total_solves=Count('scoring_submissions'),
-            metameta_solve_time=Min(Case(
-                When(
-                    scoring_submissions__puzzle__slug=META_META_SLUG,
-                    then='scoring_submissions__submitted_datetime',
-                )
-                # else, null by default
-            )),
-            # Coalesce(things) = the first of things that isn't null
-            last_solve_or_creation_time=Coalesce('last_solve_time', 'creation_time'),
+        # The scores themselves are kept up to date in LeaderboardEntry as
+        # teams solve puzzles, so this is just a join and a sort instead of an
+        # aggregation over every AnswerSubmission. Teams saved without the
+        # post_save signal (bulk_create, fixtures) have no entry until their
+        # first solve, so fall back to what an unsolved team's would say.
+        return Team.objects.filter(q, creation_time__lt=HUNT_END_TIME).annotate(
+            total_solves=Coalesce('leaderboard_entry__total_solves', 0),
+            metameta_solve_time=F('leaderboard_entry__metameta_solve_time'),
+            last_solve_or_creation_time=Coalesce(
+                'leaderboard_entry__last_solve_or_creation_time', 'creation_time'),
         ).order_by(
             F('metameta_solve_time').asc(nulls_last=True),
             F('total_solves').desc(),
             F('last_solve_or_creation_time'),
+            # break ties consistently so rank_of agrees with this order
+            F('id'),
         )
 
-        return all_teams
-
         # Old joined-in-python implementation, with a different output format,
         # follows. I couldn't convince myself that pushing all the annotations
         # and sort into the database necessarily improved performance, but I
@@ -372,9 +418,48 @@ class Team(models.Model):
         #     )
         # )
 
+    @staticmethod
+    def rank_of(team, current_team, hide_hidden=True):
+        '''
+        Returns the 1-indexed position of team in
+        Team.leaderboard_teams(current_team, hide_hidden), or None if it
+        doesn't appear there (for example, if it's hidden). Rather than walking
+        the leaderboard, this counts the teams that are strictly ahead of it.
+        '''
+
+        teams = Team.leaderboard_teams(current_team, hide_hidden)
+        score = teams.filter(id=team.id).values(
+            'total_solves',
+            'metameta_solve_time',
+            'last_solve_or_creation_time',
+        ).first()
+        if score is None:
+            return None
+
+        # Mirrors the order_by in leaderboard_teams, one key at a time.
+        ahead = Q(
+            total_solves=score['total_solves'],
+            last_solve_or_creation_time=score['last_solve_or_creation_time'],
+            id__lt=team.id,
+        )
+        ahead |= Q(
+            total_solves=score['total_solves'],
+            last_solve_or_creation_time__lt=score['last_solve_or_creation_time'],
+        )
+        ahead |= Q(total_solves__gt=score['total_solves'])
+        if score['metameta_solve_time'] is None:
+            ahead = Q(metameta_solve_time__isnull=False) | (Q(metameta_solve_time__isnull=True) & ahead)
+        else:
+            ahead = (
+                Q(metameta_solve_time__lt=score['metameta_solve_time']) |
+                (Q(metameta_solve_time=score['metameta_solve_time']) & ahead)
+            )
+        return teams.filter(ahead).count() + 1
+
     def team(self):
         return self
 
+    @persistent
     def asked_hints(self):
         return tuple(self.hint_set.select_related('puzzle', 'puzzle__round'))
 
@@ -389,7 +474,7 @@ class Team(models.Model):
         # <수정> 팀의 헌트 시작 시간으로부터 일정 시간이 지나야 힌트가 지급되도록 합니다. 아래는 원본.
         # if self.now < self.creation_time + TEAM_AGE_BEFORE_HINTS:
         #     return self.total_hints_awarded
-        if self.now < self.team_start_time + TEAM_AGE_BEFORE_HINTS:
+        if not self.team_start_time or self.now < self.team_start_time + TEAM_AGE_BEFORE_HINTS:
             return self.total_hints_awarded
 
         # <수정> HINT_TIME(글로벌 힌트 시작 시간) 대신 팀의 team_start_time을 기준으로 계산합니다.
@@ -415,6 +500,7 @@ class Team(models.Model):
         return self.num_hints_remaining - self.num_intro_hints_remaining
     
 # <힌트 수정> canned hint 함수 추가함
+    @persistent
     def num_canned_hints_used(self):
         return self.cannedhint_set.count()
 
@@ -436,12 +522,26 @@ class Team(models.Model):
     def num_free_answers_remaining(self):
         return self.num_free_answers_total - self.num_free_answers_used
 
+    @persistent
     def extra_guesses(self):
         return {
             grant.puzzle.slug: grant.extra_guesses
             for grant in self.extraguessgrant_set.select_related('puzzle')
         }
 
+    # Puzzle id -> number of wrong answers submitted, so guesses remaining
+    # can be checked without loading every submission.
+    @persistent
+    def wrong_guess_counts(self):
+        return dict(
+            self.answersubmission_set
+            .filter(is_correct=False)
+            .values('puzzle_id')
+            .annotate(count=Count('id'))
+            .values_list('puzzle_id', 'count')
+        )
+
+    @persistent
     def submissions(self):
         return tuple(
             self.answersubmission_set
@@ -456,6 +556,7 @@ class Team(models.Model):
             if submission.is_correct
         }
 
+    @persistent
     def db_unlocks(self):
         return {
             unlock.puzzle_id: unlock
@@ -475,10 +576,56 @@ class Team(models.Model):
             global_solves += 1
         return (global_solves, local_solves)
 
+    # When the team's next time unlock comes due, if there's one still to come.
+    # This doesn't depend on the current time, so unlike the unlocks
+    # themselves it can be cached across requests.
+    @persistent
+    def next_time_unlock(self):
+        if not self.team_start_time or not self.allow_time_unlocks:
+            return None
+        return min((
+            self.team_start_time + datetime.timedelta(hours=puzzle.unlock_hours)
+            for puzzle in self.all_puzzles
+            if 0 <= puzzle.unlock_hours and puzzle.id not in self.db_unlocks
+        ), default=None)
+
+    # The puzzles this team (or visitor) can see, in order, mapped to when they
+    # were unlocked. This only reads the PuzzleUnlocks written by update_unlocks
+    # below. Time unlocks are normally saved on schedule by the
+    # process_time_unlocks command, but if it's behind or not running, this
+    # catches up when it sees one has come due.
     @staticmethod
     def compute_unlocks(context):
+        if context.hunt_is_prereleased or context.hunt_is_over:
+            return collections.OrderedDict(
+                (puzzle, context.start_time) for puzzle in context.all_puzzles)
+        if not context.team:
+            return collections.OrderedDict()
+        next_time_unlock = context.team.next_time_unlock
+        if next_time_unlock and next_time_unlock <= context.now:
+            Team.update_unlocks(context)
+        db_unlocks = context.team.db_unlocks
+        return collections.OrderedDict(
+            (puzzle, db_unlocks[puzzle.id].unlock_datetime)
+            for puzzle in context.all_puzzles if puzzle.id in db_unlocks)
+
+    # Evaluate all the unlock rules for a team and save any puzzles that are
+    # newly unlocked. The rules only depend on the team's solves, when it
+    # started the hunt and the current time, so this only needs to run when one
+    # of those changes: on every correct answer (see the AnswerSubmission
+    # post_save below), when the team is created or starts the hunt, and when
+    # next_time_unlock comes due. If the puzzles or rules themselves change,
+    # use the recompute_unlocks command. The context can be a request Context
+    # or a Team; returns the new PuzzleUnlocks. With quiet, nobody is told:
+    # no notifications and no bigboard events (the caller should make the
+    # bigboard rebuild its snapshot instead).
+    @staticmethod
+    def update_unlocks(context, notify_time_unlocks=False, quiet=False):
+        if not context.team or context.hunt_is_prereleased or context.hunt_is_over:
+            return []  # compute_unlocks shows everything or nothing anyway
+        team = context.team
+        (global_solves, local_solves) = team.main_round_solves
         metas_solved = []
-        puzzles_unlocked = collections.OrderedDict()
         unlocks = []
 
         for puzzle in context.all_puzzles:
@@ -486,34 +633,37 @@ class Team(models.Model):
             # <시간 수정> 시간 기반 퍼즐 잠금 해제 로직을 팀의 team_start_time 기준으로 변경합니다.
             # 팀이 헌트를 시작했고(team_start_time 존재), 시간제 잠금 해제를 허용한 경우에만 작동합니다.
             if (0 <= puzzle.unlock_hours and
-                context.team and
-                context.team.team_start_time and
-                context.team.allow_time_unlocks):
-                unlock_time = context.team.team_start_time + datetime.timedelta(hours=puzzle.unlock_hours)
+                team.team_start_time and
+                team.allow_time_unlocks):
+                unlock_time = team.team_start_time + datetime.timedelta(hours=puzzle.unlock_hours)
                 if unlock_time <= context.now:
                     unlocked_at = unlock_time
 
-            if context.hunt_is_prereleased or context.hunt_is_over:
-                unlocked_at = context.start_time
-            elif context.team:
-                (global_solves, local_solves) = context.team.main_round_solves
-                if 0 <= puzzle.unlock_global <= global_solves and (global_solves or any(metas_solved)):
-                    unlocked_at = context.now
-                if 0 <= puzzle.unlock_local <= local_solves[puzzle.round.slug]:
-                    unlocked_at = context.now
-                if puzzle.slug == META_META_SLUG and all(metas_solved):
-                    unlocked_at = context.now
-                if puzzle.is_meta:
-                    metas_solved.append(puzzle.id in context.team.solves)
-                if puzzle.id in context.team.db_unlocks:
-                    unlocked_at = context.team.db_unlocks[puzzle.id].unlock_datetime
-                elif unlocked_at:
-                    unlocks.append(Team.unlock_puzzle(context, puzzle, unlocked_at))
-            if unlocked_at:
-                puzzles_unlocked[puzzle] = unlocked_at
+            if 0 <= puzzle.unlock_global <= global_solves and (global_solves or any(metas_solved)):
+                unlocked_at = context.now
+            if 0 <= puzzle.unlock_local <= local_solves[puzzle.round.slug]:
+                unlocked_at = context.now
+            if puzzle.slug == META_META_SLUG and all(metas_solved):
+                unlocked_at = context.now
+            if puzzle.is_meta:
+                metas_solved.append(puzzle.id in team.solves)
+            if unlocked_at and puzzle.id not in team.db_unlocks:
+                unlocks.append(Team.unlock_puzzle(context, puzzle, unlocked_at))
         if unlocks:
             PuzzleUnlock.objects.bulk_create(unlocks, ignore_conflicts=True)
-        return puzzles_unlocked
+            # bulk_create doesn't send post_save.
+            team_snapshots.invalidate(team.id)
+            if quiet:
+                return unlocks
+            for unlock in unlocks:
+                record_bigboard_change('puzzleunlock', team.id, unlock.puzzle.id)
+            # Time unlocks found late (say, by a page load long after they
+            # came due) aren't news, unless the caller is on schedule.
+            show_unlock_notifications(context, [
+                unlock for unlock in unlocks
+                if notify_time_unlocks or unlock.unlock_datetime == context.now
+            ])
+        return unlocks
 
     @staticmethod
     def unlock_puzzle(context, puzzle, unlocked_at):
@@ -522,8 +672,6 @@ class Team(models.Model):
             puzzle=puzzle,
             unlock_datetime=unlocked_at)
         context.team.db_unlocks[puzzle.id] = unlock
-        if unlocked_at == context.now:
-            show_unlock_notification(context, unlock)
         return unlock
 
 
@@ -532,6 +680,130 @@ def notify_on_team_creation(sender, instance, created, **kwargs):
     if created:
         dispatch_general_alert(_('Team created: {}').format(instance.team_name))
 
+# Hidden teams aren't counted in AnswerStat, so hiding or unhiding one has to
+# recount every puzzle it submitted to. (This only sees Team.save(), not
+# queryset .update().)
+@receiver(post_save, sender=Team)
+def recount_answers_on_hidden_change(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'is_hidden' not in update_fields:
+        return
+    saved_is_hidden = getattr(instance, '_saved_is_hidden', None)
+    instance._saved_is_hidden = instance.is_hidden
+    if not created and saved_is_hidden is not None and saved_is_hidden != instance.is_hidden:
+        AnswerStat.rebuild(list(AnswerSubmission.objects.filter(
+            team=instance).values_list('puzzle_id', flat=True).distinct()))
+
+
+class LeaderboardEntry(models.Model):
+    '''
+    A team's current standing on the leaderboard. This duplicates information
+    that can be computed from AnswerSubmissions, but it's maintained
+    incrementally on every solve so that ranking teams doesn't need to
+    aggregate every submission in the hunt. If it ever gets out of sync (say,
+    after editing submissions in /admin), run ./manage.py rebuild_leaderboard.
+    '''
+
+    team = models.OneToOneField(
+        Team, primary_key=True, on_delete=models.CASCADE,
+        related_name='leaderboard_entry', verbose_name=_('team'))
+
+    # These all have the same meaning as the annotations documented in
+    # Team.leaderboard_teams.
+    total_solves = models.IntegerField(default=0, verbose_name=_('Total solves'))
+    metameta_solve_time = models.DateTimeField(null=True, blank=True, verbose_name=_('Metameta solve time'))
+    last_solve_or_creation_time = models.DateTimeField(verbose_name=_('Last solve or creation time'))
+
+    class Meta:
+        verbose_name = _('leaderboard entry')
+        verbose_name_plural = _('leaderboard entries')
+        # Same order as Team.leaderboard_teams. Postgres sorts nulls last in
+        # ascending indexes, which is what we want for metameta_solve_time.
+        indexes = [
+            models.Index(
+                fields=['metameta_solve_time', '-total_solves', 'last_solve_or_creation_time'],
+                name='puzzles_leaderboard_rank'),
+        ]
+
+    def __str__(self):
+        return '%s: %d' % (self.team, self.total_solves)
+
+    @staticmethod
+    def record_submission(submission):
+        '''Update the submitting team's entry for a newly created submission.'''
+
+        if (
+            not submission.is_correct or
+            submission.used_free_answer or
+            submission.submitted_datetime >= HUNT_END_TIME
+        ):
+            return
+        updates = {
+            'total_solves': F('total_solves') + 1,
+            'last_solve_or_creation_time': Greatest(
+                'last_solve_or_creation_time', Value(submission.submitted_datetime)),
+        }
+        if submission.puzzle.slug == META_META_SLUG:
+            updates['metameta_solve_time'] = submission.submitted_datetime
+        if not LeaderboardEntry.objects.filter(team_id=submission.team_id).update(**updates):
+            LeaderboardEntry.rebuild(team_ids=(submission.team_id,))
+
+    @staticmethod
+    def rebuild(team_ids=None):
+        '''
+        Recompute entries from scratch for the given teams (by default, every
+        team). Returns the number of entries written.
+        '''
+
+        teams = Team.objects.all()
+        if team_ids is not None:
+            teams = teams.filter(id__in=team_ids)
+
+        # https://docs.djangoproject.com/en/3.1/ref/models/querysets/#filteredrelation-objects
+        # FilteredRelation does a LEFT OUTER JOIN with additional conditions in
+        # the ON clause, so every team survives; the other stuff aggregates it
+        rows = teams.annotate(
+            scoring_submissions=FilteredRelation(
+                'answersubmission',
+                condition=Q(
+                    answersubmission__used_free_answer=False,
+                    answersubmission__is_correct=True,
+                    answersubmission__submitted_datetime__lt=HUNT_END_TIME,
+                )
+            ),
+            total_solves=Count('scoring_submissions'),
+            metameta_solve_time=Min(Case(
+                When(
+                    scoring_submissions__puzzle__slug=META_META_SLUG,
+                    then='scoring_submissions__submitted_datetime',
+                )
+                # else, null by default
+            )),
+            # Coalesce(things) = the first of things that isn't null
+            last_solve_or_creation_time=Coalesce(
+                Max('scoring_submissions__submitted_datetime'), 'creation_time'),
+        ).values_list('id', 'total_solves', 'metameta_solve_time', 'last_solve_or_creation_time')
+
+        entries = [
+            LeaderboardEntry(
+                team_id=team_id,
+                total_solves=total_solves,
+                metameta_solve_time=metameta_solve_time,
+                last_solve_or_creation_time=last_solve_or_creation_time,
+            ) for (team_id, total_solves, metameta_solve_time, last_solve_or_creation_time) in rows
+        ]
+        LeaderboardEntry.objects.bulk_create(
+            entries, update_conflicts=True, unique_fields=('team',),
+            update_fields=('total_solves', 'metameta_solve_time', 'last_solve_or_creation_time'))
+        return len(entries)
+
+
+@receiver(post_save, sender=Team)
+def create_leaderboard_entry(sender, instance, created, **kwargs):
+    if created:
+        LeaderboardEntry.objects.get_or_create(team=instance, defaults={
+            'last_solve_or_creation_time': instance.creation_time,
+        })
+
 
 class TeamMember(models.Model):
     '''A person on a team.'''
@@ -574,6 +846,12 @@ class PuzzleUnlock(models.Model):
         unique_together = ('team', 'puzzle')
         verbose_name = _('puzzle unlock')
         verbose_name_plural = _('puzzle unlocks')
+        # unique_together already covers lookups by team. This is for the
+        # per-puzzle stats, which only count unlocks that were viewed; with
+        # team it covers the whole query.
+        indexes = [
+            models.Index(fields=['puzzle', 'view_datetime', 'team'], name='puzzles_unlock_viewed'),
+        ]
 
 
 class AnswerSubmission(models.Model):
@@ -586,6 +864,9 @@ class AnswerSubmission(models.Model):
     is_correct = models.BooleanField(verbose_name=_('Is correct'))
     submitted_datetime = models.DateTimeField(auto_now_add=True, verbose_name=_('Submitted datetime'))
     used_free_answer = models.BooleanField(verbose_name=_('Used free answer'))
+    # For correct answers from non-hidden teams, n if this was the nth team to
+    # solve the puzzle (see AnswerStat).
+    solve_position = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('Solve position'))
 
     def __str__(self):
         return '%s -> %s: %s, %s' % (
@@ -597,79 +878,212 @@ class AnswerSubmission(models.Model):
         unique_together = ('team', 'puzzle', 'submitted_answer')
         verbose_name = _('answer submission')
         verbose_name_plural = _('answer submissions')
+        # unique_together already covers lookups by team or (team, puzzle).
+        indexes = [
+            # Per-puzzle stats and the keep-going/alert lookups by answer.
+            models.Index(fields=['puzzle', 'submitted_answer'], name='puzzles_submission_answer'),
+            # Hunt stats: everything but free answers, up to the end of the
+            # hunt. (Partial, because filtering on a boolean compiles to
+            # "NOT used_free_answer", which SQLite can't look up in an index.)
+            models.Index(fields=['submitted_datetime'], condition=Q(used_free_answer=False),
+                name='puzzles_submission_time'),
+            # Solves of one puzzle (e.g. the metameta) in order; the bigboard
+            # also goes through this to find all solves.
+            models.Index(fields=['puzzle', 'submitted_datetime'], condition=Q(is_correct=True),
+                name='puzzles_submission_solve'),
+        ]
+
+
 
+class AnswerStat(models.Model):
+    '''
+    How many (non-hidden) teams have submitted each answer to each puzzle,
+    without free answers. Kept up to date as submissions come in, so alerts,
+    puzzle stats and the bigboard don't have to count them every time.
+    '''
+
+    puzzle = models.ForeignKey(Puzzle, on_delete=models.CASCADE, verbose_name=_('puzzle'))
+    submitted_answer = models.CharField(max_length=255, verbose_name=_('Submitted answer'))
+    is_correct = models.BooleanField(default=False, verbose_name=_('Is correct'))
+    team_count = models.PositiveIntegerField(default=0, verbose_name=_('team count'))
+    # Only submissions before the hunt ended, like the stats page shows.
+    hunt_team_count = models.PositiveIntegerField(default=0, verbose_name=_('team count during hunt'))
+
+    class Meta:
+        unique_together = ('puzzle', 'submitted_answer')
+        verbose_name = _('answer stat')
+        verbose_name_plural = _('answer stats')
+
+    def __str__(self):
+        return '%s: %s (%d)' % (self.puzzle, self.submitted_answer, self.team_count)
+
+    @staticmethod
+    def counts(submission):
+        return not submission.used_free_answer and not submission.team.is_hidden
+
+    # Count a new submission and return how many teams have now submitted
+    # the same answer (not counting this one if it doesn't count). For a
+    # correct answer, that's the team's solve position, which is also stored
+    # on the submission. The row stays locked from reading the count until the
+    # transaction ends, so two teams solving at once can't get the same
+    # position.
+    @staticmethod
+    def record_submission(submission):
+        stats = AnswerStat.objects.filter(
+            puzzle_id=submission.puzzle_id,
+            submitted_answer=submission.submitted_answer,
+        )
+        if not AnswerStat.counts(submission):
+            return stats.values_list('team_count', flat=True).first() or 0
+        updates = {'team_count': F('team_count') + 1}
+        if submission.submitted_datetime < HUNT_END_TIME:
+            updates['hunt_team_count'] = F('hunt_team_count') + 1
+        with transaction.atomic(savepoint=False):
+            team_count = stats.select_for_update().values_list('team_count', flat=True).first()
+            if team_count is None:
+                AnswerStat.objects.bulk_create([AnswerStat(
+                    puzzle_id=submission.puzzle_id,
+                    submitted_answer=submission.submitted_answer,
+                    is_correct=submission.is_correct,
+                )], ignore_conflicts=True)
+                team_count = stats.select_for_update().values_list('team_count', flat=True).get()
+            stats.update(**updates)
+            team_count += 1
+            if submission.is_correct:
+                submission.solve_position = team_count
+                AnswerSubmission.objects.filter(id=submission.id).update(solve_position=team_count)
+        return team_count
+
+    @staticmethod
+    def rebuild(puzzle_ids):
+        '''
+        Recount the given puzzles' stats and solve positions from their
+        submissions, e.g. after a team is hidden or unhidden.
+        '''
+
+        submissions = AnswerSubmission.objects.filter(puzzle_id__in=puzzle_ids)
+        counted = submissions.filter(used_free_answer=False, team__is_hidden=False)
+        with transaction.atomic():
+            AnswerStat.objects.filter(puzzle_id__in=puzzle_ids).delete()
+            AnswerStat.objects.bulk_create([
+                AnswerStat(
+                    puzzle_id=puzzle_id,
+                    submitted_answer=submitted_answer,
+                    is_correct=correct_count > 0,
+                    team_count=team_count,
+                    hunt_team_count=hunt_team_count,
+                )
+                for (puzzle_id, submitted_answer, correct_count, team_count, hunt_team_count) in counted
+                .values('puzzle_id', 'submitted_answer')
+                .annotate(
+                    correct_count=Count('id', filter=Q(is_correct=True)),
+                    team_count=Count('team_id', distinct=True),
+                    hunt_team_count=Count('team_id', distinct=True,
+                        filter=Q(submitted_datetime__lt=HUNT_END_TIME)))
+                .values_list('puzzle_id', 'submitted_answer', 'correct_count', 'team_count', 'hunt_team_count')
+            ])
+            submissions.filter(solve_position__isnull=False).update(solve_position=None)
+            positions = collections.Counter()
+            solves = list(counted.filter(is_correct=True).order_by('submitted_datetime', 'id'))
+            for submission in solves:
+                positions[submission.puzzle_id] += 1
+                submission.solve_position = positions[submission.puzzle_id]
+            AnswerSubmission.objects.bulk_update(solves, ('solve_position',))
+
+    # (answer, number of teams) for the wrong answers submitted to a puzzle
+    # during the hunt, most popular first.
+    @staticmethod
+    def popular_wrong_answers(puzzle):
+        return list(AnswerStat.objects.filter(
+            puzzle=puzzle,
+            is_correct=False,
+            hunt_team_count__gt=0,
+        ).order_by('-hunt_team_count', 'submitted_answer').values_list('submitted_answer', 'hunt_team_count'))
 
 
 @receiver(post_save, sender=AnswerSubmission)
 def notify_on_answer_submission(sender, instance, created, **kwargs):
     if created:
-        now = timezone.localtime()
-        def format_time_ago(timestamp):
-            if not timestamp:
-                return ''
-            diff = now - timestamp
-            parts = ['', '', '', '']
-            if diff.days > 0:
-                parts[0] = _('%dd') % diff.days
-            seconds = diff.seconds
-            parts[3] = _('%02ds') % (seconds % 60)
-            minutes = seconds // 60
-            if minutes:
-                parts[2] = _('%02dm') % (minutes % 60)
-                hours = minutes // 60
-                if hours:
-                    parts[1] = _('%dh') % hours
-            return _(' {} ago').format(''.join(parts))
-        hints = Hint.objects.filter(team=instance.team, puzzle=instance.puzzle)
-        hint_line = ''
-        if len(hints):
-            hint_line = _('\nHints:') + ','.join('%s (%s%s)' % (
-                format_time_ago(hint.submitted_datetime),
-                hint.get_status_display(),
-                format_time_ago(hint.answered_datetime),
-            ) for hint in hints)
-        if instance.used_free_answer:
-            dispatch_free_answer_alert(
-                _(':question: {} Team {} used a free answer on {}!{}').format(
-                    instance.puzzle.emoji, instance.team, instance.puzzle, hint_line))
-        else:
-            submitted_teams = AnswerSubmission.objects.filter(
-                puzzle=instance.puzzle,
-                submitted_answer=instance.submitted_answer,
-                used_free_answer=False,
-                team__is_hidden=False,
-            ).values_list('team_id', flat=True).distinct().count()
-            sigil = ':x:'
-            if instance.is_correct:
-                sigil = {
-                    1: ':first_place:', 2: ':second_place:', 3: ':third_place:'
-                }.get(submitted_teams, ':white_check_mark:')
-            elif submitted_teams > 1:
-                sigil = ':skull_crossbones:'
-            dispatch_submission_alert(
-                _('{} {} Team {} submitted `{}` for {}: {}{}').format(
-                    sigil, instance.puzzle.emoji, instance.team,
-                    instance.submitted_answer, instance.puzzle,
-                    _('Correct!') if instance.is_correct else _('Incorrect.'),
-                    hint_line,
-                ),
-                correct=instance.is_correct)
-        if not instance.is_correct:
-            return
-        show_solve_notification(instance)
-        obsoleted_hints = Hint.objects.filter(
-            team=instance.team,
-            puzzle=instance.puzzle,
-            status=Hint.NO_RESPONSE,
-        )
-        # Do this instead of obsoleted_hints.update(status=Hint.OBSOLETE,
-        # answered_datetime=now) to trigger post_save.
-        for hint in obsoleted_hints:
+        LeaderboardEntry.record_submission(instance)
+        submitted_teams = AnswerStat.record_submission(instance)
+        announce_answer_submission(instance, submitted_teams)
+
+# This runs in the submission's transaction, so the alert (which is only
+# queued for send_alerts) and the obsoleted hints can't be lost after the
+# submission commits. Only the websocket push waits until after the commit.
+def announce_answer_submission(instance, submitted_teams):
+    now = timezone.localtime()
+    def format_time_ago(timestamp):
+        if not timestamp:
+            return ''
+        diff = now - timestamp
+        parts = ['', '', '', '']
+        if diff.days > 0:
+            parts[0] = _('%dd') % diff.days
+        seconds = diff.seconds
+        parts[3] = _('%02ds') % (seconds % 60)
+        minutes = seconds // 60
+        if minutes:
+            parts[2] = _('%02dm') % (minutes % 60)
+            hours = minutes // 60
+            if hours:
+                parts[1] = _('%dh') % hours
+        return _(' {} ago').format(''.join(parts))
+    hints = list(Hint.objects.filter(team_id=instance.team_id, puzzle_id=instance.puzzle_id))
+    hint_line = ''
+    if len(hints):
+        hint_line = _('\nHints:') + ','.join('%s (%s%s)' % (
+            format_time_ago(hint.submitted_datetime),
+            hint.get_status_display(),
+            format_time_ago(hint.answered_datetime),
+        ) for hint in hints)
+    if instance.used_free_answer:
+        dispatch_free_answer_alert(
+            _(':question: {} Team {} used a free answer on {}!{}').format(
+                instance.puzzle.emoji, instance.team, instance.puzzle, hint_line))
+    else:
+        sigil = ':x:'
+        if instance.is_correct:
+            sigil = {
+                1: ':first_place:', 2: ':second_place:', 3: ':third_place:'
+            }.get(submitted_teams, ':white_check_mark:')
+        elif submitted_teams > 1:
+            sigil = ':skull_crossbones:'
+        dispatch_submission_alert(
+            _('{} {} Team {} submitted `{}` for {}: {}{}').format(
+                sigil, instance.puzzle.emoji, instance.team,
+                instance.submitted_answer, instance.puzzle,
+                _('Correct!') if instance.is_correct else _('Incorrect.'),
+                hint_line,
+            ),
+            correct=instance.is_correct)
+    if not instance.is_correct:
+        return
+    defer(show_solve_notification, instance)
+    # Do this instead of an .update(status=Hint.OBSOLETE,
+    # answered_datetime=now) to trigger post_save.
+    for hint in hints:
+        if hint.status == Hint.NO_RESPONSE:
             hint.status = Hint.OBSOLETE
             hint.answered_datetime = now
             hint.save()
 
 
+@receiver(post_delete, sender=AnswerSubmission)
+def update_leaderboard_on_answer_deletion(sender, instance, **kwargs):
+    if instance.is_correct and not instance.used_free_answer:
+        LeaderboardEntry.rebuild(team_ids=(instance.team_id,))
+    if AnswerStat.counts(instance):
+        updates = {'team_count': F('team_count') - 1}
+        if instance.submitted_datetime < HUNT_END_TIME:
+            updates['hunt_team_count'] = F('hunt_team_count') - 1
+        AnswerStat.objects.filter(
+            puzzle_id=instance.puzzle_id,
+            submitted_answer=instance.submitted_answer,
+            team_count__gt=0,
+        ).update(**updates)
+
+
 class ExtraGuessGrant(models.Model):
     '''Extra guesses granted to a particular team.'''
 
@@ -693,10 +1107,25 @@ class ExtraGuessGrant(models.Model):
 class PuzzleMessage(models.Model):
     '''A "keep going" message shown on submitting a specific wrong answer.'''
 
+    EXACT = 'E'
+    PREFIX = 'P'
+    REGEX = 'R'
+    MATCH_TYPES = (
+        (EXACT, _('Exact')),
+        (PREFIX, _('Prefix')),
+        (REGEX, _('Regex')),
+    )
+
     puzzle = models.ForeignKey(Puzzle, on_delete=models.CASCADE, verbose_name=_('puzzle'))
 
     guess = models.CharField(max_length=255, verbose_name=_('Guess'))
     response = models.TextField(verbose_name=_('Response'))
+    match_type = models.CharField(choices=MATCH_TYPES, default=EXACT, max_length=1,
+        verbose_name=_('Match type'), help_text=_('''
+        Guesses are compared after uppercasing and removing everything but
+        letters and digits. A prefix matches any guess that starts with it; a
+        regex has to match the whole (uppercased) guess.
+    '''))
 
     class Meta:
         verbose_name = _('puzzle message')
@@ -705,15 +1134,63 @@ class PuzzleMessage(models.Model):
     def __str__(self):
         return '%s: %s' % (self.puzzle, self.guess)
 
+    def clean(self):
+        if self.match_type == PuzzleMessage.REGEX:
+            try:
+                re.compile(self.guess)
+            except re.error as e:
+                raise ValidationError({'guess': str(e)})
+
     @property
     def semicleaned_guess(self):
         return PuzzleMessage.semiclean_guess(self.guess)
 
     @staticmethod
     def semiclean_guess(s):
-        if s is None: return s
-        nfkd_form = unicodedata.normalize('NFKD', s)
-        return ''.join([c.upper() for c in nfkd_form if c.isalnum()])
+        return normalization.semiclean_guess(s)
+
+    # The responses to show for a guess, in the order the messages were added.
+    @staticmethod
+    def responses(puzzle, guess):
+        return puzzle_messages.get(puzzle.id).match(PuzzleMessage.semiclean_guess(guess))
+
+
+# All of a puzzle's messages, set up so that matching a guess is a dict lookup
+# (plus one compiled pattern per prefix or regex message, which are rare).
+class PuzzleMessageMatcher:
+    def __init__(self, messages):
+        self.exact = collections.defaultdict(list) # semicleaned guess -> [(id, response)]
+        self.patterns = [] # (id, compiled pattern, whether it's a prefix, response)
+        for message in messages:
+            if message.match_type == PuzzleMessage.EXACT:
+                self.exact[message.semicleaned_guess].append((message.id, message.response))
+                continue
+            if message.match_type == PuzzleMessage.PREFIX:
+                pattern = re.escape(message.semicleaned_guess)
+            else:
+                pattern = message.guess
+            try:
+                self.patterns.append((message.id, re.compile(pattern),
+                    message.match_type == PuzzleMessage.PREFIX, message.response))
+            except re.error:
+                pass # clean() doesn't let these through the admin
+
+    def match(self, semicleaned_guess):
+        matches = self.exact.get(semicleaned_guess, [])
+        if self.patterns and semicleaned_guess is not None:
+            matches = sorted(matches + [
+                (id, response) for (id, pattern, is_prefix, response) in self.patterns
+                if (pattern.match if is_prefix else pattern.fullmatch)(semicleaned_guess)
+            ])
+        return [response for (id, response) in matches]
+
+puzzle_messages = VersionedCache('puzzle-messages', lambda puzzle_id: PuzzleMessageMatcher(
+    PuzzleMessage.objects.filter(puzzle_id=puzzle_id).order_by('id')))
+
+@receiver(post_save, sender=PuzzleMessage)
+@receiver(post_delete, sender=PuzzleMessage)
+def invalidate_puzzle_messages(sender, instance, **kwargs):
+    puzzle_messages.invalidate(instance.puzzle_id)
 
 
 class Erratum(models.Model):
@@ -862,6 +1339,11 @@ class Hint(models.Model):
     class Meta:
         verbose_name = _('hint')
         verbose_name_plural = _('hints')
+        indexes = [
+            # The unclaimed hint count shown to admins on every page.
+            models.Index(fields=['status', 'claimer'], name='puzzles_hint_claim'),
+            models.Index(fields=['team', 'puzzle', 'status'], name='puzzles_hint_team_puzzle'),
+        ]
 
     def __str__(self):
         def abbr(s):
@@ -976,3 +1458,202 @@ class CannedHint(models.Model):
     def __str__(self):
         return f'{self.team} unlocked "{self.hint_id}" for {self.puzzle}'
     
+
+
+class OutboundAlert(models.Model):
+    '''A Discord webhook message waiting for the send_alerts command.'''
+    webhook = models.URLField(max_length=500, verbose_name=_('webhook'))
+    username = models.CharField(max_length=255, verbose_name=_('username'))
+    content = models.TextField(verbose_name=_('content'))
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name=_('created time'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('attempts'))
+    next_attempt_time = models.DateTimeField(default=timezone.now, verbose_name=_('next attempt time'))
+
+    class Meta:
+        indexes = [models.Index(fields=['next_attempt_time', 'id'])]
+        verbose_name = _('outbound alert')
+        verbose_name_plural = _('outbound alerts')
+
+    def __str__(self):
+        return f'{self.username}: {self.content[:50]}'
+
+
+class OutboundHintMessage(models.Model):
+    '''A message for the hint channel waiting for the run_discord_bot command.'''
+    content = models.TextField(verbose_name=_('content'))
+    embeds = models.JSONField(verbose_name=_('embeds'))
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name=_('created time'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('attempts'))
+    next_attempt_time = models.DateTimeField(default=timezone.now, verbose_name=_('next attempt time'))
+
+    class Meta:
+        indexes = [models.Index(fields=['next_attempt_time', 'id'])]
+        verbose_name = _('outbound hint message')
+        verbose_name_plural = _('outbound hint messages')
+
+    def __str__(self):
+        return self.content[:50]
+
+
+class OutboundEmail(models.Model):
+    '''An email rendered by send_mail_wrapper, for the send_emails command, or
+    one chunk of a MailCampaign's recipients, for send_campaign.'''
+
+    MAX_ATTEMPTS = 6
+    MAX_BACKOFF = datetime.timedelta(minutes=30)
+
+    QUEUED = 'Q'
+    SENT = 'S'
+    FAILED = 'F'
+
+    STATUSES = (
+        (QUEUED, _('Queued')),
+        (SENT, _('Sent')),
+        (FAILED, _('Failed')),
+    )
+
+    subject = models.CharField(max_length=998, verbose_name=_('subject'))
+    body = models.TextField(verbose_name=_('body'))
+    html_body = models.TextField(blank=True, verbose_name=_('HTML body'))
+    recipients = models.JSONField(verbose_name=_('recipients'))
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name=_('created time'))
+    status = models.CharField(choices=STATUSES, default=QUEUED, max_length=1, verbose_name=_('status'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('attempts'))
+    next_attempt_time = models.DateTimeField(default=timezone.now, verbose_name=_('next attempt time'))
+    sent_time = models.DateTimeField(null=True, blank=True, verbose_name=_('sent time'))
+    error = models.TextField(blank=True, verbose_name=_('error'))
+    # Campaign mail is BCCed and left to send_campaign, and its rows are the
+    # record of who the campaign has already been queued for.
+    campaign = models.ForeignKey('MailCampaign', null=True, blank=True, on_delete=models.CASCADE, verbose_name=_('campaign'))
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_time'])]
+        verbose_name = _('outbound email')
+        verbose_name_plural = _('outbound emails')
+
+    def __str__(self):
+        return f'{self.subject} to {", ".join(self.recipients)}'
+
+    def message(self, connection):
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body,
+            from_email=MESSAGING_SENDER_EMAIL,
+            to=[CONTACT_EMAIL] if self.campaign_id else self.recipients,
+            bcc=self.recipients if self.campaign_id else (),
+            reply_to=[CONTACT_EMAIL],
+            connection=connection)
+        if self.html_body:
+            message.attach_alternative(self.html_body, 'text/html')
+        return message
+
+    def record_sent(self):
+        self.status = OutboundEmail.SENT
+        self.attempts += 1
+        self.sent_time = timezone.now()
+        self.error = ''
+        self.save(update_fields=('status', 'attempts', 'sent_time', 'error'))
+
+    # Either gives up (and alerts) or schedules another attempt with backoff.
+    def record_failure(self, error, permanent):
+        self.attempts += 1
+        self.error = error
+        if permanent or self.attempts >= self.MAX_ATTEMPTS:
+            self.status = OutboundEmail.FAILED
+            if self.campaign_id:
+                # A chunk of a campaign is BCCed to people on many teams, so
+                # keep their addresses out of the alert channel. (The error
+                # can list them too, so it's only in the admin.)
+                dispatch_general_alert(_('Could not send campaign <{}> to {} recipients; see outbound email {} in the admin.').format(
+                    self.campaign, len(self.recipients), self.id))
+            else:
+                dispatch_general_alert(_('Could not send mail <{}> to <{}>:\n{}').format(
+                    self.subject, ', '.join(self.recipients), self.error))
+        else:
+            backoff = min(self.MAX_BACKOFF, datetime.timedelta(seconds=5 * 2 ** self.attempts))
+            self.next_attempt_time = timezone.now() + backoff
+        self.save(update_fields=('attempts', 'error', 'status', 'next_attempt_time'))
+
+class MailCampaign(models.Model):
+    '''An email to every team member with an address, sent by send_campaign.'''
+
+    subject = models.CharField(max_length=998, verbose_name=_('subject'))
+    body = models.TextField(verbose_name=_('body'))
+    html_body = models.TextField(blank=True, verbose_name=_('HTML body'))
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name=_('created time'))
+
+    # Recipients are queued (as OutboundEmails) in order of TeamMember id, and
+    # everyone up to this one has been, so an interrupted send can pick up
+    # after it.
+    last_member_id = models.PositiveIntegerField(default=0, verbose_name=_('last team member id'))
+    sent_count = models.PositiveIntegerField(default=0, verbose_name=_('sent count'))
+    failed_count = models.PositiveIntegerField(default=0, verbose_name=_('failed count'))
+    # Set by the admin action for the send_campaign worker to pick up.
+    queued_time = models.DateTimeField(null=True, blank=True, verbose_name=_('queued time'))
+    finished_time = models.DateTimeField(null=True, blank=True, verbose_name=_('finished time'))
+
+    class Meta:
+        verbose_name = _('mail campaign')
+        verbose_name_plural = _('mail campaigns')
+
+    def __str__(self):
+        return self.subject
+
+# Keep the cached per-team snapshots (see `persistent` in context.py) in sync.
+@receiver(post_save, sender=AnswerSubmission)
+@receiver(post_delete, sender=AnswerSubmission)
+@receiver(post_save, sender=PuzzleUnlock)
+@receiver(post_delete, sender=PuzzleUnlock)
+@receiver(post_save, sender=ExtraGuessGrant)
+@receiver(post_delete, sender=ExtraGuessGrant)
+@receiver(post_save, sender=Hint)
+@receiver(post_delete, sender=Hint)
+@receiver(post_save, sender=CannedHint)
+@receiver(post_delete, sender=CannedHint)
+def invalidate_team_snapshot(sender, instance, **kwargs):
+    team_snapshots.invalidate(instance.team_id)
+
+@receiver(post_save, sender=Team)
+def invalidate_team_snapshot_on_save(sender, instance, **kwargs):
+    # next_time_unlock depends on the team's own fields. (This also covers a
+    # deleted team's id being reused while its snapshot is still around.)
+    team_snapshots.invalidate(instance.id)
+
+# Keep the bigboard's snapshot (see bigboard.py) in sync too.
+@receiver(post_save, sender=AnswerSubmission)
+@receiver(post_delete, sender=AnswerSubmission)
+@receiver(post_save, sender=PuzzleUnlock)
+@receiver(post_delete, sender=PuzzleUnlock)
+@receiver(post_save, sender=Hint)
+@receiver(post_delete, sender=Hint)
+@receiver(post_save, sender=CannedHint)
+@receiver(post_delete, sender=CannedHint)
+def record_bigboard_cell_change(sender, instance, **kwargs):
+    record_bigboard_change(sender._meta.model_name, instance.team_id, instance.puzzle_id)
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def record_bigboard_team_change(sender, instance, **kwargs):
+    record_bigboard_change('team', instance.id)
+
+# Run the unlock engine (see Team.update_unlocks) when its inputs change.
+@receiver(post_save, sender=AnswerSubmission)
+def update_unlocks_on_solve(sender, instance, created, **kwargs):
+    if not created or not instance.is_correct:
+        return
+    # Load the team fresh, since instance.team may have cached its solves
+    # from before this one. The solve views pass their request's context
+    # along as instance.context, so that the unlock notice also goes into
+    # the solver's messages; admin and commands don't have one.
+    team = Team.objects.get(id=instance.team_id)
+    context = getattr(instance, 'context', None)
+    if context is None:
+        Team.update_unlocks(team)
+    else:
+        context.team = team
+        Team.update_unlocks(context)
+
+@receiver(post_save, sender=Team)
+def update_unlocks_on_team_creation(sender, instance, created, **kwargs):
+    if created:
+        Team.update_unlocks(instance)
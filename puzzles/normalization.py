@@ -0,0 +1,44 @@
+'''
+Answer normalization, which happens on every guess.
+
+Normalizing means NFKD-decomposing the string (which splits each Hangul
+syllable into its jamo, so 가 and ᄀ + ᅡ compare equal), uppercasing, and
+dropping everything that isn't a letter (or for keep-going messages, a letter
+or digit). Decomposing, uppercasing and filtering each character doesn't
+depend on its neighbors (NFKD only reorders combining marks, which are dropped
+anyway), so instead of doing it one character at a time in Python, we build a
+str.translate table that maps each character to its normalized form the first
+time the character is seen. Whole results are also
+memoized, since the same few answers get submitted over and over.
+'''
+
+import functools
+import unicodedata
+
+
+class _TranslationTable(dict):
+    def __init__(self, keep):
+        super().__init__()
+        self.keep = keep
+
+    def __missing__(self, codepoint):
+        decomposed = unicodedata.normalize('NFKD', chr(codepoint))
+        value = ''.join([c.upper() for c in decomposed if self.keep(c)])
+        self[codepoint] = value
+        return value
+
+
+_ANSWER_TABLE = _TranslationTable(str.isalpha)
+_GUESS_TABLE = _TranslationTable(str.isalnum)
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_answer(s):
+    if s is None: return s
+    return s.translate(_ANSWER_TABLE)
+
+
+@functools.lru_cache(maxsize=4096)
+def semiclean_guess(s):
+    if s is None: return s
+    return s.translate(_GUESS_TABLE)
@@ -0,0 +1,172 @@
+// Draws the bigboard's team rows, which the page leaves out: they're fetched
+// from the data URL a page at a time, and only the rows on screen (and a few
+// around them) are in the DOM, with empty rows standing in for the rest. For
+// superusers, changed rows and totals also come in over /ws/bigboard.
+(() => {
+    const table = document.getElementById('bigboard');
+    const body = document.getElementById('teams');
+    const hide = document.getElementById('hide');
+    const {url, board, limit} = table.dataset;
+    const columns = Array.from(table.querySelectorAll('th[data-puzzle]'), th => Number(th.dataset.puzzle));
+    const width = 7 + columns.length;
+    const OVERSCAN = 20;
+    let rows = []; // in board order
+    let shown = []; // rows, less finished teams if they're hidden
+    let rowHeight = 0;
+
+    function td(className, ...children) {
+        const cell = document.createElement('td');
+        if (className)
+            cell.className = className;
+        cell.append(...children);
+        return cell;
+    }
+
+    function small(text) {
+        const elt = document.createElement('small');
+        elt.textContent = text;
+        return elt;
+    }
+
+    function renderRow(row) {
+        const tr = document.createElement('tr');
+        if (row.finished)
+            tr.className = 'finished';
+        const link = document.createElement('a');
+        link.href = row.url;
+        link.textContent = row.name;
+        const time = td();
+        time.innerHTML = row.last_solve_time;
+        tr.append(
+            td('', link),
+            td('', String(row.rank), ...(row.finished ? [small(row.finished)] : [])),
+            td('',
+                row.total_solves ? String(row.total_solves) : '',
+                row.wrong_guesses ? ' −' + row.wrong_guesses : '',
+                ...(row.free_solves ? [small('+' + row.free_solves)] : [])),
+            td('', row.meta_solves ? String(row.meta_solves) : ''),
+            td('', row.used_hints || row.hints_total ? `${row.used_hints} / ${row.hints_total}` : ''),
+            td('', row.used_hints ? `${row.requested_hints} / ${row.asked_hints}` : ''),
+            time,
+            ...row.cells.map(([cls, position, wrong, requested, canned]) => td(cls,
+                position ? String(position) : '',
+                wrong ? ' −' + wrong : '',
+                ...(requested || canned ? [small(`${requested} / ${canned}`)] : []))),
+        );
+        return tr;
+    }
+
+    function spacer(rowCount) {
+        const tr = document.createElement('tr');
+        tr.className = 'spacer';
+        const cell = td();
+        cell.colSpan = width;
+        cell.style.height = rowCount * rowHeight + 'px';
+        tr.append(cell);
+        return tr;
+    }
+
+    function render() {
+        if (!shown.length) {
+            body.replaceChildren();
+            return;
+        }
+        if (!rowHeight) {
+            // Rows are all the same height (see the td style), so measure one.
+            body.replaceChildren(renderRow(shown[0]));
+            rowHeight = body.rows[0].getBoundingClientRect().height;
+        }
+        const top = window.scrollY + body.getBoundingClientRect().top;
+        const first = Math.max(0, Math.floor((window.scrollY - top) / rowHeight) - OVERSCAN);
+        const last = Math.min(shown.length,
+            Math.ceil((window.scrollY + window.innerHeight - top) / rowHeight) + OVERSCAN);
+        const fragment = document.createDocumentFragment();
+        if (first > 0)
+            fragment.append(spacer(first));
+        for (let i = first; i < last; i++)
+            fragment.append(renderRow(shown[i]));
+        if (last < shown.length)
+            fragment.append(spacer(shown.length - last));
+        body.replaceChildren(fragment);
+        updateTimestamps();
+    }
+
+    function update() {
+        shown = hide.checked ? rows.filter(row => !row.finished) : rows;
+        render();
+    }
+
+    let scheduled = false;
+    function scheduleRender() {
+        if (scheduled)
+            return;
+        scheduled = true;
+        requestAnimationFrame(() => {
+            scheduled = false;
+            render();
+        });
+    }
+
+    const percentage = (a, b) => b ? Math.floor(100 * a / b) + '%' : '';
+    // The puzzle cells come after the label and the two blank cells.
+    const totalCell = (name, column) => table.querySelector(`tr[data-total="${name}"]`)?.cells[3 + column];
+    function setTotals(column, totals) {
+        const set = (name, text) => {
+            const cell = totalCell(name, column);
+            if (cell)
+                cell.textContent = text;
+        };
+        if (totals.total_unlocks !== undefined)
+            set('unlocks', totals.total_unlocks);
+        const unlocks = Number(totalCell('unlocks', column).textContent);
+        set('solves', totals.solves);
+        set('total-guesses', totals.total_guesses);
+        set('used-hints', totals.used_hints);
+        set('hints', `${totals.requested_hints} / ${totals.canned_hints}`);
+        set('free-solves', totals.free_solves);
+        set('solve-guess', percentage(totals.solves, totals.total_guesses));
+        set('solve-unlock', percentage(totals.solves, unlocks));
+    }
+
+    async function load() {
+        let cursor = '';
+        do {
+            const params = new URLSearchParams({cursor, limit});
+            const response = await fetch(url + '?' + params);
+            if (!response.ok)
+                return;
+            const data = await response.json();
+            if (data.totals)
+                data.totals.forEach((totals, column) => setTotals(column, totals));
+            // The board may have changed between pages; a team that moved
+            // up keeps its first place in the list.
+            const seen = new Set(rows.map(row => row.team));
+            rows.push(...data.rows.filter(row => !seen.has(row.team)));
+            update();
+            cursor = data.next;
+        } while (cursor !== null);
+    }
+
+    // Ranks and unlock totals need the whole board, so they wait for a
+    // refresh, as do teams that aren't on the board yet.
+    function receive(data) {
+        const {team, puzzle, rows: changed, totals} = JSON.parse(data);
+        const i = rows.findIndex(row => row.team === team);
+        if (i >= 0 && !changed[board])
+            rows.splice(i, 1);
+        else if (i >= 0)
+            rows[i] = {...changed[board], rank: rows[i].rank};
+        if (i >= 0)
+            update();
+        const column = columns.indexOf(puzzle);
+        if (totals && column >= 0)
+            setTotals(column, totals[board]);
+    }
+
+    hide.addEventListener('change', update);
+    window.addEventListener('scroll', scheduleRender);
+    window.addEventListener('resize', scheduleRender);
+    load();
+    if (table.dataset.live !== undefined)
+        openSocket('/ws/bigboard', receive);
+})();
@@ -1,11 +1,50 @@
+import array
+import asyncio
+import csv
+import gzip
+import io
+import json
 import logging
-from datetime import datetime
+import os
+import random
+import re
+import smtplib
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
 
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 import django.urls as urls
+from django.contrib import admin
 from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib import messages
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 
-from .models import Puzzle, Round, Team, AnswerSubmission
+from . import bigboard
+from .admin import MailCampaignAdmin
+from .hunt_config import HUNT_END_TIME, META_META_SLUG
+from .management.commands import export_hunt_data
+from .messaging import BigboardConsumer, discord_interface, flush_deferred
+from .models import (
+    Puzzle, PuzzleUnlock, Round, Team, AnswerSubmission, LeaderboardEntry, OutboundAlert,
+    OutboundEmail, OutboundHintMessage, MailCampaign, TeamMember, AnswerStat, PuzzleMessage, Hint, CannedHint, Survey,
+    puzzle_catalog,
+)
 
 # wow, we log a lot of things as INFO
 logging.disable(logging.INFO)
@@ -118,3 +157,856 @@ class Misc(TestCase):
 
         response = c.get(urls.reverse("team", args=(self.team_b.team_name,)))
         self.assertEqual(response.status_code, 200)
+
+    def test_leaderboard(self):
+        AnswerSubmission(
+            team=self.team_a,
+            puzzle=self.sample_puzzle,
+            submitted_answer="SAMPLEANSWER",
+            is_correct=True,
+            used_free_answer=False
+        ).save()
+
+        leaderboard = list(Team.leaderboard(None, hide_hidden=False))
+        self.assertEqual([team['id'] for team in leaderboard], [self.team_a.id, self.team_b.id])
+        self.assertEqual(leaderboard[0]['total_solves'], 1)
+        self.assertEqual(leaderboard[1]['total_solves'], 0)
+
+        LeaderboardEntry.objects.all().delete()
+        self.assertEqual(LeaderboardEntry.rebuild(), 2)
+        self.assertEqual(list(Team.leaderboard(None, hide_hidden=False)), leaderboard)
+
+        AnswerSubmission.objects.filter(team=self.team_a).delete()
+        self.assertEqual(self.team_a.leaderboard_entry.total_solves, 0)
+
+        # A team created without signals has no entry yet, but still ranks
+        # like a team with no solves.
+        (team_c,) = Team.objects.bulk_create([Team(user=create_user("c"), team_name="Team C")])
+        self.assertFalse(LeaderboardEntry.objects.filter(team=team_c).exists())
+        leaderboard = list(Team.leaderboard(None, hide_hidden=False))
+        self.assertEqual([(team['id'], team['total_solves']) for team in leaderboard],
+            [(self.team_a.id, 0), (self.team_b.id, 0), (team_c.id, 0)])
+        self.assertEqual(leaderboard[2]['last_solve_or_creation_time'], team_c.creation_time)
+        self.assertEqual(Team.rank_of(team_c, None), 3)
+
+    def test_rank_of(self):
+        team_c = Team(
+            user=create_user("c"),
+            team_name="Team C",
+            is_hidden=True,
+        )
+        team_c.save()
+        for team, puzzle in (
+            (self.team_b, self.sample_puzzle),
+            (team_c, self.sample_puzzle),
+            (team_c, self.sample_puzzle_2),
+        ):
+            AnswerSubmission(
+                team=team,
+                puzzle=puzzle,
+                submitted_answer=puzzle.normalized_answer,
+                is_correct=True,
+                used_free_answer=False
+            ).save()
+
+        teams = (self.team_a, self.team_b, team_c)
+        for current_team in (None,) + teams:
+            for hide_hidden in (True, False):
+                leaderboard_ids = list(Team.leaderboard_teams(
+                    current_team, hide_hidden).values_list('id', flat=True))
+                for team in teams:
+                    expected = leaderboard_ids.index(team.id) + 1 if team.id in leaderboard_ids else None
+                    self.assertEqual(Team.rank_of(team, current_team, hide_hidden), expected)
+        self.assertIsNone(Team.rank_of(team_c, None))
+        self.assertEqual(Team.rank_of(team_c, team_c), 1)
+
+    def test_puzzle_catalog(self):
+        self.assertEqual(puzzle_catalog.get(), (self.sample_puzzle, self.sample_puzzle_2))
+        with self.assertNumQueries(0):
+            puzzle_catalog.get()
+
+        self.sample_puzzle_2.order = -1
+        self.sample_puzzle_2.save()
+        self.assertEqual(puzzle_catalog.get(), (self.sample_puzzle_2, self.sample_puzzle))
+        self.sample_puzzle.delete()
+        self.assertEqual(puzzle_catalog.get(), (self.sample_puzzle_2,))
+
+    def test_team_snapshot(self):
+        def load():
+            team = Team.objects.get(id=self.team_a.id)
+            return (team.submissions, team.db_unlocks, team.asked_hints,
+                team.extra_guesses, team.num_canned_hints_used)
+        load()
+        with self.assertNumQueries(1):  # just the Team itself
+            self.assertEqual(load(), ((), {}, (), {}, 0))
+
+        AnswerSubmission(team=self.team_a, puzzle=self.sample_puzzle,
+            submitted_answer="WRONG", is_correct=False, used_free_answer=False).save()
+        submissions = load()[0]
+        self.assertEqual([s.submitted_answer for s in submissions], ["WRONG"])
+        with self.assertNumQueries(1):
+            self.assertEqual(load()[0], submissions)
+
+    def test_unlocks(self):
+        def unlocks():
+            team = Team.objects.get(id=self.team_a.id)
+            return {puzzle.slug: time for (puzzle, time) in Team.compute_unlocks(team).items()}
+        timed = Puzzle.objects.create(name="Timed", slug="timed", answer="TIMED",
+            round=self.sample_round, order=2, unlock_hours=1)
+        Puzzle.objects.create(name="Free", slug="free", answer="FREE",
+            round=self.sample_round, order=3, unlock_local=0)
+        self.assertEqual(unlocks(), {})
+        with mock.patch("puzzles.models.show_unlock_notifications") as notify, \
+                mock.patch("puzzles.models.record_bigboard_change") as record:
+            call_command("recompute_unlocks", "--quiet", stdout=open(os.devnull, "w"))
+        self.assertEqual(list(unlocks()), ["free"])
+        notify.assert_not_called()
+        record.assert_not_called()
+
+        start = timezone.localtime() - timedelta(hours=2)
+        self.team_a.team_start_time = start
+        self.team_a.save()
+        self.assertEqual(unlocks()["timed"], start + timedelta(hours=timed.unlock_hours))
+
+        AnswerSubmission(team=self.team_a, puzzle=timed, submitted_answer="TIMED",
+            is_correct=True, used_free_answer=False).save()
+        self.assertEqual(sorted(unlocks()), ["free", "sample", "timed"])
+
+    def test_process_time_unlocks(self):
+        timed = Puzzle.objects.create(name="Timed", slug="timed", answer="TIMED",
+            round=self.sample_round, order=2, unlock_hours=1)
+        later = Puzzle.objects.create(name="Later", slug="later", answer="LATER",
+            round=self.sample_round, order=3, unlock_hours=3)
+        start = timezone.localtime() - timedelta(hours=2)
+        self.team_a.team_start_time = start
+        self.team_a.save()
+        self.assertFalse(PuzzleUnlock.objects.exists())
+
+        call_command("process_time_unlocks", "--once", stdout=open(os.devnull, "w"))
+        self.assertEqual(list(PuzzleUnlock.objects.values_list("puzzle_id", "unlock_datetime")),
+            [(timed.id, start + timedelta(hours=1))])
+        team = Team.objects.get(id=self.team_a.id)
+        self.assertEqual(team.next_time_unlock, start + timedelta(hours=later.unlock_hours))
+
+    def test_unlock_notifications(self):
+        for i in range(3):
+            Puzzle.objects.create(name="Next %d" % i, slug="next-%d" % i, answer="NEXT",
+                round=self.sample_round, order=2 + i, unlock_global=1)
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)("team-%d" % self.user_a.id, channel)
+        async def receive_all():
+            received = []
+            try:
+                while True:
+                    received.append(await asyncio.wait_for(layer.receive(channel), 0.1))
+            except asyncio.TimeoutError:
+                return received
+
+        AnswerSubmission(team=self.team_a, puzzle=self.sample_puzzle,
+            submitted_answer="SAMPLEANSWER", is_correct=True, used_free_answer=False).save()
+        received = async_to_sync(receive_all)()
+        self.assertEqual(len(received), 1)
+        self.assertEqual(json.loads(received[0]["data"])["link"], urls.reverse("puzzles"))
+
+    def test_unlock_messages(self):
+        Puzzle.objects.create(name="Next", slug="next", answer="NEXT",
+            round=self.sample_round, order=2, unlock_global=1)
+        self.team_a.team_start_time = timezone.now()
+        self.team_a.save()
+        PuzzleUnlock.objects.create(team=self.team_a, puzzle=self.sample_puzzle, unlock_datetime=timezone.now())
+        c = Client()
+        c.login(username="a", password="secret")
+        response = c.post(urls.reverse("solve", args=(self.sample_puzzle.slug,)), {"answer": "SAMPLE ANSWER"})
+        self.assertRedirects(response, urls.reverse("solve", args=(self.sample_puzzle.slug,)),
+            fetch_redirect_response=False)
+        notices = [json.loads(message.message) for message in get_messages(response.wsgi_request)
+            if message.level == messages.INFO]
+        self.assertEqual([notice["link"] for notice in notices], [urls.reverse("puzzle", args=("next",))])
+
+    def test_send_alerts(self):
+        for (username, content) in (("ok", "one"), ("ok", "two"), ("flaky", "three"), ("bad", "four")):
+            OutboundAlert.objects.create(webhook="https://example.com/hook",
+                username=username, content=content)
+        statuses = {"ok": 204, "flaky": 502, "bad": 400}
+        posted = []
+        def post(url, json, timeout):
+            posted.append(json["content"])
+            status = statuses[json["username"]]
+            return mock.Mock(status_code=status, ok=status < 400, headers={})
+        with mock.patch("requests.Session.post", side_effect=post):
+            call_command("send_alerts", "--once")
+        self.assertEqual(posted, ["one\ntwo", "three", "four"])
+        self.assertEqual([(alert.content, alert.attempts) for alert in OutboundAlert.objects.all()],
+            [("three", 1)])
+
+    def test_send_emails(self):
+        for i in range(3):
+            OutboundEmail.objects.create(subject="Hi %d" % i, body="Hello",
+                html_body="<p>Hello</p>", recipients=["a@example.com"])
+        call_command("send_emails", "--once", stdout=open(os.devnull, "w"))
+        self.assertEqual([message.subject for message in mail.outbox], ["Hi 0", "Hi 1", "Hi 2"])
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+
+    def test_send_campaign(self):
+        for (i, email) in enumerate(["x@example.com", "", "y@example.com", "X@example.com", "z@example.com"]):
+            TeamMember.objects.create(team=self.team_a, name="Member %d" % i, email=email)
+        campaign = MailCampaign.objects.create(subject="News", body="Hello")
+        call_command("send_campaign", campaign.id, "--chunk-size", "2", stdout=open(os.devnull, "w"))
+        self.assertEqual(sorted(message.bcc for message in mail.outbox),
+            [["x@example.com", "y@example.com"], ["z@example.com"]])
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.sent_count, campaign.failed_count), (3, 0))
+
+        # Running it again only sends to new team members, and not to
+        # addresses that already got it through another team.
+        TeamMember.objects.create(team=self.team_b, name="Again", email="Y@example.com")
+        TeamMember.objects.create(team=self.team_b, name="Late", email="late@example.com")
+        call_command("send_campaign", campaign.id, stdout=open(os.devnull, "w"))
+        self.assertEqual(mail.outbox[-1].bcc, ["late@example.com"])
+        self.assertEqual(len(mail.outbox), 3)
+
+        # A chunk the server refuses is recorded as failed, not skipped over.
+        refused = MailCampaign.objects.create(subject="Refused", body="Hello")
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                side_effect=smtplib.SMTPRecipientsRefused({"x@example.com": (550, b"No such user")})), \
+                mock.patch("puzzles.models.dispatch_general_alert") as alert:
+            call_command("send_campaign", refused.id, stdout=open(os.devnull, "w"))
+        self.assertIn("to 4 recipients", alert.call_args[0][0])
+        self.assertNotIn("@example.com", alert.call_args[0][0])
+        refused.refresh_from_db()
+        self.assertEqual((refused.sent_count, refused.failed_count), (0, 4))
+        self.assertEqual(refused.last_member_id, TeamMember.objects.latest("id").id)
+        self.assertEqual([(email.status, len(email.recipients)) for email in refused.outboundemail_set.all()],
+            [(OutboundEmail.FAILED, 4)])
+
+        # The admin action only queues it for the worker, which leaves
+        # send_emails' usual mail alone.
+        OutboundEmail.objects.create(subject="Other", body="Other", recipients=["other@example.com"])
+        queued = MailCampaign.objects.create(subject="Queued", body="Hello")
+        with mock.patch.object(MailCampaignAdmin, "message_user"):
+            MailCampaignAdmin(MailCampaign, admin.site).send(None, MailCampaign.objects.filter(id=queued.id))
+        self.assertEqual(len(mail.outbox), 3)
+        call_command("send_campaign", "--once", stdout=open(os.devnull, "w"))
+        self.assertEqual([message.subject for message in mail.outbox[3:]], ["Queued"])
+        queued.refresh_from_db()
+        self.assertEqual(queued.sent_count, 4)
+        self.assertIsNotNone(queued.finished_time)
+
+    def test_puzzle_guesses(self):
+        other = Puzzle.objects.create(name="Other", slug="other", answer="OTHER", round=self.sample_round)
+        for puzzle, answers in ((self.sample_puzzle, ("ONE", "TWO")), (other, ("THREE",))):
+            for answer in answers:
+                AnswerSubmission.objects.create(team=self.team_a, puzzle=puzzle,
+                    submitted_answer=answer, is_correct=False, used_free_answer=False)
+
+        team = Team.objects.get(id=self.team_a.id)
+        with self.assertNumQueries(1):
+            self.assertEqual([s.submitted_answer for s in team.puzzle_submissions(self.sample_puzzle)], ["TWO", "ONE"])
+            self.assertEqual(len(team.puzzle_submissions(self.sample_puzzle)), 2)
+        base = team.guesses_remaining(other) + 1
+        self.assertEqual(team.guesses_remaining(self.sample_puzzle), base - 2)
+        self.assertNotIn("submissions", team._cache)
+
+    def test_load_test(self):
+        from .management.commands.load_test import percentile, summarize
+        self.assertEqual(percentile(list(range(1, 101)), 50), 50)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(list(summarize({"puzzles": [0.1, 0.2]}, {"solve": 1}, 2)), [
+            ("puzzles", 2, 0, 1, 100, 200, 200),
+            ("solve", 0, 1, 0, 0, 0, 0),
+        ])
+
+        call_command("load_test", "seed", teams=3, stdout=open(os.devnull, "w"))
+        self.assertEqual(Team.objects.filter(user__username__startswith="loadtest").count(), 3)
+        self.assertTrue(Client().login(username="loadtest0", password="password"))
+        call_command("load_test", "cleanup", stdout=open(os.devnull, "w"))
+        self.assertFalse(User.objects.filter(username__startswith="loadtest").exists())
+
+    @unittest.skipIf(bigboard.np is None, "needs NumPy")
+    def test_bigboard_engines(self):
+        from .management.commands.benchmark_bigboard import synthetic_hunt
+        (puzzles, rows) = synthetic_hunt(random.Random(0), 120, rounds=3, puzzles_per_round=5)
+        for hide_hidden in (True, False):
+            for limit in (0, 10):
+                with self.subTest(hide_hidden=hide_hidden, limit=limit):
+                    expected = bigboard.compute_python(puzzles, rows, hide_hidden, limit)
+                    self.assertEqual(bigboard.compute_numpy(puzzles, rows, hide_hidden, limit), expected)
+        (board, _) = bigboard.compute_python(puzzles, rows, hide_hidden=False)
+        classes = {entry["cls"] for team in board for entry in team["entries"]}
+        for cls in ("F", "S", "W", "U", "H RH CH", "S P", "S B"):
+            self.assertTrue(any(cls in c for c in classes), cls)
+
+    def test_bigboard_snapshot(self):
+        cache.clear()
+        self.team_b.is_hidden = True
+        self.team_b.save()
+        bigboard.current_snapshot()
+        cache.set(BigboardConsumer.WATCHED_KEY, True)
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)("bigboard", channel)
+        async def receive_all():
+            received = []
+            try:
+                while True:
+                    received.append(await asyncio.wait_for(layer.receive(channel), 0.1))
+            except asyncio.TimeoutError:
+                return received
+
+        AnswerSubmission.objects.create(team=self.team_a, puzzle=self.sample_puzzle,
+            submitted_answer="SAMPLEANSWER", is_correct=True, used_free_answer=False)
+        AnswerSubmission.objects.create(team=self.team_b, puzzle=self.sample_puzzle,
+            submitted_answer="WRONG", is_correct=False, used_free_answer=False)
+        hint = Hint.objects.create(team=self.team_b, puzzle=self.sample_puzzle_2, hint_question="?",
+            status=Hint.ANSWERED, response="응답")
+        hint.save()
+        CannedHint.objects.create(team=self.team_a, puzzle=self.sample_puzzle_2, hint_id="1")
+        # Saving only announces the rows; two viewers' consumers then work
+        # each changed row out once between them, from its last change.
+        with mock.patch.object(bigboard, "delta", wraps=bigboard.delta) as delta_mock:
+            with self.assertNumQueries(0):
+                changes = async_to_sync(receive_all)()
+            self.assertTrue(all(change["type"] == "bigboard.changed" for change in changes))
+            delta_mock.assert_not_called()
+            for viewer in (BigboardConsumer(), BigboardConsumer()):
+                for change in changes:
+                    viewer.bigboard_changed(change)
+        changed = {(change["team"], change["puzzle"]) for change in changes}
+        self.assertLess(len(changed), len(changes))
+        self.assertEqual(sorted(call.args for call in delta_mock.call_args_list), sorted(changed))
+        received = [json.loads(message["data"]) for message in async_to_sync(receive_all)()]
+        self.assertEqual(len(received), len(changed))
+        solve = next(delta for delta in received if delta["team"] == self.team_a.id)
+        self.assertEqual(solve["rows"]["public"]["cells"][0][:2], ["S", 1])
+        self.assertEqual(solve["totals"]["public"]["solves"], 1)
+        wrong = next(delta for delta in received if delta["team"] == self.team_b.id)
+        self.assertIsNone(wrong["rows"]["public"])
+        self.assertEqual(wrong["totals"]["all"]["total_guesses"], 2)
+        self.assertEqual(wrong["totals"]["public"]["total_guesses"], 1)
+
+        # Catching up only takes the events, and after that nothing at all.
+        puzzles = puzzle_catalog.get()
+        with self.assertNumQueries(0):
+            snapshot = bigboard.current_snapshot()
+            self.assertEqual(bigboard.current_snapshot().seq, snapshot.seq)
+        for hide_hidden in (True, False):
+            with self.subTest(hide_hidden=hide_hidden):
+                self.assertEqual(bigboard.compute_python(puzzles, snapshot.rows(hide_hidden), hide_hidden),
+                    bigboard.compute_python(puzzles, bigboard.load(hide_hidden), hide_hidden))
+
+        User.objects.create_superuser(username="admin", password="admin")
+        c = Client()
+        c.login(username="admin", password="admin")
+        response = c.get(urls.reverse("bigboard-unhidden") + "?1")
+        self.assertContains(response, 'data-limit="1"')
+        self.assertNotContains(response, "Team A")
+        data_url = urls.reverse("bigboard-unhidden-data")
+        first = c.get(data_url, {"count": 1}).json()
+        self.assertEqual(first["teams"], 2)
+        self.assertEqual([row["rank"] for row in first["rows"]], [1])
+        self.assertEqual(len(first["totals"]), len(puzzles))
+        second = c.get(data_url, {"count": 1, "cursor": first["next"]}).json()
+        self.assertIsNone(second["next"])
+        self.assertNotIn("totals", second)
+        self.assertEqual({row["team"] for row in first["rows"] + second["rows"]},
+            {self.team_a.id, self.team_b.id})
+        self.assertEqual(c.get(data_url, {"limit": 1}).json()["teams"], 1)
+        self.assertEqual(c.get(data_url, {"cursor": "x"}).status_code, 400)
+
+        # Teams get hints as time passes, which no event announces.
+        self.team_a.team_start_time = timezone.now() - timedelta(hours=30)
+        self.team_a.save()
+        def hints_total():
+            rows = c.get(data_url).json()["rows"]
+            return next(row["hints_total"] for row in rows if row["team"] == self.team_a.id)
+        before = hints_total()
+        with mock.patch("puzzles.context.timezone.localtime",
+                return_value=timezone.localtime() + timedelta(hours=12)):
+            self.assertEqual(hints_total(), before + 2)
+
+    def test_bigboard_failed_event(self):
+        cache.clear()
+        bigboard.current_snapshot()
+        with mock.patch("puzzles.models.record_bigboard_change"):
+            AnswerSubmission.objects.create(team=self.team_a, puzzle=self.sample_puzzle,
+                submitted_answer="WRONG", is_correct=False, used_free_answer=False)
+        with mock.patch.object(bigboard, "current_value", side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            bigboard.publish_change("answersubmission", self.team_a.id, self.sample_puzzle.id)
+        # Rebuilt, rather than stuck waiting for the event.
+        self.assertEqual(bigboard.current_snapshot().wrong, {(self.team_a.id, self.sample_puzzle.id): 1})
+
+    def test_export_hunt_data(self):
+        submission = AnswerSubmission.objects.create(team=self.team_b, puzzle=self.sample_puzzle_2,
+            submitted_answer="WRONG", is_correct=False, used_free_answer=False)
+        Hint.objects.create(team=self.team_a, puzzle=self.sample_puzzle, hint_question="?",
+            status=Hint.ANSWERED, response="응답")
+        with tempfile.TemporaryDirectory() as output:
+            call_command("export_hunt_data", output, format="raw", chunk_size=1, stdout=open(os.devnull, "w"))
+            def load(table):
+                with open(os.path.join(output, table, "schema.json")) as f:
+                    schema = json.load(f)
+                columns = {}
+                for column in schema["columns"]:
+                    with open(os.path.join(output, table, column["file"]), "rb") as f:
+                        if column["file"].endswith(".jsonl"):
+                            values = [json.loads(line) for line in f]
+                        else:
+                            values = array.array({".i32": "i", ".i8": "b", ".i64": "q"}[
+                                os.path.splitext(column["file"])[1]], f.read()).tolist()
+                    if "dictionary" in column:
+                        values = [column["dictionary"][i] for i in values]
+                    self.assertEqual(len(values), schema["rows"])
+                    columns[column["name"]] = values
+                return columns
+
+            submissions = load("submissions")
+            self.assertEqual(submissions["team_id"], [self.team_b.id])
+            self.assertEqual(submissions["puzzle_id"], [self.sample_puzzle_2.id])
+            self.assertEqual(submissions["submitted_answer"], ["WRONG"])
+            self.assertEqual(submissions["is_correct"], [0])
+            self.assertEqual(submissions["solve_position"], [-2 ** 63])
+            self.assertEqual(submissions["submitted_datetime"],
+                [int(submission.submitted_datetime.timestamp() * 10 ** 6)])
+            hints = load("hints")
+            self.assertEqual((hints["status"], hints["response"]), ([Hint.ANSWERED], ["응답"]))
+            self.assertEqual(load("teams")["team_name"], [self.team_a.team_name, self.team_b.team_name])
+
+            if export_hunt_data.pa is not None:
+                call_command("export_hunt_data", output, chunk_size=1, stdout=open(os.devnull, "w"))
+                table = export_hunt_data.pq.read_table(os.path.join(output, "submissions.parquet"))
+                self.assertEqual(table.column("submitted_datetime").to_pylist(), [submission.submitted_datetime])
+                self.assertEqual(table.column("team_id").to_pylist(), [self.team_b.id])
+
+            Hint.objects.update(status="GONE")
+            with self.assertRaisesMessage(CommandError, "puzzles_hint.status has 'GONE'"):
+                call_command("export_hunt_data", output, format="raw", tables=["hints"], stdout=open(os.devnull, "w"))
+
+    def test_normalization(self):
+        self.assertEqual(Puzzle.normalize_answer("Hello, World 42!"), "HELLOWORLD")
+        self.assertEqual(PuzzleMessage.semiclean_guess("Hello, World 42!"), "HELLOWORLD42")
+        self.assertEqual(Puzzle.normalize_answer("가 나"), "\u1100\u1161\u1102\u1161")
+        self.assertEqual(Puzzle.normalize_answer("가"), Puzzle.normalize_answer("\u1100\u1161"))
+        self.assertEqual(Puzzle.normalize_answer("straße café"), "STRASSECAFE")
+
+        self.sample_puzzle.answer = "정답 answer"
+        self.sample_puzzle.save()
+        self.assertEqual(Puzzle.objects.get(id=self.sample_puzzle.id).normalized_answer,
+            Puzzle.normalize_answer("정답ANSWER"))
+
+        # Changes that skip save() still grade against the new answer.
+        Puzzle.objects.filter(id=self.sample_puzzle.id).update(answer="새 정답")
+        puzzle_catalog.invalidate()
+        self.assertEqual(Puzzle.objects.get(id=self.sample_puzzle.id).normalized_answer,
+            Puzzle.normalize_answer("새정답"))
+        self.assertEqual(next(puzzle for puzzle in puzzle_catalog.get()
+            if puzzle.id == self.sample_puzzle.id).normalized_answer, Puzzle.normalize_answer("새정답"))
+        call_command("recompute_unlocks", stdout=open(os.devnull, "w"))
+        self.assertEqual(Puzzle.objects.filter(id=self.sample_puzzle.id)
+            .values_list("normalized_answer", flat=True).get(), Puzzle.normalize_answer("새정답"))
+
+    def test_puzzle_messages(self):
+        def add(guess, response, match_type=PuzzleMessage.EXACT):
+            PuzzleMessage.objects.create(puzzle=self.sample_puzzle, guess=guess,
+                response=response, match_type=match_type)
+        add("keep going", "exact")
+        add("KEEP", "prefix", PuzzleMessage.PREFIX)
+        add("K.*G", "regex", PuzzleMessage.REGEX)
+
+        self.assertEqual(PuzzleMessage.responses(self.sample_puzzle, "Keep-Going!"), ["exact", "prefix", "regex"])
+        self.assertEqual(PuzzleMessage.responses(self.sample_puzzle, "keeper"), ["prefix"])
+        self.assertEqual(PuzzleMessage.responses(self.sample_puzzle, "king"), ["regex"])
+        self.assertEqual(PuzzleMessage.responses(self.sample_puzzle, "kings"), [])
+        with self.assertNumQueries(0):
+            PuzzleMessage.responses(self.sample_puzzle, "keep going")
+
+        PuzzleMessage.objects.filter(response="prefix").delete()
+        self.assertEqual(PuzzleMessage.responses(self.sample_puzzle, "keeper"), [])
+
+    def test_discord_bot_outbox(self):
+        from .management.commands import run_discord_bot
+        with mock.patch.object(discord_interface, "enabled", True):
+            hint = Hint.objects.create(team=self.team_a, puzzle=self.sample_puzzle, hint_question="?")
+        (message,) = OutboundHintMessage.objects.all()
+        self.assertEqual(message.embeds[0]["url"], hint.full_url(claim=True))
+
+        # The bot posts what's queued, and keeps what fails for later.
+        posted = []
+        async def send_message(channel, content, embeds):
+            if posted:
+                raise RuntimeError("Discord is down")
+            posted.append(content)
+        client = mock.Mock()
+        client.http.send_message = send_message
+        OutboundHintMessage.objects.create(content="Second", embeds=[])
+        async def relay():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(run_discord_bot.Command().relay_messages(client, 0.01), 0.2)
+        async_to_sync(relay)()
+        self.assertEqual(posted, [message.content])
+        (failed,) = OutboundHintMessage.objects.all()
+        self.assertEqual((failed.content, failed.attempts), ("Second", 1))
+
+        # Eventually it gives up and says so.
+        with mock.patch.object(run_discord_bot, "dispatch_general_alert") as alert:
+            for attempt in range(run_discord_bot.MAX_ATTEMPTS):
+                if OutboundHintMessage.objects.exists():
+                    run_discord_bot.Command().retry_later(OutboundHintMessage.objects.get(), "error")
+        self.assertFalse(OutboundHintMessage.objects.exists())
+        alert.assert_called_once()
+
+    def test_submission_after_commit(self):
+        hint = Hint.objects.create(team=self.team_a, puzzle=self.sample_puzzle, hint_question="?")
+        with self.settings(IS_TEST=False), \
+                mock.patch("puzzles.models.dispatch_submission_alert") as alert, \
+                mock.patch("puzzles.models.show_solve_notification") as notify, \
+                mock.patch("puzzles.models.discord_interface"), \
+                mock.patch("puzzles.models.record_bigboard_change"):
+            with self.captureOnCommitCallbacks() as callbacks:
+                AnswerSubmission.objects.create(team=self.team_a, puzzle=self.sample_puzzle,
+                    submitted_answer="SAMPLEANSWER", is_correct=True, used_free_answer=False)
+                # The alert and the hint are written with the submission...
+                alert.assert_called_once()
+                hint.refresh_from_db()
+                self.assertEqual(hint.status, Hint.OBSOLETE)
+                notify.assert_not_called()
+            # ...and only the websocket push waits for the commit.
+            for callback in callbacks:
+                callback()
+            flush_deferred()
+            notify.assert_called_once()
+
+    def test_answer_stats(self):
+        team_c = Team.objects.create(user=create_user("c"), team_name="Team C", is_hidden=True)
+        def submit(team, answer):
+            with mock.patch("puzzles.models.dispatch_submission_alert") as alert:
+                AnswerSubmission(team=team, puzzle=self.sample_puzzle, submitted_answer=answer,
+                    is_correct=answer == "SAMPLEANSWER", used_free_answer=False).save()
+            return alert.call_args[0][0].split()[0]
+        def count(answer):
+            return AnswerStat.objects.get(puzzle=self.sample_puzzle, submitted_answer=answer).team_count
+
+        self.assertEqual(submit(self.team_a, "WRONG"), ":x:")
+        self.assertEqual(submit(team_c, "WRONG"), ":x:")
+        self.assertEqual(submit(self.team_b, "WRONG"), ":skull_crossbones:")
+        self.assertEqual(count("WRONG"), 2)
+        self.assertEqual(submit(self.team_b, "SAMPLEANSWER"), ":first_place:")
+        self.assertEqual(submit(self.team_a, "SAMPLEANSWER"), ":second_place:")
+
+        self.assertEqual(
+            dict(AnswerSubmission.objects.filter(is_correct=True).values_list("team_id", "solve_position")),
+            {self.team_b.id: 1, self.team_a.id: 2})
+        self.assertEqual(submit(team_c, "OTHER"), ":x:")
+        self.assertEqual(AnswerStat.popular_wrong_answers(self.sample_puzzle), [("WRONG", 2)])
+
+        AnswerSubmission.objects.filter(team=self.team_a, submitted_answer="WRONG").delete()
+        self.assertEqual(count("WRONG"), 1)
+        self.assertEqual(AnswerStat.popular_wrong_answers(self.sample_puzzle), [("WRONG", 1)])
+
+        # Hiding a team takes its submissions out of the counts and positions,
+        # and unhiding it puts them back.
+        self.team_b.is_hidden = True
+        self.team_b.save()
+        self.assertEqual(count("SAMPLEANSWER"), 1)
+        self.assertEqual(AnswerStat.popular_wrong_answers(self.sample_puzzle), [])
+        self.assertEqual(
+            dict(AnswerSubmission.objects.filter(is_correct=True).values_list("team_id", "solve_position")),
+            {self.team_b.id: None, self.team_a.id: 1})
+        team_c.is_hidden = False
+        team_c.save()
+        self.assertEqual(AnswerStat.popular_wrong_answers(self.sample_puzzle), [("OTHER", 1), ("WRONG", 1)])
+        team_b = Team.objects.get(id=self.team_b.id)
+        team_b.is_hidden = False
+        team_b.save()
+        self.assertEqual(
+            dict(AnswerSubmission.objects.filter(is_correct=True).values_list("team_id", "solve_position")),
+            {self.team_b.id: 1, self.team_a.id: 2})
+
+        # The puzzle's stats page reads the solves in that order, plus a
+        # hidden team's own.
+        team_c.is_hidden = True
+        team_c.save()
+        submit(team_c, "SAMPLEANSWER")
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        for (username, password, solvers, guesses) in (
+            ("admin", "password", [self.team_b, self.team_a], 3),
+            ("c", "csecret", [self.team_b, self.team_a, team_c], 6),
+        ):
+            c = Client()
+            c.login(username=username, password=password)
+            with mock.patch("puzzles.context.Context.hunt_is_over", True):
+                response = c.get(urls.reverse("stats", args=(self.sample_puzzle.slug,)))
+            self.assertEqual([solver["team"] for solver in response.context["solvers"]], solvers)
+            self.assertEqual(response.context["guesses"], guesses)
+
+    def test_csv_exports(self):
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        c = Client()
+        c.login(username="admin", password="password")
+        day = timezone.make_aware(datetime(2025, 9, 20, 12))
+        for (i, answer) in enumerate(("FIRST", "SECOND", "THIRD")):
+            submission = AnswerSubmission.objects.create(team=self.team_a, puzzle=self.sample_puzzle,
+                submitted_answer=answer, is_correct=False, used_free_answer=False)
+            AnswerSubmission.objects.filter(id=submission.id).update(
+                submitted_datetime=day + timedelta(days=i))
+        Hint.objects.create(team=self.team_a, puzzle=self.sample_puzzle, hint_question="?", response="A")
+        CannedHint.objects.create(team=self.team_b, puzzle=self.sample_puzzle, hint_id="1")
+        Hint.objects.create(team=self.team_b, puzzle=self.sample_puzzle, hint_question="?", response="B")
+
+        def rows(url, **params):
+            response = c.get(urls.reverse(url), params)
+            self.assertTrue(response.streaming)
+            content = b"".join(response.streaming_content)
+            if params.get("gzip"):
+                self.assertEqual(response["Content-Type"], "application/gzip")
+                content = gzip.decompress(content)
+            return [row[3] for row in csv.reader(io.StringIO(content.decode()))]
+
+        self.assertEqual(rows("guess-csv"), ["FIRST", "SECOND", "THIRD"])
+        self.assertEqual(rows("guess-csv", since="2025-09-21", until="2025-09-22T12:00"), ["SECOND"])
+        self.assertEqual(rows("guess-csv", since="2025-09-21", gzip=1), ["SECOND", "THIRD"])
+        self.assertEqual(c.get(urls.reverse("guess-csv"), {"since": "yesterday"}).status_code, 400)
+        self.assertEqual(rows("hint-csv"), ["Hint Type", "Requested", "Canned", "Requested"])
+
+
+# The main queries behind the bigboard, hunt stats, hint list and leaderboard
+# (kept in sync with the views by hand), checked against EXPLAIN so that a
+# changed query or a dropped index doesn't quietly turn into a full table scan.
+@unittest.skipUnless(connection.vendor == "sqlite", "checks SQLite query plans")
+class QueryPlans(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        sample_round = Round.objects.create(name="Round", slug="round")
+        cls.puzzles = Puzzle.objects.bulk_create([
+            Puzzle(name="Puzzle %d" % i, slug="puzzle-%d" % i, answer="ANSWER", round=sample_round)
+            for i in range(10)
+        ])
+        users = User.objects.bulk_create([User(username="user%d" % i) for i in range(30)])
+        teams = Team.objects.bulk_create([
+            Team(user=user, team_name="Team %d" % i, is_hidden=i % 10 == 0)
+            for i, user in enumerate(users)
+        ])
+        AnswerSubmission.objects.bulk_create([
+            AnswerSubmission(team=team, puzzle=puzzle, submitted_answer="GUESS%d" % k,
+                is_correct=k == 2, used_free_answer=False)
+            for team in teams for puzzle in cls.puzzles for k in range(3)
+        ])
+        Hint.objects.bulk_create([
+            Hint(team=team, puzzle=puzzle, hint_question="?",
+                status=Hint.NO_RESPONSE if i % 5 == 0 else Hint.ANSWERED)
+            for team in teams for (i, puzzle) in enumerate(cls.puzzles)
+        ])
+        PuzzleUnlock.objects.bulk_create([
+            PuzzleUnlock(team=team, puzzle=puzzle, unlock_datetime=now, view_datetime=now)
+            for team in teams for puzzle in cls.puzzles
+        ])
+
+    def assertIndexed(self, queryset, table, index=None):
+        plan = queryset.explain()
+        lines = [line for line in plan.splitlines()
+            if re.search(r"\b(SCAN|SEARCH) puzzles_%s\b" % table, line)]
+        self.assertTrue(lines, plan)
+        for line in lines:
+            self.assertTrue("INDEX" in line or "PRIMARY KEY" in line, plan)
+            if index:
+                self.assertIn(index, line, plan)
+
+    def test_bigboard(self):
+        self.assertIndexed(
+            AnswerSubmission.objects.filter(is_correct=True, team__is_hidden=False)
+            .order_by("submitted_datetime"),
+            "answersubmission", "puzzles_submission_solve")
+        self.assertIndexed(
+            AnswerSubmission.objects.filter(is_correct=False, team__is_hidden=False)
+            .values("team_id", "puzzle_id").annotate(count=Count("*")),
+            "answersubmission")
+        self.assertIndexed(
+            Hint.objects.filter(status=Hint.ANSWERED, is_followup=False)
+            .values("team_id", "puzzle_id").annotate(count=Count("*")),
+            "hint", "puzzles_hint_claim")
+        self.assertIndexed(PuzzleUnlock.objects.values_list("team_id", "puzzle_id"), "puzzleunlock")
+
+    def test_hunt_stats(self):
+        self.assertIndexed(
+            AnswerSubmission.objects.filter(used_free_answer=False, team__is_hidden=False,
+                submitted_datetime__lt=HUNT_END_TIME),
+            "answersubmission", "puzzles_submission_time")
+        self.assertIndexed(
+            PuzzleUnlock.objects.filter(puzzle=self.puzzles[0]).exclude(view_datetime=None)
+            .values_list("team_id", flat=True),
+            "puzzleunlock", "puzzles_unlock_viewed")
+
+    def test_hint_list(self):
+        self.assertIndexed(
+            Hint.objects.select_related().filter(status=Hint.NO_RESPONSE).order_by("submitted_datetime"),
+            "hint", "puzzles_hint_claim")
+        self.assertIndexed(Hint.objects.filter(status=Hint.NO_RESPONSE, claimer=""), "hint", "puzzles_hint_claim")
+        self.assertIndexed(Hint.objects.filter(team_id=1, puzzle=self.puzzles[0]), "hint", "puzzles_hint_team_puzzle")
+
+    def test_leaderboard_teams(self):
+        self.assertIndexed(Team.leaderboard_teams(None), "leaderboardentry")
+        self.assertIndexed(
+            AnswerSubmission.objects.filter(puzzle=self.puzzles[0], is_correct=True)
+            .order_by("submitted_datetime"),
+            "answersubmission", "puzzles_submission_solve")
+
+
+# Every page in gph/urls.py, visited by a superuser with a team, first with a
+# small hunt and then with a much bigger one. The number of queries a page
+# makes shouldn't depend on how many teams, submissions or hints there are
+# (that's an N+1 somewhere), and it has to stay under the page's budget.
+class QueryBudgets(TestCase):
+    PAGES = {
+        # name[?query string]: (args, query budget)
+        "index": ((), 9),
+        "about": ((), 9),
+        "archive": ((), 9),
+        "password_change": ((), 9),
+        "password_change_done": ((), 9),
+        "teams": ((), 10),
+        "team": (("Team 1",), 17),
+        "teams-unhidden": ((), 10),
+        "edit-team": ((), 10),
+        "puzzles": ((), 13),
+        "round": (("textround",), 11),
+        "puzzle": (("puzzle-0-0",), 12),
+        "solve": (("puzzle-0-0",), 15),
+        "free-answer": (("puzzle-0-0",), 11),
+        "post-hunt-solve": (("puzzle-0-0",), 11),
+        "survey-list": ((), 10),
+        "survey": (("puzzle-0-0",), 12),
+        "hint-list": ((), 13),
+        "hints": (("puzzle-0-0",), 13),
+        "hint": ((1,), 13),
+        "hunt-stats": ((), 15),
+        "stats": (("puzzle-0-0",), 16),
+        "solution": (("puzzle-0-0",), 11),
+        "solution-static": (("cipher.html",), 4),
+        "story": ((), 11),
+        "victory": ((), 9),
+        "errata": ((), 10),
+        "wrapup": ((), 9),
+        "finishers": ((), 11),
+        "bridge": ((), 10),
+        "bigboard": ((), 10),
+        "bigboard-unhidden": ((), 10),
+        # The rows come from these; a page further down shouldn't cost more.
+        "bigboard-data": ((), 11),
+        "bigboard-data?cursor=10": ((), 11),
+        "bigboard-unhidden-data": ((), 11),
+        "bigboard-unhidden-data?cursor=10&count=5": ((), 11),
+        "biggraph": ((), 12),
+        "guess-csv": ((), 5),
+        "hint-csv": ((), 6),
+        "puzzle-log": ((), 4),
+        "javascript-catalog": ((), 4),
+    }
+    # The same, logged out.
+    ANONYMOUS_PAGES = {
+        "index": ((), 3),
+        "register": ((), 3),
+        "login": ((), 3),
+        "password_reset": ((), 3),
+        "password_reset_done": ((), 3),
+        "password_reset_confirm": (lambda test: test.reset_args(), 10),
+        "password_reset_complete": ((), 4),
+    }
+    # Pages that redirect to the one that renders; the redirect is followed
+    # and counted too.
+    REDIRECTS = {"password_reset_confirm"}
+    MAX_SECONDS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rounds = []
+        for r in range(3):
+            # The first one has a template, so that the round page renders.
+            sample_round = Round.objects.create(name="Round %d" % r,
+                slug="textround" if r == 0 else "round-%d" % r)
+            cls.rounds.append(sample_round)
+            for i in range(6):
+                slug = META_META_SLUG if (r, i) == (2, 5) else "puzzle-%d-%d" % (r, i)
+                puzzle = Puzzle.objects.create(name="Puzzle %d-%d" % (r, i), slug=slug,
+                    answer="ANSWER", round=sample_round, order=i, is_meta=i == 5, body_template="cipher.html")
+            sample_round.meta = puzzle
+            sample_round.save()
+        cls.puzzles = list(Puzzle.objects.all())
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        cls.team = Team.objects.create(user=cls.user, team_name="Admin Team", team_start_time=timezone.now())
+        cls.teams = 0
+        cls.seed(20)
+
+    @classmethod
+    def seed(cls, count):
+        now = timezone.now()
+        users = User.objects.bulk_create([
+            User(username="user%d" % i) for i in range(cls.teams, cls.teams + count)])
+        teams = Team.objects.bulk_create([
+            Team(user=user, team_name="Team %d" % i, is_hidden=i % 10 == 0, team_start_time=now)
+            for (i, user) in enumerate(users, cls.teams)])
+        cls.teams += count
+        TeamMember.objects.bulk_create([
+            TeamMember(team=team, name="Member %d" % i, email="m%d@example.com" % i)
+            for team in teams for i in range(4)])
+        PuzzleUnlock.objects.bulk_create([
+            PuzzleUnlock(team=team, puzzle=puzzle, unlock_datetime=now, view_datetime=now)
+            for team in teams + [cls.team] for puzzle in cls.puzzles], ignore_conflicts=True)
+        AnswerSubmission.objects.bulk_create([
+            AnswerSubmission(team=team, puzzle=puzzle, submitted_answer=answer,
+                is_correct=answer == "ANSWER", used_free_answer=False)
+            for team in teams for puzzle in cls.puzzles for answer in ("WRONG", "ANSWER")])
+        Hint.objects.bulk_create([
+            Hint(team=team, puzzle=puzzle, hint_question="?", claimer="claimer" if i % 3 else "",
+                status=Hint.ANSWERED if i % 3 else Hint.NO_RESPONSE, response="!")
+            for team in teams + [cls.team] for (i, puzzle) in enumerate(cls.puzzles[:6])])
+        CannedHint.objects.bulk_create([
+            CannedHint(team=team, puzzle=puzzle, hint_id=str(cls.teams))
+            for team in teams + [cls.team] for puzzle in cls.puzzles[:5]])
+        Survey.objects.bulk_create([
+            Survey(team=team, puzzle=puzzle, fun=3, difficulty=3)
+            for team in teams for puzzle in cls.puzzles])
+        LeaderboardEntry.rebuild()
+        AnswerStat.rebuild([puzzle.id for puzzle in cls.puzzles])
+
+    def reset_args(self):
+        # The token depends on the last login, so make it just in time.
+        user = User.objects.get(id=self.user.id)
+        return (urlsafe_base64_encode(force_bytes(user.pk)), default_token_generator.make_token(user))
+
+    def measure(self):
+        client = Client()
+        client.login(username="admin", password="password")
+        results = {}
+        for (anonymous, pages) in ((False, self.PAGES), (True, self.ANONYMOUS_PAGES)):
+            if anonymous:
+                client = Client()
+            for (page, (args, budget)) in pages.items():
+                (name, _, query) = page.partition("?")
+                url = urls.reverse(name, args=args(self) if callable(args) else args)
+                if query:
+                    url += "?" + query
+                cache.clear()
+                start = time.monotonic()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url, follow=name in self.REDIRECTS)
+                    if getattr(response, "streaming", False):
+                        b"".join(response.streaming_content)
+                results[anonymous, page] = (len(queries), time.monotonic() - start, response.status_code)
+        return results
+
+    def test_query_budgets(self):
+        small = self.measure()
+        self.seed(300)
+        large = self.measure()
+        for (anonymous, pages) in ((False, self.PAGES), (True, self.ANONYMOUS_PAGES)):
+            for (name, (args, budget)) in pages.items():
+                with self.subTest(page=name, anonymous=anonymous):
+                    (small_queries, _, status) = small[anonymous, name]
+                    (large_queries, seconds, _) = large[anonymous, name]
+                    self.assertEqual(status, 200)
+                    self.assertLessEqual(large_queries, small_queries, "grows with the number of teams")
+                    self.assertLessEqual(large_queries, budget)
+                    self.assertLess(seconds, self.MAX_SECONDS)
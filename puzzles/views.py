@@ -1,5 +1,6 @@
 import csv
 import datetime
+import heapq
 import itertools
 import json
 import logging
@@ -7,22 +8,28 @@ import os
 import re
 import requests
 import traceback
+import zlib
 from collections import defaultdict, OrderedDict, Counter
 from functools import wraps
 from urllib.parse import quote, unquote
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
-from django.db.models import F, Q, Avg, Count
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import F, Q, Avg, Count, Sum
 from django.forms import formset_factory, modelformset_factory
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseBadRequest, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.template import TemplateDoesNotExist
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.encoding import force_bytes
 from django.utils.html import escape
 from django.utils.http import urlsafe_base64_encode
@@ -33,12 +40,12 @@ from django.views.decorators.http import require_GET, require_POST
 from django.views.static import serve
 
 from puzzles.models import (
-    Round,
     Puzzle,
     Team,
     TeamMember,
     PuzzleUnlock,
     AnswerSubmission,
+    AnswerStat,
     PuzzleMessage,
     Survey,
     Hint,
@@ -74,6 +81,7 @@ from puzzles.hunt_config import (
     REQUESTING_HINT_END_TIME,
 )
 
+from puzzles import bigboard as bigboard_engine
 from puzzles.messaging import send_mail_wrapper, dispatch_victory_alert, show_victory_notification
 from puzzles.shortcuts import dispatch_shortcut
 
@@ -87,7 +95,8 @@ def validate_puzzle(require_team=False):
     def decorator(f):
         @wraps(f)
         def inner(request, slug):
-            puzzle = Puzzle.objects.select_related().filter(slug=slug).first()
+            puzzle = next((puzzle for puzzle in request.context.all_puzzles
+                if puzzle.slug == slug), None)
             request.context.puzzle = puzzle
             if not puzzle or puzzle not in request.context.unlocks:
                 messages.error(request, _('Invalid puzzle name.'))
@@ -207,6 +216,7 @@ def start_hunt(request):
     # 팀의 헌트 시작 시간을 현재 시간으로 기록하고 데이터베이스에 저장합니다.
     team.team_start_time = request.context.now
     team.save()
+    Team.update_unlocks(request.context)
     messages.success(request, _('📝 텍스트 퍼즐헌트를 시작합니다. 행운을 빌어요!'))
     # 시작 후에는 퍼즐 목록 페이지로 이동시킵니다.
     return redirect('puzzles')
@@ -373,23 +383,14 @@ def team(request, team_name):
     # 만약 팀이 아직 시작하지 않았다면(비정상적인 경우), 전체 헌트 시작 시간을 기준으로 합니다.
     team_start_time = team.team_start_time if team.team_start_time else HUNT_START_TIME
 
-    # This Team.leaderboard_teams() call is expensive, but is
-    # the only way right now to calculate rank accurately.
-    # Hopefully it is not an issue in practice (especially
-    # after all this database optimization --beta)
-    leaderboard_ids = Team.leaderboard_teams(user_team).values_list('id', flat=True)
-    rank = None
-    for i, leaderboard_id in enumerate(leaderboard_ids):
-        if team.id == leaderboard_id:
-            rank = i + 1 # ranks are 1-indexed
-            break
+    rank = Team.rank_of(team, user_team)
 
     # 1. 각 퍼즐별 힌트 사용 횟수를 미리 계산합니다.
     hint_counts = defaultdict(int)
-    for hint in team.hint_set.all():
+    for hint in team.asked_hints:
         hint_counts[hint.puzzle_id] += 2
-    for canned_hint in team.cannedhint_set.all():
-        hint_counts[canned_hint.puzzle_id] += 1
+    for puzzle_id in team.cannedhint_set.values_list('puzzle_id', flat=True):
+        hint_counts[puzzle_id] += 1
 
     guesses = defaultdict(int)
     correct = {}
@@ -552,7 +553,8 @@ def puzzles(request):
 
 @require_GET
 def round(request, slug):
-    round = Round.objects.filter(slug=slug).first()
+    round = next((puzzle.round for puzzle in request.context.all_puzzles
+        if puzzle.round.slug == slug), None)
     if round:
         rounds = render_puzzles(request)
         if slug in rounds:
@@ -679,12 +681,8 @@ def solve(request):
             messages.error(request, _('You have no more guesses for this puzzle!'))
             return redirect('solve', puzzle.slug)
 
-        semicleaned_guess = PuzzleMessage.semiclean_guess(request.POST.get('answer'))
         normalized_answer = Puzzle.normalize_answer(request.POST.get('answer'))
-        puzzle_messages = [
-            message for message in puzzle.puzzlemessage_set.all()
-            if semicleaned_guess == message.semicleaned_guess
-        ]
+        puzzle_messages = PuzzleMessage.responses(puzzle, request.POST.get('answer'))
         tried_before = any(
             normalized_answer == submission.submitted_answer
             for submission in request.context.puzzle_submissions
@@ -693,8 +691,8 @@ def solve(request):
 
         form = SubmitAnswerForm(request.POST)
         if puzzle_messages:
-            for message in puzzle_messages:
-                form.add_error(None, mark_safe(message.response))
+            for response in puzzle_messages:
+                form.add_error(None, mark_safe(response))
         elif not normalized_answer:
             form.add_error(None, _('All puzzle answers will have '
                 'at least one letter A through Z (case does not matter).'))
@@ -702,18 +700,24 @@ def solve(request):
             form.add_error(None, _('You’ve already tried calling in the '
                 'answer “%s” for this puzzle.') % normalized_answer)
         elif form.is_valid():
-            AnswerSubmission(
-                team=team,
-                puzzle=puzzle,
-                submitted_answer=normalized_answer,
-                is_correct=is_correct,
-                used_free_answer=False,
-            ).save()
-
-            if is_correct:
-                if not request.context.hunt_is_over:
+            # The submission's post_save also updates the team's
+            # LeaderboardEntry, so keep them in one transaction.
+            with transaction.atomic():
+                submission = AnswerSubmission(
+                    team=team,
+                    puzzle=puzzle,
+                    submitted_answer=normalized_answer,
+                    is_correct=is_correct,
+                    used_free_answer=False,
+                )
+                # For the unlock notice; see update_unlocks_on_solve.
+                submission.context = request.context
+                submission.save()
+                if is_correct and not request.context.hunt_is_over:
                     team.last_solve_time = request.context.now
                     team.save()
+
+            if is_correct:
                 messages.success(request, _('%s is correct!') % puzzle.answer)
                 if puzzle.slug == META_META_SLUG:
                     dispatch_victory_alert(
@@ -778,13 +782,16 @@ def free_answer(request):
         elif team.num_free_answers_remaining <= 0:
             messages.error(request, _('You have no free answers to use.'))
         elif request.POST.get('use') == 'Yes':
-            AnswerSubmission(
-                team=team,
-                puzzle=puzzle,
-                submitted_answer=puzzle.normalized_answer,
-                is_correct=True,
-                used_free_answer=True,
-            ).save()
+            with transaction.atomic():
+                submission = AnswerSubmission(
+                    team=team,
+                    puzzle=puzzle,
+                    submitted_answer=puzzle.normalized_answer,
+                    is_correct=True,
+                    used_free_answer=True,
+                )
+                submission.context = request.context
+                submission.save()
             messages.success(request, _('Free answer used!'))
         return redirect('solve', puzzle.slug)
     return render(request, 'free_answer.html')
@@ -797,17 +804,13 @@ def post_hunt_solve(request):
     puzzle = request.context.puzzle
     answer = request.GET.get('answer')
     if answer:
-        semicleaned_guess = PuzzleMessage.semiclean_guess(answer)
         normalized_answer = Puzzle.normalize_answer(answer)
         is_correct = normalized_answer == puzzle.normalized_answer
-        puzzle_messages = [
-            message for message in puzzle.puzzlemessage_set.all()
-            if semicleaned_guess == message.semicleaned_guess
-        ]
+        puzzle_messages = PuzzleMessage.responses(puzzle, answer)
         form = SubmitAnswerForm(request.GET)
         if puzzle_messages:
-            for message in puzzle_messages:
-                form.add_error(None, mark_safe(message.response))
+            for response in puzzle_messages:
+                form.add_error(None, mark_safe(response))
             answer = None
     else:
         form = SubmitAnswerForm()
@@ -868,7 +871,7 @@ def hint_list(request):
     if 'team' in request.GET or 'puzzle' in request.GET:
         hints = (
             Hint.objects
-            .select_related()
+            .select_related('team', 'puzzle')
             .order_by('-submitted_datetime')
         )
         query_description = _('Hints')
@@ -887,7 +890,7 @@ def hint_list(request):
     else:
         unanswered = (
             Hint.objects
-            .select_related()
+            .select_related('team', 'puzzle')
             .filter(status=Hint.NO_RESPONSE)
             .order_by('submitted_datetime')
         )
@@ -1019,7 +1022,7 @@ def hints(request):
 def hint(request, id):
     '''For admins. Handle a particular hint.'''
 
-    hint = Hint.objects.select_related().filter(id=id).first()
+    hint = Hint.objects.select_related('team', 'puzzle', 'puzzle__round').filter(id=id).first()
     if not hint:
         raise Http404
     form = AnswerHintForm(instance=hint)
@@ -1074,14 +1077,14 @@ def hint(request, id):
     limit = int(limit) if limit.isdigit() else 20
     previous_same_team = (
         Hint.objects
-        .select_related()
+        .select_related('team')
         .filter(team=hint.team, puzzle=hint.puzzle, status__in=(Hint.ANSWERED, Hint.REFUNDED))
         .exclude(id=hint.id)
         .order_by('answered_datetime')
     )
     previous_all_teams = (
         Hint.objects
-        .select_related()
+        .select_related('team')
         .filter(puzzle=hint.puzzle, status__in=(Hint.ANSWERED, Hint.REFUNDED))
         .exclude(team=hint.team)
         .order_by('-answered_datetime')
@@ -1093,7 +1096,6 @@ def hint(request, id):
     # < 힌트 수정 > 이전에 봤던 canned_hint 확인하기.
     canned_hint = (
         CannedHint.objects
-        .select_related()
         .filter(team=hint.team, puzzle=hint.puzzle)
         .order_by('opened_datetime')
     )
@@ -1198,40 +1200,41 @@ def stats(request):
     q = Q(team__is_hidden=False)
     if team:
         q |= Q(team__id=team.id)
-    puzzle_submissions = (
-        puzzle.answersubmission_set
-        .filter(q, used_free_answer=False, submitted_datetime__lt=HUNT_END_TIME)
-        .order_by('submitted_datetime')
-    .select_related('team')
-    )
-
-    solve_time_map = {}
-    total_guesses_map = defaultdict(int)
-    solvers_map = {}
+    during_hunt = puzzle.answersubmission_set.filter(
+        used_free_answer=False, submitted_datetime__lt=HUNT_END_TIME)
+
+    # Counted solves have their solve_position stored (see AnswerStat), so
+    # this doesn't need to go through every guess; only a hidden team's own
+    # solve and guesses have to be added.
+    solved = Q(solve_position__isnull=False)
+    if team and team.is_hidden:
+        solved |= Q(team_id=team.id, is_correct=True)
+    solves = during_hunt.filter(solved)
+    total_guesses_map = dict(
+        during_hunt.filter(team_id__in=solves.values('team_id'))
+        .values('team_id').annotate(count=Count('id')).values_list('team_id', 'count'))
     unlock_time_map = {
         unlock.team_id: unlock.unlock_datetime
         for unlock in puzzle.puzzleunlock_set.exclude(view_datetime=None).all()
     }
-    incorrect_guesses = Counter()
-    for submission in puzzle_submissions:
-        team_id = submission.team_id
-        total_guesses_map[team_id] += 1
-        if submission.is_correct:
-            solve_time_map[team_id] = submission.submitted_datetime
-            solvers_map[team_id] = submission.team
-        else:
-            incorrect_guesses[submission.submitted_answer] += 1
+    incorrect_guesses = Counter(dict(AnswerStat.popular_wrong_answers(puzzle)))
+    guesses = AnswerStat.objects.filter(puzzle=puzzle).aggregate(
+        guesses=Sum('hunt_team_count'))['guesses'] or 0
+    if team and team.is_hidden:
+        for submission in during_hunt.filter(team_id=team.id):
+            guesses += 1
+            if not submission.is_correct:
+                incorrect_guesses[submission.submitted_answer] += 1
     solvers = [{
-        'team': solver,
-        'is_current': solver == team,
-        'unlock_time': unlock_time_map.get(solver.id),
-        'solve_time': solve_time_map[solver.id],
+        'team': solve.team,
+        'is_current': solve.team == team,
+        'unlock_time': unlock_time_map.get(solve.team_id),
+        'solve_time': solve.submitted_datetime,
         'open_duration':
-            (solve_time_map[solver.id] - unlock_time_map[solver.id])
-            .total_seconds() if solver.id in unlock_time_map else None,
-        'total_guesses': total_guesses_map[solver.id] - 1,
-    } for solver in solvers_map.values()]
-    solvers.sort(key=lambda d: d['solve_time'])
+            (solve.submitted_datetime - unlock_time_map[solve.team_id])
+            .total_seconds() if solve.team_id in unlock_time_map else None,
+        'total_guesses': total_guesses_map.get(solve.team_id, 1) - 1,
+    } for solve in solves.order_by('submitted_datetime').select_related('team')]
 
     # <힌트 수정> 힌트 세분화 함
     asked_hint_count = puzzle.hint_set.filter(q).count()
@@ -1239,8 +1242,8 @@ def stats(request):
     
     return render(request, 'stats.html', {
         'solvers': solvers,
-        'solves': len(solvers_map),
-        'guesses': sum(total_guesses_map.values()),
+        'solves': len(solvers),
+        'guesses': guesses,
         'answers_tried': incorrect_guesses.most_common(),
         'unlock_count': len(unlock_time_map),
         'asked_hint_count': asked_hint_count,
@@ -1363,193 +1366,50 @@ def bridge(request):
         'recipients_list': recipients_list,
     })
 
+# The page only has the headers, so it takes the same time however many teams
+# there are; bigboard.js fetches the rows from bigboard_data a page at a time
+# and only draws the ones on screen. As before, ?30 limits it to 30 teams.
 def bigboard_generic(request, hide_hidden):
-    puzzles = request.context.all_puzzles
-    puzzle_map = {}
-    puzzle_metas = {}
-    meta_meta_id = None
-    for puzzle in puzzles:
-        puzzle_map[puzzle.id] = puzzle
-        if puzzle.slug == META_META_SLUG:
-            meta_meta_id = puzzle.id
-        if not puzzle.is_meta:
-            puzzle_metas[puzzle.id] = puzzle.round.meta_id
-
-    wrong_guesses_map = defaultdict(int) # key (team, puzzle)
-    wrong_guesses_by_team_map = defaultdict(int) # key team
-    solve_position_map = dict() # key (team, puzzle); value n if team is nth to solve this puzzle
-    solve_count_map = defaultdict(int) # puzzle -> number of counts
-    total_guess_map = defaultdict(int) # puzzle -> number of guesses
-    used_hints_map = defaultdict(int) # (team, puzzle) -> number of hints
-    used_hints_by_team_map = defaultdict(int) # team -> number of hints
-    used_hints_by_puzzle_map = defaultdict(int) # puzzle -> number of hints
-    # <힌트 수정> 두가지 분류 추가. used는 아중에 하나씩 합치는거로.
-    asked_hints_map = defaultdict(int) # (team, puzzle) -> number of asked_hints
-    asked_hints_by_team_map = defaultdict(int) # team -> number of asked_hints
-    asked_hints_by_puzzle_map = defaultdict(int) # puzzle -> number of asked_hints
-    canned_hints_map = defaultdict(int) # (team, puzzle) -> number of canned_hints
-    canned_hints_by_team_map = defaultdict(int) # team -> number of canned_hints
-    canned_hints_by_puzzle_map = defaultdict(int) # puzzle -> number of canned_hints
-    meta_solves_map = defaultdict(int) # team -> number of meta solves
-    solve_time_map = defaultdict(dict) # team -> {puzzle id -> solve time}
-    during_hunt_solve_time_map = defaultdict(dict) # team -> {puzzle id -> solve time}
-    free_answer_map = defaultdict(set) # team -> {puzzle id}
-    free_answer_by_puzzle_map = defaultdict(int) # puzzle -> number of free answers
-
-    correct_q = Q(is_correct=True)
-    incorrect_q = Q(is_correct=False)
-    if hide_hidden:
-        correct_q &= Q(team__is_hidden=False)
-        incorrect_q &= Q(team__is_hidden=False)
-
-    for team_id, puzzle_id, used_free_answer, submitted_datetime in (
-        AnswerSubmission.objects
-        .filter(correct_q)
-        .order_by('submitted_datetime')
-        .values_list('team_id', 'puzzle_id', 'used_free_answer', 'submitted_datetime')
-    ):
-        total_guess_map[puzzle_id] += 1
-        if used_free_answer:
-            free_answer_map[team_id].add(puzzle_id)
-            free_answer_by_puzzle_map[puzzle_id] += 1
-        else:
-            solve_count_map[puzzle_id] += 1
-            solve_position_map[(team_id, puzzle_id)] = solve_count_map[puzzle_id]
-            solve_time_map[team_id][puzzle_id] = submitted_datetime
-            if submitted_datetime < HUNT_END_TIME:
-                during_hunt_solve_time_map[team_id][puzzle_id] = submitted_datetime
-        if puzzle_id not in puzzle_metas:
-            meta_solves_map[team_id] += 1
-
-    for aggregate in (
-        AnswerSubmission.objects
-        .filter(incorrect_q)
-        .values('team_id', 'puzzle_id')
-        .annotate(count=Count('*'))
-    ):
-        team_id = aggregate['team_id']
-        puzzle_id = aggregate['puzzle_id']
-        total_guess_map[puzzle_id] += aggregate['count']
-        wrong_guesses_map[(team_id, puzzle_id)] += aggregate['count']
-        wrong_guesses_by_team_map[team_id] += aggregate['count']
-
-    # <힌트 수정> asked_hints와 canned_hints 두개에 대해 각각 aggregate함.
-    for aggregate in (
-        Hint.objects
-        .filter(status=Hint.ANSWERED, is_followup=False)
-        .values('team_id', 'puzzle_id')
-        .annotate(count=Count('*'))
-    ):
-        team_id = aggregate['team_id']
-        puzzle_id = aggregate['puzzle_id']
-        count = aggregate['count']
-
-        asked_hints_map[(team_id, puzzle_id)] += count
-        asked_hints_by_team_map[team_id] += count
-        asked_hints_by_puzzle_map[puzzle_id] += count
-        used_hints_map[(team_id, puzzle_id)] += count * 2
-        used_hints_by_team_map[team_id] += count * 2
-        used_hints_by_puzzle_map[puzzle_id] += count * 2
-
-    for aggregate in (
-        CannedHint.objects
-        .values('team_id', 'puzzle_id')
-        .annotate(count=Count('*'))
-    ):
-        team_id = aggregate['team_id']
-        puzzle_id = aggregate['puzzle_id']
-        count = aggregate['count']
-
-        canned_hints_map[(team_id, puzzle_id)] += count
-        canned_hints_by_team_map[team_id] += count
-        canned_hints_by_puzzle_map[puzzle_id] += count
-        used_hints_map[(team_id, puzzle_id)] += count
-        used_hints_by_team_map[team_id] += count
-        used_hints_by_puzzle_map[puzzle_id] += count
-
-    if hide_hidden:
-        teams = Team.objects.filter(is_hidden=False)
-    else:
-        teams = Team.objects.all()
-
-    # Reproduce Team.leaderboard behavior for ignoring solves after hunt end,
-    # but not _teams_ created after hunt end. They'll just all be at the bottom.
-    leaderboard = sorted(teams, key=lambda team: (
-        during_hunt_solve_time_map[team.id].get(meta_meta_id, HUNT_END_TIME),
-        -len(during_hunt_solve_time_map[team.id]),
-        team.last_solve_time or team.creation_time,
-    ))
     limit = request.META.get('QUERY_STRING', '')
     limit = int(limit) if limit.isdigit() else 0
-    if limit:
-        leaderboard = leaderboard[:limit]
-    unlocks = set(PuzzleUnlock.objects.values_list('team_id', 'puzzle_id'))
-    unlock_count_map = defaultdict(int)
-
-    def classes_of(team_id, puzzle_id):
-        unlocked = (team_id, puzzle_id) in unlocks
-        if unlocked:
-            unlock_count_map[puzzle_id] += 1
-        solve_time = solve_time_map[team_id].get(puzzle_id)
-        if puzzle_id in free_answer_map[team_id]:
-            yield 'F' # free answer
-        elif solve_time:
-            yield 'S' # solved
-        elif wrong_guesses_map.get((team_id, puzzle_id)):
-            yield 'W' # wrong
-        elif unlocked:
-            yield 'U' # unlocked
-        if used_hints_map.get((team_id, puzzle_id)):
-            yield 'H' # hinted
-        if asked_hints_map.get((team_id, puzzle_id)):
-            yield 'RH' # requested_hint (asked_hint)
-        if canned_hints_map.get((team_id, puzzle_id)):
-            yield 'CH' # canned_hint
-        if solve_time and solve_time > HUNT_END_TIME:
-            yield 'P' # post-hunt solve
-        if solve_time and puzzle_id in puzzle_metas:
-            meta_time = solve_time_map[team_id].get(puzzle_metas[puzzle_id])
-            if meta_time and solve_time > meta_time - datetime.timedelta(minutes=5):
-                yield 'B' # backsolved
-
-    board = []
-    for team in leaderboard:
-        board.append({
-            'team': team,
-            'last_solve_time': max([team.creation_time, *solve_time_map[team.id].values()]),
-            'total_solves': len(solve_time_map[team.id]),
-            'free_solves': len(free_answer_map[team.id]),
-            'wrong_guesses': wrong_guesses_by_team_map[team.id],
-            'used_hints': used_hints_by_team_map[team.id],
-            'requested_hints': asked_hints_by_team_map[team.id],
-            'asked_hints': canned_hints_by_team_map[team.id],
-            'finished': solve_position_map.get((team.id, meta_meta_id)),
-            'meta_solves': meta_solves_map[team.id],
-            'entries': [{
-                'wrong_guesses': wrong_guesses_map[(team.id, puzzle.id)],
-                'solve_position': solve_position_map.get((team.id, puzzle.id)),
-                'requested_hints': asked_hints_map[(team.id, puzzle.id)],
-                'canned_hints': canned_hints_map[(team.id, puzzle.id)],
-                'cls': ' '.join(classes_of(team.id, puzzle.id)),
-            } for puzzle in puzzles]
-        })
-
-    annotated_puzzles = [{
-        'puzzle': puzzle,
-        'solves': solve_count_map[puzzle.id],
-        'free_solves': free_answer_by_puzzle_map[puzzle.id],
-        'total_guesses': total_guess_map[puzzle.id],
-        'total_unlocks': unlock_count_map[puzzle.id],
-        'used_hints': used_hints_by_puzzle_map[puzzle.id],
-        'requested_hints': asked_hints_by_puzzle_map[puzzle.id],
-        'canned_hints': canned_hints_by_puzzle_map[puzzle.id],
-    } for puzzle in puzzles]
 
     return render(request, 'bigboard.html', {
-        'board': board,
-        'puzzles': annotated_puzzles,
+        'puzzles': request.context.all_puzzles,
+        'board_name': 'public' if hide_hidden else 'all',
+        'data_url': reverse('bigboard-data' if hide_hidden else 'bigboard-unhidden-data'),
+        'limit': limit,
     })
 
+BIGBOARD_PAGE_SIZE = 200
+MAX_BIGBOARD_PAGE_SIZE = 1000
+
+# Rows of the board in order, as JSON: ?cursor is the "next" of the previous
+# page (none for the first, which also has the totals), ?count the page size,
+# and ?limit the number of teams on the whole board.
+def bigboard_data_generic(request, hide_hidden):
+    try:
+        offset = int(request.GET.get('cursor') or 0)
+        count = min(int(request.GET.get('count') or BIGBOARD_PAGE_SIZE), MAX_BIGBOARD_PAGE_SIZE)
+        limit = int(request.GET.get('limit') or 0)
+        if offset < 0 or count <= 0 or limit < 0:
+            raise ValueError
+    except ValueError:
+        return HttpResponseBadRequest(_('Invalid cursor, count or limit'))
+    (board, annotated_puzzles) = bigboard_engine.current_board(
+        request.context.all_puzzles, hide_hidden, limit)
+    end = offset + count
+    data = {
+        'teams': len(board),
+        'rows': [
+            bigboard_engine.row_data(board_entry, rank)
+            for (rank, board_entry) in enumerate(board[offset:end], start=offset + 1)
+        ],
+        'next': str(end) if end < len(board) else None,
+    }
+    if not offset:
+        data['totals'] = bigboard_engine.totals_data(annotated_puzzles)
+    return JsonResponse(data)
+
 @require_GET
 @require_after_hunt_end_or_admin
 def bigboard(request):
@@ -1560,6 +1420,16 @@ def bigboard(request):
 def bigboard_unhidden(request):
     return bigboard_generic(request, hide_hidden=False)
 
+@require_GET
+@require_after_hunt_end_or_admin
+def bigboard_data(request):
+    return bigboard_data_generic(request, hide_hidden=True)
+
+@require_GET
+@require_admin
+def bigboard_unhidden_data(request):
+    return bigboard_data_generic(request, hide_hidden=False)
+
 @require_GET
 @require_after_hunt_end_or_finished
 def biggraph(request):
@@ -1615,84 +1485,137 @@ def biggraph(request):
         'teams': leaderboard
     })
 
+# Exports can be hundreds of thousands of rows, so they're streamed a chunk of
+# rows at a time straight from a database cursor instead of being built in
+# memory. Both take optional ?since= and ?until= (a date or datetime, in the
+# hunt's time zone) to limit the time range, and ?gzip=1 to compress.
+CSV_CHUNK_SIZE = 2000
+
+class Echo:
+    '''A file-like object for csv.writer that just hands back what's written.'''
+    def write(self, value):
+        return value
+
+def parse_export_time(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(value)
+        parsed = datetime.datetime.combine(date, datetime.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def filter_export_times(request, queryset, field):
+    '''Apply the ?since= and ?until= parameters to a queryset.'''
+    since = parse_export_time(request, 'since')
+    until = parse_export_time(request, 'until')
+    if since:
+        queryset = queryset.filter(**{field + '__gte': since})
+    if until:
+        queryset = queryset.filter(**{field + '__lt': until})
+    return queryset
+
+def csv_response(request, name, rows):
+    writer = csv.writer(Echo())
+    def chunks():
+        for batch in iter(lambda: list(itertools.islice(rows, CSV_CHUNK_SIZE)), []):
+            yield ''.join(writer.writerow(row) for row in batch).encode()
+    content = chunks()
+    fname = 'gph_{}_{}.csv'.format(name, request.context.now.strftime('%Y%m%dT%H%M%S'))
+    content_type = 'text/csv'
+    if request.GET.get('gzip'):
+        content = gzip_chunks(content)
+        fname += '.gz'
+        content_type = 'application/gzip'
+    if isinstance(request, ASGIRequest):
+        content = iterate_in_thread(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(fname)
+    return response
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31) # 31 = gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+# Under ASGI, Django would read a synchronous iterator to the end before
+# sending anything, which is exactly what we're trying to avoid. Pulling each
+# chunk on the thread Django uses for sync code keeps the database cursor on
+# the connection it was opened with.
+async def iterate_in_thread(chunks):
+    get_next = sync_to_async(next)
+    while (chunk := await get_next(chunks, None)) is not None:
+        yield chunk
+
 @require_GET
 @require_after_hunt_end_or_admin
 def guess_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    fname = 'gph_guesslog_{}.csv'.format(request.context.now.strftime('%Y%m%dT%H%M%S'))
-    response['Content-Disposition'] = 'attachment; filename="{}"'.format(fname)
-    writer = csv.writer(response)
-    for ans in (
-        AnswerSubmission.objects
-        .annotate(team_name=F('team__team_name'), puzzle_name=F('puzzle__name'))
+    try:
+        submissions = filter_export_times(request,
+            AnswerSubmission.objects.exclude(team__is_hidden=True), 'submitted_datetime')
+    except ValueError as e:
+        return HttpResponseBadRequest(_('Invalid date: {}').format(e))
+    rows = (
+        (
+            submitted_datetime.strftime('%Y-%m-%d %H:%M:%S'),
+            team_name,
+            puzzle_name,
+            submitted_answer,
+            'F' if used_free_answer else ('Y' if is_correct else 'N'),
+        )
+        for (submitted_datetime, team_name, puzzle_name, submitted_answer, used_free_answer, is_correct)
+        in submissions
         .order_by('submitted_datetime')
-        .exclude(team__is_hidden=True)
-    ):
-        writer.writerow([
-            ans.submitted_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-            ans.team_name,
-            ans.puzzle_name,
-            ans.submitted_answer,
-            'F' if ans.used_free_answer else ('Y' if ans.is_correct else 'N')])
-    return response
+        .values_list('submitted_datetime', 'team__team_name', 'puzzle__name',
+            'submitted_answer', 'used_free_answer', 'is_correct')
+        .iterator(chunk_size=CSV_CHUNK_SIZE)
+    )
+    return csv_response(request, 'guesslog', rows)
 
 # <힌트 수정> 힌트 로그 담는 코드를 모두 수정함.
 @require_GET
 @require_admin
 def hint_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    fname = 'gph_hintlog_{}.csv'.format(request.context.now.strftime('%Y%m%dT%H%M%S'))
-    response['Content-Disposition'] = 'attachment; filename="{}"'.format(fname)
-    writer = csv.writer(response)
-
-    # CSV 파일의 가독성을 위해 헤더(첫 줄)를 추가하고, 전체적인 로직을 개선합니다.
-    writer.writerow(['Timestamp', 'Team', 'Puzzle', 'Hint Type', 'Content / ID / Response'])
-
-    # 1. 두 종류의 힌트 데이터를 각각 준비합니다.
-    requested_hints_qs = Hint.objects.annotate(
-        team_name=F('team__team_name'),
-        puzzle_name=F('puzzle__name')
-    ).exclude(team__is_hidden=True)
-
-    canned_hints_qs = CannedHint.objects.annotate(
-        team_name=F('team__team_name'),
-        puzzle_name=F('puzzle__name')
-    ).exclude(team__is_hidden=True)
-
-    # 2. 두 데이터를 통일된 형식의 리스트로 합칩니다.
-    all_hints = []
-    for hint in requested_hints_qs:
-        all_hints.append({
-            "timestamp": hint.submitted_datetime,
-            "team": hint.team_name,
-            "puzzle": hint.puzzle_name,
-            "type": "Requested",
-            "content": hint.response
-        })
-
-    for canned_hint in canned_hints_qs:
-        all_hints.append({
-            "timestamp": canned_hint.opened_datetime,
-            "team": canned_hint.team_name,
-            "puzzle": canned_hint.puzzle_name,
-            "type": "Canned",
-            "content": f"ID: {canned_hint.hint_id}"
-        })
-
-    # 3. 전체 힌트 목록을 시간순으로 정렬합니다.
-    all_hints.sort(key=lambda x: x["timestamp"])
-
-    # 4. 정렬된 데이터를 CSV 파일에 한 줄씩 씁니다.
-    for hint_data in all_hints:
-        writer.writerow([
-            hint_data["timestamp"].strftime('%Y-%m-%d %H:%M:%S'),
-            hint_data["team"],
-            hint_data["puzzle"],
-            hint_data["type"],
-            hint_data["content"]
-        ])
-        
-    return response
+    # 요청한 힌트와 고정 힌트를 각각 DB에서 시간순으로 가져와서, 메모리에서
+    # 전체를 정렬하는 대신 heapq.merge로 합칩니다.
+    try:
+        hints = filter_export_times(request,
+            Hint.objects.exclude(team__is_hidden=True), 'submitted_datetime')
+        canned_hints = filter_export_times(request,
+            CannedHint.objects.exclude(team__is_hidden=True), 'opened_datetime')
+    except ValueError as e:
+        return HttpResponseBadRequest(_('Invalid date: {}').format(e))
+    requested = (
+        (timestamp, team_name, puzzle_name, 'Requested', response)
+        for (timestamp, team_name, puzzle_name, response) in hints
+        .order_by('submitted_datetime')
+        .values_list('submitted_datetime', 'team__team_name', 'puzzle__name', 'response')
+        .iterator(chunk_size=CSV_CHUNK_SIZE)
+    )
+    canned = (
+        (timestamp, team_name, puzzle_name, 'Canned', f'ID: {hint_id}')
+        for (timestamp, team_name, puzzle_name, hint_id) in canned_hints
+        .order_by('opened_datetime')
+        .values_list('opened_datetime', 'team__team_name', 'puzzle__name', 'hint_id')
+        .iterator(chunk_size=CSV_CHUNK_SIZE)
+    )
+    # CSV 파일의 가독성을 위해 헤더(첫 줄)를 추가합니다.
+    rows = itertools.chain(
+        [('Timestamp', 'Team', 'Puzzle', 'Hint Type', 'Content / ID / Response')],
+        (
+            (timestamp.strftime('%Y-%m-%d %H:%M:%S'), *rest)
+            for (timestamp, *rest) in heapq.merge(requested, canned, key=lambda row: row[0])
+        ),
+    )
+    return csv_response(request, 'hintlog', rows)
 
 @require_GET
 @require_admin